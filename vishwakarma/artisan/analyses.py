@@ -0,0 +1,176 @@
+"""
+Per-question analysis storage.
+
+Analyses live in ProjectAnalysis, one row per project, question and version,
+instead of a JSON blob on Project. Writing one question's analysis inserts a
+row and clears ``is_current`` on the one it replaces, so nothing else is
+rewritten and the history is kept. ``Project.analysis_content`` is derived
+from the current rows; list views load them with with_analyses() in one
+extra query.
+
+Writers for a project are serialized on its row, which keeps the version
+numbers unique. Each write also bumps ``Project.updated_at`` (ETags, the
+retrieval index) and evicts the state derived from the project.
+"""
+import hashlib
+import json
+
+from django.db import connection, transaction
+from django.db.models import Max, Prefetch
+from django.utils import timezone
+
+from .models import Project, ProjectAnalysis
+
+# Keys of an analysis_content entry that are row metadata, not content.
+META_KEYS = frozenset({'question_index', 'version', 'is_gemini', 'input_hash', 'model_name'})
+
+
+def input_hash(question_index: int, answers: list) -> str:
+    """Digest of what a question's prompt is built from: its answer and the ones before it."""
+    inputs = [question_index, answers[question_index], answers[:question_index]]
+    canonical = json.dumps(inputs, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def with_analyses(queryset):
+    """Prefetch the current analyses that Project.analysis_content reads."""
+    return queryset.prefetch_related(Prefetch(
+        'analyses',
+        queryset=ProjectAnalysis.objects.filter(is_current=True).order_by('question_index'),
+        to_attr='current_analyses',
+    ))
+
+
+def current_rows(project) -> dict:
+    """``{question index: ProjectAnalysis}`` for the current analyses of ``project``."""
+    rows = getattr(project, 'current_analyses', None)
+    if rows is None:
+        rows = ProjectAnalysis.objects.filter(project=project, is_current=True)
+    return {row.question_index: row for row in rows}
+
+
+def entries_from_content(value) -> dict:
+    """
+    ``{question index: analysis}`` from an ``analysis_content`` payload: a
+    list (indexed by position, or by each entry's ``question_index``) or a
+    single analysis for question 0. Raises ValueError on bad input.
+    """
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except Exception:
+            raise ValueError("'analysis_content' must be valid JSON")
+    if isinstance(value, dict):
+        value = [value] if value else []
+    if not isinstance(value, list):
+        raise ValueError("'analysis_content' must be a list of analyses")
+    entries = {}
+    for position, item in enumerate(value):
+        if item is None:
+            continue
+        if not isinstance(item, dict):
+            raise ValueError("Every analysis must be an object")
+        index = item.get('question_index', position)
+        if not isinstance(index, int) or isinstance(index, bool) or not 0 <= index < 32767:
+            raise ValueError("'question_index' must be a non-negative integer")
+        entries[index] = item
+    return entries
+
+
+def build_row(project, question_index, analysis, version, answers=None, model_name=''):
+    is_gemini = bool(analysis.get('is_gemini'))
+    stored_hash = analysis.get('input_hash') or ''
+    if is_gemini and answers is not None and question_index < len(answers):
+        stored_hash = input_hash(question_index, answers)
+    return ProjectAnalysis(
+        project=project,
+        question_index=question_index,
+        version=version,
+        content={k: v for k, v in analysis.items() if k not in META_KEYS},
+        model_name=model_name if is_gemini else '',
+        is_gemini=is_gemini,
+        input_hash=stored_hash,
+    )
+
+
+def save_analyses(project, analyses: dict, answers=None, keep=None) -> list:
+    """
+    Store ``{question index: analysis}`` as the new current versions.
+
+    Analyses flagged ``is_gemini`` record the hash of ``answers`` they were
+    generated from. Questions outside ``keep`` (when given) lose their
+    current analysis. Content identical to the current analysis is not
+    stored again. Returns the rows created.
+    """
+    from .llm import get_backend
+
+    model_name = get_backend().model_name if any(a.get('is_gemini') for a in analyses.values()) else ''
+    with transaction.atomic():
+        if connection.features.has_select_for_update:
+            # Lock the project so concurrent writers can't pick the same version
+            list(Project.objects.select_for_update().filter(pk=project.pk).values_list('pk'))
+        current = {row.question_index: row for row in ProjectAnalysis.objects.filter(project=project, is_current=True)}
+        # The current row is the latest version; only look further for questions without one
+        latest = {index: row.version for index, row in current.items()}
+        missing = [index for index in analyses if index not in current]
+        if missing:
+            latest.update(
+                ProjectAnalysis.objects.filter(project=project, question_index__in=missing)
+                .values_list('question_index').annotate(Max('version'))
+            )
+        new_rows = []
+        for index, analysis in sorted(analyses.items()):
+            row = build_row(project, index, analysis, latest.get(index, 0) + 1, answers, model_name)
+            old = current.get(index)
+            if old is not None and old.content == row.content and (
+                not row.is_gemini or (old.is_gemini and old.input_hash == row.input_hash)
+            ):
+                continue
+            new_rows.append(row)
+        retired = [current[row.question_index].pk for row in new_rows if row.question_index in current]
+        if keep is not None:
+            keep = set(keep)
+            retired += [row.pk for index, row in current.items() if index not in keep and index not in analyses]
+        if not new_rows and not retired:
+            return []
+        if retired:
+            ProjectAnalysis.objects.filter(pk__in=retired).update(is_current=False)
+        ProjectAnalysis.objects.bulk_create(new_rows)
+        touch_projects([project.pk])
+    if hasattr(project, 'current_analyses'):
+        del project.current_analyses
+    return new_rows
+
+
+def create_initial(pairs):
+    """Version 1 analyses for new projects: ``(project, {question index: analysis})`` pairs."""
+    rows = [
+        build_row(project, index, analysis, 1)
+        for project, analyses in pairs for index, analysis in sorted(analyses.items())
+    ]
+    ProjectAnalysis.objects.bulk_create(rows, batch_size=500)
+    return rows
+
+
+def touch_projects(project_ids):
+    from .signals import invalidate_projects
+
+    Project.objects.filter(pk__in=project_ids).update(updated_at=timezone.now())
+    transaction.on_commit(lambda: invalidate_projects(project_ids))
+
+
+def history(project, question_index) -> list:
+    """Every version of one question's analysis, newest first."""
+    return list(ProjectAnalysis.objects.filter(project=project, question_index=question_index).order_by('-version'))
+
+
+def row_to_dict(row) -> dict:
+    return {
+        "question_index": row.question_index,
+        "version": row.version,
+        "is_current": row.is_current,
+        "content": row.content,
+        "model_name": row.model_name,
+        "is_gemini": row.is_gemini,
+        "created_at": row.created_at.isoformat(),
+    }
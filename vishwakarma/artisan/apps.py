@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ArtisanConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'artisan'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .search import ensure_search_index
+
+        post_migrate.connect(ensure_search_index, sender=self)
@@ -0,0 +1,247 @@
+"""
+Async (ASGI) variants of the LLM-backed and streaming views.
+
+They mirror the sync views in views.py but await the model call, so a
+single ASGI worker can hold many requests open while the model responds.
+``"async": true`` queues an analysis job as the sync view does; token
+streaming (``"stream": true``) is only served by the sync views, so it is
+refused with a 400 here.
+ORM access goes through sync_to_async and the number of in-flight model
+calls is capped by llm.llm_semaphore().
+"""
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+
+from . import chat, retrieval, statistics, views
+from .jobs import enqueue_analysis
+from .llm import agenerate_text, get_backend, llm_available
+from .models import ChatSession
+from .resilience import LLMUnavailable, breaker
+
+
+async def analyze_answer(question_index, answer, previous_answers):
+    """Awaiting views.analyze_answer(); the prompt and fallback come from the same helpers."""
+    default_analysis, prompt = views.analysis_attempt(question_index, answer, previous_answers)
+    response_text = None
+    if prompt is not None:
+        try:
+            response_text = await agenerate_text('analysis', prompt)
+        except Exception:
+            response_text = None
+    return views.finish_analysis(question_index, default_analysis, response_text)
+
+
+def streaming_unsupported(sync_view: str) -> JsonResponse:
+    """Token streaming is only served by the sync views; say where instead of ignoring the option."""
+    return JsonResponse({"error": f"Streaming is not supported here; use {reverse(sync_view)}"}, status=400)
+
+
+@csrf_exempt
+async def analysis_view(request):
+    if request.method == 'POST':
+        data = json.loads(request.body)
+
+        # Background mode, as in views.analysis_view
+        if data.pop('async', False):
+            job = await sync_to_async(enqueue_analysis)(data, force=bool(data.pop('force', False)))
+            return JsonResponse(views.job_to_dict(job), status=202)
+
+        analysis = await analyze_answer(
+            data.get('question_index'), data.get('answer'), data.get('previous_answers', [])
+        )
+
+        project_id = data.get('project_id')
+        if project_id:
+            await sync_to_async(views.save_project_analysis)(
+                project_id, data.get('question_index'), analysis, views.analysis_inputs(data)
+            )
+
+        return JsonResponse(analysis)
+
+    return JsonResponse({'error': 'Invalid request'}, status=400)
+
+
+@csrf_exempt
+async def batch_analysis_view(request):
+    """Async batch_analysis_view; the calls are gathered under llm_semaphore()."""
+    if request.method != 'POST':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    try:
+        data = json.loads(request.body.decode('utf-8')) if request.body else {}
+        project, answers = await sync_to_async(views.batch_answers)(data)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    except views.Project.DoesNotExist:
+        return JsonResponse({"error": "Project not found"}, status=404)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    results = await asyncio.gather(*(
+        analyze_answer(i, answer, answers[:i]) for i, answer in enumerate(answers)
+    ))
+
+    if project is not None:
+        await sync_to_async(views.save_batch_analysis)(project, results, answers)
+    return JsonResponse({
+        "project_id": project.pk if project else None,
+        "analyses": results,
+    })
+
+
+@csrf_exempt
+async def chatbot_view(request):
+    if request.method != 'POST':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        user_message = data.get('message', '').strip()
+        project_id = data.get('project_id')
+
+        if views.wants_stream(request, data):
+            return streaming_unsupported('chatbot_view')
+        if not user_message:
+            return JsonResponse({"error": "Message is required"}, status=400)
+        if not llm_available():
+            return JsonResponse({"error": "Gemini API key not configured"}, status=500)
+        try:
+            session = await sync_to_async(chat.get_or_create_session)(data.get('session_id'), project_id)
+        except (ChatSession.DoesNotExist, ValidationError):
+            return JsonResponse({"error": "Chat session not found"}, status=404)
+        except views.Project.DoesNotExist:
+            return JsonResponse({"error": "Project not found"}, status=404)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        if breaker.is_open():
+            return views.degraded_chat_response(request, data, context_used=0, session_id=str(session.id))
+
+        db_context, context_used = await sync_to_async(retrieval.get_chat_context)(user_message, project_id)
+        history = await sync_to_async(chat.history_prompt)(session)
+        prompt = views.build_chat_prompt(db_context, user_message, history)
+        try:
+            reply = await agenerate_text('chat', prompt, project_id=project_id)
+        except LLMUnavailable:
+            return views.degraded_chat_response(request, data, context_used=context_used, session_id=str(session.id))
+        await sync_to_async(chat.record_turn)(session, user_message, reply)
+
+        return JsonResponse({
+            "reply": reply,
+            "context_used": context_used,
+            "session_id": str(session.id)
+        })
+
+    except Exception as e:
+        return JsonResponse({"error": f"Failed to generate response: {str(e)}"}, status=500)
+
+
+@csrf_exempt
+async def test_gemini_view(request):
+    """Test endpoint to verify Gemini API is working"""
+    try:
+        backend = get_backend()
+        if not backend.is_configured():
+            return JsonResponse({"error": "No Gemini API key found"}, status=500)
+
+        response_text = await agenerate_text('test_gemini', "Say hello")
+
+        return JsonResponse({
+            "success": True,
+            "response": response_text,
+            "backend": type(backend).__name__,
+            "api_key_length": len(getattr(backend, 'api_key', ''))
+        })
+
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+@csrf_exempt
+async def generate_content_view(request):
+    if request.method != 'POST':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    try:
+        data = json.loads(request.body)
+        prompt = data.get('prompt', '').strip()
+        project_id = data.get('project_id')
+        if views.wants_stream(request, data):
+            return streaming_unsupported('generate_content')
+        if not prompt:
+            return JsonResponse({"error": "Prompt is required"}, status=400)
+        if not llm_available():
+            return JsonResponse({"error": "Gemini API key not configured"}, status=500)
+
+        project_context = await sync_to_async(views.get_project_context)(project_id) if project_id else ""
+        system_prompt = views.build_content_prompt(project_context, prompt)
+        if breaker.is_open():
+            return views.llm_unavailable_response()
+        try:
+            content = await agenerate_text('generate_content', system_prompt, project_id=project_id)
+        except LLMUnavailable:
+            return views.llm_unavailable_response()
+
+        return JsonResponse({"content": content})
+    except Exception as e:
+        return JsonResponse({"error": f"Failed to generate content: {str(e)}"}, status=500)
+
+
+async def statistics_poll_view(request):
+    """
+    Long-poll variant of statistics_view: a ``?since=`` poll is held until
+    the stats move or STATISTICS_LONG_POLL_SECONDS pass. Used by ASGI
+    dashboards without EventSource.
+    """
+    if request.method != 'GET':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    project_id = await sync_to_async(views.statistics_project_id)(request)
+    try:
+        since = views.statistics_since(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    if since is None:
+        return JsonResponse((await sync_to_async(statistics.hub.snapshot)(project_id)).stats)
+    snapshot, changes = await statistics.wait_for_changes(since, project_id)
+    return JsonResponse(statistics.poll_payload(snapshot, changes))
+
+
+async def statistics_stream_view(request):
+    """
+    Push feed replacing the 2s polling of statistics_view: a full
+    ``snapshot`` event, then a ``delta`` event per version change. The
+    stream closes after STATISTICS_STREAM_SECONDS and EventSource reconnects.
+    Only served under ASGI, where an open stream costs no worker thread;
+    WSGI dashboards poll statistics_view instead.
+    """
+    if request.method != 'GET':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    project_id = await sync_to_async(views.statistics_project_id)(request)
+
+    async def events():
+        interval, lifetime = statistics.stream_settings()
+        current = await sync_to_async(statistics.hub.snapshot)(project_id)
+        yield f"retry: {int(interval * 1000)}\n"
+        yield statistics.sse("snapshot", {"version": current.version, "stats": current.stats})
+
+        deadline = time.monotonic() + lifetime
+        while time.monotonic() < deadline:
+            await asyncio.sleep(interval)
+            latest, changes = await sync_to_async(statistics.hub.changes_since)(
+                current.version, project_id, current.flat
+            )
+            if changes:
+                yield statistics.sse("delta", {"version": latest.version, "changes": changes})
+            else:
+                yield ": keep-alive\n\n"
+            current = latest
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
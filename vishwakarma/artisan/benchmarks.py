@@ -0,0 +1,237 @@
+"""
+Endpoint benchmarks for the artisan API.
+
+    python manage.py test artisan.benchmarks
+
+Seeds BENCHMARK_PROJECTS projects with questionnaire-sized answers, charts
+and analysis, then drives every API route through the test client with the
+LLM replaced by the local backend. For each endpoint it records p50/p95/p99
+latency, the number of DB queries per request and the peak Python memory a
+request allocates, and compares them with benchmark_baselines.json:
+
+* queries must not exceed the baseline (this is what catches N+1 queries),
+* median latency may grow by BENCHMARK_LATENCY_TOLERANCE (default 1.5x);
+  p95/p99 are recorded but too jittery on shared hosts to gate on,
+* peak memory may grow by BENCHMARK_MEMORY_TOLERANCE (default 1.25x).
+
+The query count is deterministic and always fails the run. Latency and
+memory depend on the host the baselines were recorded on, so a regression
+there is only logged as a warning unless BENCHMARK_ENFORCE_TIMINGS=1 is
+set; do that on the machine that recorded the baselines.
+
+Run with BENCHMARK_UPDATE_BASELINES=1 to rewrite the baselines after an
+intended change; endpoints without a baseline are recorded, not checked.
+Each endpoint's numbers are logged at INFO on the ``artisan.benchmarks``
+logger; configure a handler for it in LOGGING to see them.
+"""
+import json
+import logging
+import os
+import random
+import statistics as stats
+import time
+import tracemalloc
+from datetime import date
+from pathlib import Path
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from . import metrics
+from .analyses import create_initial
+from .models import ApiKeys, Project
+
+logger = logging.getLogger(__name__)
+
+BASELINES_PATH = Path(__file__).with_name('benchmark_baselines.json')
+
+PROJECTS = int(os.environ.get('BENCHMARK_PROJECTS', 200))
+ITERATIONS = int(os.environ.get('BENCHMARK_ITERATIONS', 30))
+LATENCY_TOLERANCE = float(os.environ.get('BENCHMARK_LATENCY_TOLERANCE', 1.5))
+MEMORY_TOLERANCE = float(os.environ.get('BENCHMARK_MEMORY_TOLERANCE', 1.25))
+UPDATE_BASELINES = os.environ.get('BENCHMARK_UPDATE_BASELINES', '').lower() in ('1', 'true', 'yes')
+ENFORCE_TIMINGS = os.environ.get('BENCHMARK_ENFORCE_TIMINGS', '').lower() in ('1', 'true', 'yes')
+
+# Below these, differences are mostly noise; don't fail on them.
+LATENCY_FLOOR_MS = 5.0
+MEMORY_FLOOR_KB = 256.0
+
+LOCAL_LLM = {
+    'BACKEND': 'artisan.llm_backends.LocalBackend',
+    'OPTIONS': {'SEED': 1},
+}
+# Every call reaches the backend, so the numbers cover the full request path.
+NO_LLM_CACHE = {'TTL': {'analysis': 0, 'chat': 0, 'generate_content': 0}}
+
+ANSWER_WORDS = (
+    "handmade pottery textiles wooden toys jewellery organic dyes export retail "
+    "instagram marketplace wholesale festive season margins packaging logistics "
+    "artisans village cooperative pricing premium budget shipping returns"
+).split()
+
+
+def synthetic_answer(rng, words=60):
+    return ' '.join(rng.choice(ANSWER_WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def synthetic_analysis(rng, question_index):
+    labels = [f"Segment {chr(65 + i)}" for i in range(rng.randint(3, 6))]
+    return {
+        "title": f"Analysis {question_index + 1}",
+        "content": synthetic_answer(rng, 120),
+        "chartType": rng.choice(["pie", "bar", "line", "doughnut"]),
+        "chartData": {
+            "labels": labels,
+            "data": [rng.randint(5, 60) for _ in labels],
+            "colors": ['#1FB8CD', '#FFC185', '#B4413C', '#ECEBD5', '#5D878F', '#DB4545'][:len(labels)],
+        },
+        "reply": synthetic_answer(rng, 25),
+    }
+
+
+def synthetic_project(rng, index):
+    analysis = [synthetic_analysis(rng, i) for i in range(4)]
+    return Project(
+        name=f"Benchmark project {index}",
+        type=rng.choice([Project.TYPE_GROW, Project.TYPE_ENTRY]),
+        description=synthetic_answer(rng, 30),
+        questions_answered=True,
+        answers=[synthetic_answer(rng) for _ in range(4)],
+        charts={
+            "analysis": [
+                {"title": a["title"], "chartType": a["chartType"], **a["chartData"]} for a in analysis
+            ],
+            "statistics": {"sales": {"months": ["Jan", "Feb", "Mar", "Apr", "May", "Jun"],
+                                     "revenue": [rng.randint(100000, 200000) for _ in range(6)]}},
+        },
+        is_first_iteration=False,
+    ), analysis
+
+
+def seed_projects(count, seed=0):
+    rng = random.Random(seed)
+    pairs = [synthetic_project(rng, i) for i in range(count)]
+    projects = Project.objects.bulk_create([project for project, _ in pairs])
+    create_initial([(project, dict(enumerate(analysis))) for project, (_, analysis) in zip(projects, pairs)])
+    return projects
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def load_baselines():
+    if BASELINES_PATH.exists():
+        return json.loads(BASELINES_PATH.read_text())
+    return {}
+
+
+@override_settings(LLM_BACKEND=LOCAL_LLM, LLM_CACHE=NO_LLM_CACHE)
+class EndpointBenchmarks(TestCase):
+    results = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.projects = seed_projects(PROJECTS)
+        cls.project = cls.projects[0]
+        ApiKeys.objects.create(project=cls.project, instagram='ig', youtube='yt', flipkart='fk')
+        this_month = metrics.month_index(date.today())
+        metrics.ingest(cls.project, [
+            (name, metrics.month_start(this_month - m), 100.0) for name in metrics.METRICS for m in range(7)
+        ])
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if UPDATE_BASELINES and cls.results:
+            baselines = {**load_baselines(), **cls.results}
+            BASELINES_PATH.write_text(json.dumps(baselines, indent=2, sort_keys=True) + '\n')
+
+    def measure(self, name, request):
+        """Time ``request()`` ITERATIONS times and compare against the baseline."""
+        response = request()  # warm caches and lazy imports
+        self.assertLess(response.status_code, 400, f"{name}: {response.status_code}")
+
+        timings, queries = [], []
+        for _ in range(ITERATIONS):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                request()
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured))
+
+        # Measured apart from the timings: tracemalloc slows every allocation.
+        tracemalloc.start()
+        request()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        result = {
+            'p50_ms': round(stats.median(timings), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'queries': max(queries),
+            'peak_kb': round(peak / 1024, 1),
+            'response_kb': round(len(response.content) / 1024, 1),
+        }
+        self.results[name] = result
+        logger.info(
+            "%-24s p50 %8.2fms  p95 %8.2fms  queries %3d  peak %9.1fKB",
+            name, result['p50_ms'], result['p95_ms'], result['queries'], result['peak_kb'],
+        )
+
+        baseline = load_baselines().get(name)
+        if UPDATE_BASELINES or baseline is None:
+            return
+        self.assertLessEqual(result['queries'], baseline['queries'], f"{name}: more DB queries than the baseline")
+        regressions = []
+        if result['p50_ms'] > max(baseline['p50_ms'] * LATENCY_TOLERANCE, LATENCY_FLOOR_MS):
+            regressions.append(f"{name}: median latency regressed ({result['p50_ms']}ms, baseline {baseline['p50_ms']}ms)")
+        if result['peak_kb'] > max(baseline['peak_kb'] * MEMORY_TOLERANCE, MEMORY_FLOOR_KB):
+            regressions.append(f"{name}: peak memory regressed ({result['peak_kb']}KB, baseline {baseline['peak_kb']}KB)")
+        if regressions and ENFORCE_TIMINGS:
+            self.fail("; ".join(regressions))
+        for regression in regressions:
+            logger.warning(regression)
+
+    def post_json(self, path, payload, method='post'):
+        return getattr(self.client, method)(path, json.dumps(payload), content_type='application/json')
+
+    def test_project_list(self):
+        self.measure('projects.list', lambda: self.client.get('/api/projects/'))
+
+    def test_project_list_page(self):
+        self.measure('projects.list_page', lambda: self.client.get('/api/projects/?limit=50&fields=id,name,type'))
+
+    def test_project_detail(self):
+        self.measure('projects.detail', lambda: self.client.get(f'/api/projects/{self.project.id}/'))
+
+    def test_project_update(self):
+        payload = {'name': 'Renamed', 'answers': self.project.answers, 'charts': self.project.charts}
+        self.measure('projects.update', lambda: self.post_json(f'/api/projects/{self.project.id}/', payload, 'put'))
+
+    def test_analysis(self):
+        payload = {
+            'question_index': 1,
+            'answer': self.project.answers[1],
+            'previous_answers': self.project.answers[:1],
+            'project_id': self.project.id,
+        }
+        self.measure('analysis', lambda: self.post_json('/api/analysis/', payload))
+
+    def test_statistics(self):
+        self.measure('statistics', lambda: self.client.get(f'/api/statistics/?project_id={self.project.id}'))
+
+    def test_api_keys(self):
+        self.measure('api_keys', lambda: self.client.get(f'/api/projects/{self.project.id}/api-keys/'))
+
+    def test_chat(self):
+        payload = {'message': 'Which channel should I focus on?', 'project_id': self.project.id}
+        self.measure('chat', lambda: self.post_json('/api/chat/', payload))
+
+    def test_generate_content(self):
+        payload = {'prompt': 'Write an Instagram caption for the festive sale', 'project_id': self.project.id}
+        self.measure('generate_content', lambda: self.post_json('/api/generate-content/', payload))
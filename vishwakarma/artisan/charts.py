@@ -0,0 +1,255 @@
+"""
+Chart data engine: chart series built on the server and downsampled to the
+width they are drawn at.
+
+series_chart() reads a MetricSeries (artisan/metrics.py) at day, week or
+month resolution. Daily points come from the packed ``daily`` array. Weeks
+and months come from the rollups, whose ``sum, count`` pairs are turned
+into totals or means in one vectorized step. Series longer than the
+requested width are reduced with Largest-Triangle-Three-Buckets (LTTB).
+LTTB keeps the points that carry the visual shape (peaks, dips, trend
+changes), so years of daily data ship as a few hundred points that draw
+the same line. stored_charts() applies the same reduction to the label/value
+pairs kept in Project.charts.
+
+NumPy is used when it is installed; otherwise the same algorithms run over
+``array('d')`` in pure Python and return identical points.
+
+Rendered payloads are cached per project, series and width under the
+``updated_at`` of the row they were built from, as the prompt context is
+(artisan/context.py). A hit costs one indexed read of that column, and a
+write is seen by the next request in every worker, even with the default
+per-process cache. Superseded entries are never read again and expire
+after CHART_ENGINE['TIMEOUT'].
+"""
+import bisect
+import hashlib
+import math
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+from .models import MetricSeries, Project
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_CHART_SETTINGS = {
+    'DEFAULT_WIDTH': 800,
+    'MAX_WIDTH': 4000,
+    'TIMEOUT': 300,
+}
+
+# Resolution -> the MetricSeries array it is read from
+BUCKETS = {'day': 'daily', 'week': 'weekly', 'month': 'monthly'}
+# (labels, values) keys of the series kept in Project.charts
+STORED_PAIRS = (('labels', 'data'), ('months', 'revenue'))
+KEY_PREFIX = 'artisan:charts:'
+
+
+def chart_settings() -> dict:
+    return {**DEFAULT_CHART_SETTINGS, **getattr(settings, 'CHART_ENGINE', {})}
+
+
+def chart_width(value) -> int:
+    """Points to return for a ``?width=`` parameter; ValueError on bad input."""
+    config = chart_settings()
+    if value in (None, ''):
+        return config['DEFAULT_WIDTH']
+    try:
+        width = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("'width' must be an integer")
+    if width < 3:
+        raise ValueError("'width' must be at least 3")
+    return min(width, config['MAX_WIDTH'])
+
+
+# --- Largest-Triangle-Three-Buckets ---------------------------------------
+
+def bucket_edges(n: int, threshold: int) -> list:
+    """Start of each of the ``threshold - 2`` inner buckets, plus the end of the last."""
+    return [int(i * (n - 2) / (threshold - 2)) + 1 for i in range(threshold - 1)]
+
+
+def lttb_indexes(x, y, threshold: int) -> list:
+    """Indexes of the ``threshold`` points of (x, y) that LTTB keeps; all of them when it is short."""
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    if np is not None:
+        return _lttb_numpy(np.asarray(x, dtype=float), np.asarray(y, dtype=float), threshold)
+    return _lttb_python(x, y, threshold)
+
+
+def _lttb_numpy(x, y, threshold):
+    n = len(y)
+    edges = bucket_edges(n, threshold)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            avg_x, avg_y = x[end:edges[i + 2]].mean(), y[end:edges[i + 2]].mean()
+        else:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        # Twice the area of the triangle (point a, candidate, next bucket's average)
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(areas.argmax())
+        selected.append(a)
+    selected.append(n - 1)
+    return selected
+
+
+def _lttb_python(x, y, threshold):
+    n = len(y)
+    edges = bucket_edges(n, threshold)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            span = range(end, edges[i + 2])
+            avg_x = sum(x[j] for j in span) / len(span)
+            avg_y = sum(y[j] for j in span) / len(span)
+        else:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        a = best
+        selected.append(a)
+    selected.append(n - 1)
+    return selected
+
+
+# --- Metric series ----------------------------------------------------------
+
+def rollup_values(blob, kind):
+    """(bucket numbers, values) of the rollup buckets that recorded any point."""
+    if np is not None:
+        pairs = np.frombuffer(bytes(blob or b''), dtype='<f8').reshape(-1, 2)
+        buckets = np.flatnonzero(pairs[:, 1] > 0)
+        sums, counts = pairs[buckets, 0], pairs[buckets, 1]
+        return buckets.tolist(), (sums / counts if kind == metrics.MEAN else sums).tolist()
+    values = metrics.unpack(blob)
+    buckets = [i for i in range(len(values) // 2) if values[2 * i + 1] > 0]
+    return buckets, [metrics.rollup_value(kind, values[2 * i], values[2 * i + 1]) for i in buckets]
+
+
+def daily_values(blob):
+    """(day offsets, values) of the days that recorded a point."""
+    if np is not None:
+        values = np.frombuffer(bytes(blob or b''), dtype='<f8')
+        days = np.flatnonzero(~np.isnan(values))
+        return days.tolist(), values[days].tolist()
+    values = metrics.unpack(blob)
+    days = [i for i, value in enumerate(values) if not math.isnan(value)]
+    return days, [values[i] for i in days]
+
+
+def series_points(series: MetricSeries, bucket: str) -> tuple:
+    """(dates, values) of ``series`` at ``bucket`` resolution; a week or month is dated by its first day."""
+    start = series.start_date
+    if bucket == 'day':
+        offsets, values = daily_values(series.daily)
+        return [start + timedelta(days=offset) for offset in offsets], values
+    kind = metrics.METRICS.get(series.name, metrics.SUM)
+    if bucket == 'week':
+        weeks, values = rollup_values(series.weekly, kind)
+        first = metrics.week_start(start)
+        return [first + timedelta(weeks=week) for week in weeks], values
+    months, values = rollup_values(series.monthly, kind)
+    first = metrics.month_index(start)
+    return [metrics.month_start(first + month) for month in months], values
+
+
+def clip(dates, values, since=None, until=None):
+    lo = 0 if since is None else bisect.bisect_left(dates, since)
+    hi = len(dates) if until is None else bisect.bisect_right(dates, until)
+    return dates[lo:hi], values[lo:hi]
+
+
+def series_chart(project_id, metric: str, width: int, bucket='day', since: date = None, until: date = None):
+    """
+    ``chartData`` for one metric of a project, at most ``width`` points; None
+    when the project never recorded it. Cached until the series changes.
+    """
+    recorded = MetricSeries.objects.filter(project_id=project_id, name=metric)
+    updated_at = recorded.values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return None
+    key = cache_key(project_id, updated_at, 'series', metric, bucket, width, since, until)
+    payload = cache.get(key)
+    if payload is None:
+        series = recorded.only('name', 'start_date', BUCKETS[bucket]).first()
+        if series is None:
+            return None
+        dates, values = clip(*series_points(series, bucket), since, until)
+        x = [(d - series.start_date).days for d in dates]
+        keep = lttb_indexes(x, values, width)
+        payload = {
+            "metric": metric,
+            "bucket": bucket,
+            "chartType": "line",
+            "chartData": {
+                "labels": [dates[i].isoformat() for i in keep],
+                "data": [values[i] for i in keep],
+            },
+            "points": len(values),
+            "downsampled": len(keep) < len(values),
+        }
+        cache.set(key, payload, chart_settings()['TIMEOUT'])
+    return payload
+
+
+# --- Stored charts ----------------------------------------------------------
+
+def downsample_pairs(value, width: int):
+    """Copy of a Project.charts value with every long label/value series reduced to ``width`` points."""
+    if isinstance(value, list):
+        return [downsample_pairs(item, width) for item in value]
+    if not isinstance(value, dict):
+        return value
+    value = {key: downsample_pairs(item, width) for key, item in value.items()}
+    for labels_key, values_key in STORED_PAIRS:
+        labels, values = value.get(labels_key), value.get(values_key)
+        if (
+            isinstance(labels, list) and isinstance(values, list) and len(labels) == len(values) > width
+            and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values)
+        ):
+            keep = lttb_indexes(range(len(values)), values, width)
+            value[labels_key] = [labels[i] for i in keep]
+            value[values_key] = [values[i] for i in keep]
+    return value
+
+
+def stored_charts(project_id, width: int):
+    """Project.charts with long series downsampled; None when the project does not exist."""
+    project = Project.objects.filter(pk=project_id)
+    updated_at = project.values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return None
+    key = cache_key(project_id, updated_at, 'stored', width)
+    charts = cache.get(key)
+    if charts is None:
+        stored = project.values_list('charts', flat=True).first()
+        if stored is None:
+            return None
+        charts = downsample_pairs(stored, width)
+        cache.set(key, charts, chart_settings()['TIMEOUT'])
+    return charts
+
+
+# --- Cache ------------------------------------------------------------------
+
+def cache_key(project_id, updated_at, *parts) -> str:
+    # Metric names have spaces, which memcached keys can't
+    digest = hashlib.sha1(":".join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f"{KEY_PREFIX}{project_id}:{updated_at.timestamp()}:{digest}"
@@ -0,0 +1,168 @@
+"""
+Server-side chat sessions for chatbot_view.
+
+Each session stores its messages as ChatMessage rows. A prompt carries the
+session's rolling summary plus the turns not yet folded into it: the last
+RECENT_TURNS turns and the older ones waiting for the next fold. Once
+SUMMARIZE_TURNS turns have piled up beyond the recent window, they are folded
+into the summary by a background job on the analysis worker pool, off the
+request path. Normally a turn is therefore in the summary or in the prompt.
+If folding keeps failing (LLM down), only the newest HISTORY_TURNS unfolded
+turns are sent, so the prompt stays bounded however long the conversation
+runs; the rest are folded in once the LLM is back.
+"""
+import logging
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Subquery
+from django.utils import timezone
+
+from .jobs import get_executor
+from .llm import generate_text, llm_available
+from .models import ChatMessage, ChatSession, Project
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHAT_SESSION_SETTINGS = {
+    # Turns (a question and its reply) sent verbatim with every prompt.
+    'RECENT_TURNS': 4,
+    # Turns folded into the summary at once, after they leave the window.
+    'SUMMARIZE_TURNS': 4,
+    # Most unfolded turns sent with a prompt; defaults to RECENT_TURNS + SUMMARIZE_TURNS.
+    'HISTORY_TURNS': None,
+}
+
+SUMMARY_PROMPT = """Update the running summary of a business chat about one project.
+Keep the facts, numbers, decisions and open questions; drop pleasantries.
+Reply with the new summary only, in at most 150 words.
+
+Current summary:
+{summary}
+
+New messages:
+{transcript}
+"""
+
+
+def chat_session_settings() -> dict:
+    config = {**DEFAULT_CHAT_SESSION_SETTINGS, **getattr(settings, 'CHAT_SESSIONS', {})}
+    if config['HISTORY_TURNS'] is None:
+        config['HISTORY_TURNS'] = config['RECENT_TURNS'] + config['SUMMARIZE_TURNS']
+    return config
+
+
+def get_or_create_session(session_id=None, project_id=None) -> ChatSession:
+    """
+    The session ``session_id`` or, when it is missing, a new one for
+    ``project_id``. Raises ChatSession.DoesNotExist for an unknown id,
+    Project.DoesNotExist for an unknown project and ValueError when the
+    session belongs to another project.
+    """
+    if session_id:
+        session = ChatSession.objects.get(pk=session_id)
+        if project_id and str(session.project_id) != str(project_id):
+            raise ValueError("Chat session belongs to another project")
+        return session
+    project = Project.objects.get(pk=project_id) if project_id else None
+    return ChatSession.objects.create(project=project)
+
+
+def recent_messages(session: ChatSession) -> list:
+    """
+    The messages not yet folded into the summary, at most the newest
+    HISTORY_TURNS turns. Turns that left the RECENT_TURNS window stay here
+    until a fold takes them.
+    """
+    limit = 2 * chat_session_settings()['HISTORY_TURNS']
+    first_unsummarized = session.messages.values('id')[session.summarized_count:session.summarized_count + 1]
+    newest = session.messages.filter(id__gte=Subquery(first_unsummarized)).order_by('-id')[:limit]
+    return list(reversed(newest))
+
+
+def transcript(messages) -> str:
+    return "\n".join(f"{'User' if m.role == ChatMessage.ROLE_USER else 'Assistant'}: {m.content}" for m in messages)
+
+
+def history_prompt(session: ChatSession) -> str:
+    """The conversation so far as it goes into the chat prompt."""
+    parts = []
+    if session.summary:
+        parts.append(f"Conversation summary:\n{session.summary}")
+    messages = recent_messages(session)
+    if messages:
+        parts.append(f"Recent conversation:\n{transcript(messages)}")
+    return "\n\n".join(parts)
+
+
+def record_turn(session: ChatSession, user_message: str, reply: str):
+    """Store one question/reply pair and schedule summarization when due."""
+    with transaction.atomic():
+        ChatMessage.objects.bulk_create([
+            ChatMessage(session=session, role=ChatMessage.ROLE_USER, content=user_message),
+            ChatMessage(session=session, role=ChatMessage.ROLE_ASSISTANT, content=reply),
+        ])
+        ChatSession.objects.filter(pk=session.pk).update(updated_at=timezone.now())
+        if summary_due(session):
+            transaction.on_commit(lambda: get_executor().submit(summarize_session, session.pk))
+
+
+def record_stream(session: ChatSession, user_message: str, chunks):
+    """Pass ``chunks`` through and record the turn once the stream completes."""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    record_turn(session, user_message, "".join(parts))
+
+
+def summary_due(session: ChatSession) -> bool:
+    config = chat_session_settings()
+    unsummarized = session.messages.count() - session.summarized_count
+    return unsummarized >= 2 * (config['RECENT_TURNS'] + config['SUMMARIZE_TURNS'])
+
+
+def fold_into_summary(session_id) -> bool:
+    """
+    Summarize the oldest SUMMARIZE_TURNS unsummarized turns into the session
+    summary. Returns False when there was nothing to do or another worker
+    got there first.
+    """
+    session = ChatSession.objects.get(pk=session_id)
+    if not summary_due(session) or not llm_available():
+        return False
+    count = 2 * chat_session_settings()['SUMMARIZE_TURNS']
+    messages = list(session.messages.all()[session.summarized_count:session.summarized_count + count])
+    prompt = SUMMARY_PROMPT.format(summary=session.summary or "(none yet)", transcript=transcript(messages))
+    summary = generate_text('chat_summary', prompt).strip()
+    # Only apply if nobody folded these messages in the meantime.
+    return bool(ChatSession.objects.filter(pk=session.pk, summarized_count=session.summarized_count).update(
+        summary=summary, summarized_count=session.summarized_count + len(messages),
+    ))
+
+
+def summarize_session(session_id):
+    close_old_connections()
+    try:
+        # Catch up in steps when earlier folds failed and the gap grew
+        while fold_into_summary(session_id):
+            pass
+    except Exception:
+        logger.exception("Summarizing chat session %s failed", session_id)
+    finally:
+        close_old_connections()
+
+
+def session_to_dict(session: ChatSession) -> dict:
+    return {
+        "id": str(session.id),
+        "project_id": session.project_id,
+        "summary": session.summary,
+        "summarized_count": session.summarized_count,
+        "messages": [
+            {"role": m.role, "content": m.content, "created_at": m.created_at.isoformat()}
+            for m in session.messages.all()
+        ],
+        "created_at": session.created_at.isoformat(),
+        "updated_at": session.updated_at.isoformat(),
+    }
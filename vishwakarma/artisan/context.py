@@ -0,0 +1,48 @@
+"""
+Rendered project context for LLM prompts, materialized in Django's cache.
+
+generate_content_view used to load the project and re-render it on every
+call. The rendered text is now cached under the project's id and
+``updated_at``, so a hot conversation only reads that one column. Every
+write to a project, including its analyses (analyses.touch_projects), moves
+``updated_at``, so an edit is picked up by the next call in every worker,
+even with the default per-process cache. Superseded entries are never read
+again and expire after PROJECT_CONTEXT_TIMEOUT seconds.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .analyses import with_analyses
+from .models import Project
+from .retrieval import analysis_sections, project_header
+
+KEY_PREFIX = 'artisan:project-context:'
+
+
+def context_key(project_id, updated_at) -> str:
+    return f"{KEY_PREFIX}{project_id}:{updated_at.timestamp()}"
+
+
+def render_project_context(project) -> str:
+    parts = [project_header(project)]
+    if project.answers:
+        parts.append("Answers:\n" + "\n".join(f"  {i}. {answer}" for i, answer in enumerate(project.answers, 1)))
+    if project.analysis_content:
+        parts.extend(analysis_sections(project.analysis_content))
+    return "\n".join(parts) + "\n"
+
+
+def get_project_context(project_id):
+    """The rendered context of one project, or None when it does not exist."""
+    updated_at = Project.objects.filter(pk=project_id).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return None
+    text = cache.get(context_key(project_id, updated_at))
+    if text is None:
+        project = with_analyses(Project.objects.filter(pk=project_id)).first()
+        if project is None:
+            return None
+        text = render_project_context(project)
+        # Keyed by the version actually rendered, in case it moved since the first read
+        cache.set(context_key(project.pk, project.updated_at), text, getattr(settings, 'PROJECT_CONTEXT_TIMEOUT', 300))
+    return text
@@ -0,0 +1,164 @@
+"""
+In-process request metrics, rendered in the Prometheus text format.
+
+InstrumentationMiddleware opens a RequestStats for every request; the DB
+execute wrapper and llm_timer() add to it, so each request ends up split
+into ORM time, LLM time and the rest. Histograms use fixed buckets and a
+lock per series, which keeps recording to a few dict lookups and additions.
+Numbers are per process: with several workers, Prometheus scrapes each one.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from .resilience import breaker
+
+# Seconds; roughly the Prometheus client defaults, stretched for LLM calls.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += value
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.total
+
+
+class Registry:
+    """Histograms keyed by metric name and label values, created on first use."""
+
+    def __init__(self):
+        self._metrics = {}  # name -> (help, buckets, label names, {label values: Histogram})
+        self._gauges = {}   # name -> (help, callback returning the current value)
+        self._lock = threading.Lock()
+
+    def register(self, name, help_text, buckets, labels):
+        self._metrics[name] = (help_text, buckets, labels, {})
+
+    def register_gauge(self, name, help_text, callback):
+        """A value read at scrape time, e.g. circuit breaker state."""
+        self._gauges[name] = (help_text, callback)
+
+    def observe(self, name, value, *label_values):
+        _, buckets, _, series = self._metrics[name]
+        histogram = series.get(label_values)
+        if histogram is None:
+            with self._lock:
+                histogram = series.setdefault(label_values, Histogram(buckets))
+        histogram.observe(value)
+
+    def clear(self):
+        with self._lock:
+            for _, _, _, series in self._metrics.values():
+                series.clear()
+
+    def render(self) -> str:
+        # observe() may add a label set while we render; work on copies
+        with self._lock:
+            metrics = [(name, meta, sorted(series.items())) for name, (*meta, series) in sorted(self._metrics.items())]
+            gauges = sorted(self._gauges.items())
+        lines = []
+        for name, (help_text, buckets, labels), series in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for label_values, histogram in series:
+                counts, total = histogram.snapshot()
+                base = ','.join(f'{k}="{escape(v)}"' for k, v in zip(labels, label_values))
+                cumulative = 0
+                for bound, count in zip(buckets + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{join_labels(base, f"le={quote(bound)}")}}} {cumulative}')
+                lines.append(f"{name}_sum{{{base}}} {total}")
+                lines.append(f"{name}_count{{{base}}} {cumulative}")
+        for name, (help_text, callback) in gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {callback()}")
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def quote(value) -> str:
+    return f'"{value}"'
+
+
+def join_labels(*parts) -> str:
+    return ','.join(p for p in parts if p)
+
+
+registry = Registry()
+registry.register('artisan_request_duration_seconds', "Wall time per request.", DURATION_BUCKETS, ('view', 'method'))
+registry.register('artisan_request_db_queries', "DB queries per request.", COUNT_BUCKETS, ('view',))
+registry.register('artisan_request_db_seconds', "Time spent in DB queries per request.", DURATION_BUCKETS, ('view',))
+registry.register('artisan_request_llm_seconds', "Time spent waiting on the LLM per request.", DURATION_BUCKETS, ('view',))
+registry.register('artisan_response_size_bytes', "Response body size (streams excluded).", SIZE_BUCKETS, ('view',))
+registry.register('artisan_llm_call_seconds', "Duration of individual LLM calls.", DURATION_BUCKETS, ('endpoint', 'backend'))
+registry.register_gauge('artisan_llm_breaker_open', "1 while the LLM circuit breaker refuses calls.",
+                        lambda: int(breaker.is_open()))
+registry.register_gauge('artisan_llm_breaker_consecutive_failures', "Consecutive failed or slow LLM calls.",
+                        lambda: breaker.consecutive_failures)
+
+
+class RequestStats:
+    __slots__ = ('db_queries', 'db_seconds', 'llm_seconds')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.llm_seconds = 0.0
+
+
+current_stats = contextvars.ContextVar('artisan_request_stats', default=None)
+
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    """connection.execute_wrapper() hook that times queries for the current request."""
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats = current_stats.get()
+        if stats is not None:
+            stats.db_queries += 1
+            stats.db_seconds += time.perf_counter() - started
+
+
+@contextmanager
+def llm_timer(endpoint, backend):
+    """Attribute the enclosed LLM call to the current request and to the call histogram."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stats = current_stats.get()
+        if stats is not None:
+            stats.llm_seconds += elapsed
+        registry.observe('artisan_llm_call_seconds', elapsed, endpoint, type(backend).__name__)
+
+
+def record_request(view, method, duration, stats, response_size=None):
+    registry.observe('artisan_request_duration_seconds', duration, view, method)
+    registry.observe('artisan_request_db_queries', stats.db_queries, view)
+    registry.observe('artisan_request_db_seconds', stats.db_seconds, view)
+    registry.observe('artisan_request_llm_seconds', stats.llm_seconds, view)
+    if response_size is not None:
+        registry.observe('artisan_response_size_bytes', response_size, view)
@@ -0,0 +1,112 @@
+"""
+Background execution of analysis_view requests.
+
+Jobs are persisted as AnalysisJob rows and run on an in-process thread pool,
+so no external broker is needed. Identical requests (same payload) share a
+job: resubmitting while a job is pending or running returns that job, and a
+done job is returned for ANALYSIS_JOB_RESULT_TTL seconds unless the caller
+forces a new run. Failed jobs can be retried.
+
+The pool lives in the web process, so a restart loses whatever it was
+running. A pending or running job that hasn't moved for
+ANALYSIS_JOB_STALE_SECONDS is treated as abandoned: it is marked failed and
+the next identical request queues a new one.
+"""
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from .models import AnalysisJob, Project
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'ANALYSIS_JOB_WORKERS', 4),
+                thread_name_prefix='analysis-job',
+            )
+        return _executor
+
+
+def request_hash(data: dict) -> str:
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+LIVE_STATUSES = (AnalysisJob.STATUS_PENDING, AnalysisJob.STATUS_RUNNING)
+
+
+def expire_abandoned(digest: str) -> int:
+    """Mark live jobs for ``digest`` that stopped moving (e.g. lost in a restart) as failed."""
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'ANALYSIS_JOB_STALE_SECONDS', 600))
+    return AnalysisJob.objects.filter(request_hash=digest, status__in=LIVE_STATUSES, updated_at__lt=cutoff).update(
+        status=AnalysisJob.STATUS_FAILED, error="Abandoned: the worker stopped before finishing", updated_at=timezone.now()
+    )
+
+
+def enqueue_analysis(data: dict, force=False) -> AnalysisJob:
+    """
+    Return the job for ``data``, creating and scheduling it if needed.
+    ``force`` skips a recent done job (a live one is still shared).
+    """
+    digest = request_hash(data)
+    expire_abandoned(digest)
+    live = AnalysisJob.objects.filter(request_hash=digest, status__in=LIVE_STATUSES).first()
+    if live is not None:
+        return live
+    if not force:
+        fresh_since = timezone.now() - timedelta(seconds=getattr(settings, 'ANALYSIS_JOB_RESULT_TTL', 3600))
+        done = (
+            AnalysisJob.objects.filter(request_hash=digest, status=AnalysisJob.STATUS_DONE, updated_at__gte=fresh_since)
+            .order_by('-updated_at').first()
+        )
+        if done is not None:
+            return done
+
+    project_id = data.get('project_id')
+    project = Project.objects.filter(pk=project_id).first() if project_id else None
+    try:
+        with transaction.atomic():
+            job = AnalysisJob.objects.create(project=project, request_hash=digest, payload=data)
+    except IntegrityError:
+        # A concurrent identical request won the race; share its job.
+        return AnalysisJob.objects.filter(request_hash=digest, status__in=LIVE_STATUSES).get()
+
+    transaction.on_commit(lambda: get_executor().submit(run_job, job.pk))
+    return job
+
+
+def run_job(job_id):
+    from .views import run_analysis
+
+    close_old_connections()
+    try:
+        updated = AnalysisJob.objects.filter(pk=job_id, status=AnalysisJob.STATUS_PENDING).update(
+            status=AnalysisJob.STATUS_RUNNING, updated_at=timezone.now()
+        )
+        if not updated:
+            return
+        job = AnalysisJob.objects.get(pk=job_id)
+        try:
+            result = run_analysis(job.payload)
+        except Exception as e:
+            job.status = AnalysisJob.STATUS_FAILED
+            job.error = str(e)
+            job.save(update_fields=['status', 'error', 'updated_at'])
+            return
+        job.status = AnalysisJob.STATUS_DONE
+        job.result = result
+        job.save(update_fields=['status', 'result', 'updated_at'])
+    finally:
+        close_old_connections()
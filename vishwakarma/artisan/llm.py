@@ -0,0 +1,435 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.db import DatabaseError, IntegrityError, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .instrumentation import llm_timer
+from .resilience import DeadlineExceeded, breaker, deadline_for
+from .models import CachedResponse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = {
+    'BACKEND': 'artisan.llm_backends.GeminiBackend',
+    'OPTIONS': {},
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """The provider configured by settings.LLM_BACKEND, built once per process."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                config = getattr(settings, 'LLM_BACKEND', DEFAULT_BACKEND)
+                backend_class = import_string(config.get('BACKEND', DEFAULT_BACKEND['BACKEND']))
+                _backend = backend_class(**config.get('OPTIONS', {}))
+    return _backend
+
+
+@receiver(setting_changed)
+def reset_backend(setting, **kwargs):
+    """Rebuild the backend on next use when LLM_BACKEND changes (override_settings in tests)."""
+    global _backend
+    if setting == 'LLM_BACKEND':
+        with _backend_lock:
+            _backend = None
+
+
+def llm_available() -> bool:
+    """False when the backend lacks credentials; callers fall back or refuse."""
+    return get_backend().is_configured()
+
+
+def warm_up():
+    """
+    Build the backend client ahead of the first request. Called from
+    wsgi.py/asgi.py when LLM_WARMUP is set in the environment.
+    """
+    get_backend().warm_up()
+
+
+DEFAULT_CACHE_SETTINGS = {
+    'MAX_ENTRIES': 512,
+    # Seconds a response stays fresh, per endpoint. 0 disables caching.
+    'TTL': {
+        'analysis': 60 * 60,
+        'chat': 5 * 60,
+        'generate_content': 15 * 60,
+    },
+}
+
+
+def cache_settings() -> dict:
+    configured = getattr(settings, 'LLM_CACHE', {})
+    return {
+        'MAX_ENTRIES': configured.get('MAX_ENTRIES', DEFAULT_CACHE_SETTINGS['MAX_ENTRIES']),
+        'TTL': {**DEFAULT_CACHE_SETTINGS['TTL'], **configured.get('TTL', {})},
+    }
+
+
+def cache_key(model_name: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model_name}\x00{prompt}".encode('utf-8')).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe in-process LRU with a per-entry expiry time."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, project_id, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, key, value, ttl: float, project_id=None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, project_id, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_projects(self, project_ids):
+        project_ids = set(project_ids)
+        with self._lock:
+            stale = [k for k, entry in self._entries.items() if entry[1] in project_ids]
+            for k in stale:
+                del self._entries[k]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ResponseCache:
+    """
+    Two-tier cache for LLM responses: an in-process LRU in front of the
+    CachedResponse table, which is shared by every worker.
+    """
+
+    PURGE_INTERVAL = 10 * 60
+
+    def __init__(self):
+        self.memory = LRUCache(cache_settings()['MAX_ENTRIES'])
+        self._last_purge = time.monotonic()
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        row = CachedResponse.objects.filter(key=key).first()
+        if row is None:
+            return None
+        now = timezone.now()
+        if row.expires_at <= now:
+            row.delete()
+            return None
+        self.memory.set(key, row.response, (row.expires_at - now).total_seconds(), row.project_id)
+        return row.response
+
+    def set(self, key, value, endpoint: str, model_name: str, ttl: int, project_id=None):
+        """
+        Store a response. A failed write to the table (e.g. SQLite's
+        "database is locked" under concurrent writers) is logged and the
+        entry stays in memory only; the caller still gets its reply.
+        """
+        self.memory.set(key, value, ttl, project_id)
+        try:
+            try:
+                with transaction.atomic():
+                    self._persist(key, value, endpoint, model_name, ttl, project_id)
+            except IntegrityError:
+                # The project id comes from the client and may not exist; keep the entry untagged
+                with transaction.atomic():
+                    self._persist(key, value, endpoint, model_name, ttl, None)
+            if time.monotonic() - self._last_purge > self.PURGE_INTERVAL:
+                self._last_purge = time.monotonic()
+                self.purge_expired()
+        except DatabaseError:
+            logger.exception("Could not store the %s response in the cache table", endpoint)
+
+    def _persist(self, key, value, endpoint, model_name, ttl, project_id):
+        CachedResponse.objects.update_or_create(
+            key=key,
+            defaults={
+                'endpoint': endpoint,
+                'model_name': model_name,
+                'project_id': project_id,
+                'response': value,
+                'expires_at': timezone.now() + timedelta(seconds=ttl),
+            },
+        )
+
+    def invalidate_projects(self, project_ids):
+        self.memory.invalidate_projects(project_ids)
+        CachedResponse.objects.filter(project_id__in=project_ids).delete()
+
+    def purge_expired(self):
+        CachedResponse.objects.filter(expires_at__lte=timezone.now()).delete()
+
+    def clear(self):
+        self.memory.clear()
+        CachedResponse.objects.all().delete()
+
+
+response_cache = ResponseCache()
+
+
+DEFAULT_SINGLE_FLIGHT_SETTINGS = {
+    # Also coalesce across worker processes through a lock in Django's cache.
+    # Needs a shared cache backend and only applies to cached endpoints.
+    'CROSS_PROCESS': False,
+    'LOCK_TIMEOUT': 60,
+    'POLL_INTERVAL': 0.1,
+}
+
+
+def single_flight_settings() -> dict:
+    return {**DEFAULT_SINGLE_FLIGHT_SETTINGS, **getattr(settings, 'LLM_SINGLE_FLIGHT', {})}
+
+
+class SingleFlight:
+    """
+    Identical concurrent calls share one execution: the first caller for a
+    key runs ``fn`` and every caller that arrives while it runs gets the same
+    result (or exception) instead of making its own LLM call.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines; calls are shared within one event loop."""
+
+    def __init__(self):
+        self._calls = weakref.WeakKeyDictionary()  # loop -> {key: asyncio.Future}
+
+    async def do(self, key, fn):
+        calls = self._calls.setdefault(asyncio.get_running_loop(), {})
+        future = calls.get(key)
+        if future is not None:
+            # wait() leaves the shared future alone if this caller is cancelled
+            await asyncio.wait([future])
+            if future.cancelled():
+                # The leader's client went away; take over the call
+                return await self.do(key, fn)
+            return future.result()
+        future = calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del calls[key]
+
+
+in_flight = SingleFlight()
+async_in_flight = AsyncSingleFlight()
+
+
+def lock_key(key: str) -> str:
+    return f"artisan:llm-inflight:{key}"
+
+
+def wait_for_other_process(key: str, config: dict):
+    """
+    Poll the shared response cache while another process holds the lock for
+    ``key``. Returns its response, or None when the lock went away (or timed
+    out) without one and this process should make the call itself.
+    """
+    deadline = time.monotonic() + config['LOCK_TIMEOUT']
+    while time.monotonic() < deadline:
+        time.sleep(config['POLL_INTERVAL'])
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+        if cache.get(lock_key(key)) is None:
+            return response_cache.get(key)
+    return None
+
+
+@contextmanager
+def guarded_call(endpoint: str, backend):
+    """
+    Wrap one backend call: refuse it while the circuit breaker is open,
+    yield the endpoint's deadline, and report the outcome to the breaker.
+    Failures at or past the deadline are raised as DeadlineExceeded.
+    """
+    trial = breaker.allow()
+    deadline = deadline_for(endpoint)
+    started = time.monotonic()
+    try:
+        with llm_timer(endpoint, backend):
+            yield deadline
+    except Exception as e:
+        elapsed = time.monotonic() - started
+        if isinstance(e, TimeoutError) or elapsed >= deadline:
+            error = DeadlineExceeded(f"No reply from the LLM within {deadline}s")
+            breaker.record(elapsed, error, trial)
+            raise error from e
+        breaker.record(elapsed, e, trial)
+        raise
+    except BaseException:
+        # Cancelled or abandoned (e.g. the client hung up on a stream)
+        breaker.release(trial)
+        raise
+    else:
+        breaker.record(time.monotonic() - started, trial=trial)
+
+
+def call_backend(backend, endpoint: str, prompt: str, key: str, ttl: int, project_id=None) -> str:
+    """Make the LLM call, holding the cross-process lock when that is enabled."""
+    config = single_flight_settings()
+    locked = False
+    if config['CROSS_PROCESS'] and ttl > 0:
+        locked = cache.add(lock_key(key), 1, config['LOCK_TIMEOUT'])
+        if not locked:
+            text = wait_for_other_process(key, config)
+            if text is not None:
+                return text
+    try:
+        with guarded_call(endpoint, backend) as deadline:
+            text = backend.generate(prompt, timeout=deadline)
+        if ttl > 0:
+            response_cache.set(key, text, endpoint, backend.model_name, ttl, project_id)
+        return text
+    finally:
+        if locked:
+            cache.delete(lock_key(key))
+
+
+def generate_text(endpoint: str, prompt: str, project_id=None) -> str:
+    """
+    Return the model's text for ``prompt``, serving repeats from the response
+    cache and sharing one call between concurrent identical requests.
+    ``project_id`` tags the entry so edits to the project evict it.
+    """
+    backend = get_backend()
+    ttl = cache_settings()['TTL'].get(endpoint, 0)
+    key = cache_key(backend.model_name, prompt)
+    if ttl > 0:
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+
+    # Concurrent identical prompts wait for the first caller's response.
+    return in_flight.do(key, lambda: call_backend(backend, endpoint, prompt, key, ttl, project_id))
+
+
+def stream_text(endpoint: str, prompt: str, project_id=None):
+    """
+    Generator version of generate_text() that yields text chunks as the model
+    produces them. A cache hit is yielded as a single chunk; a completed
+    stream is cached like a regular response.
+    """
+    backend = get_backend()
+    ttl = cache_settings()['TTL'].get(endpoint, 0)
+    key = cache_key(backend.model_name, prompt)
+    if ttl > 0:
+        cached = response_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+    parts = []
+    with guarded_call(endpoint, backend) as deadline:
+        for chunk in backend.stream(prompt, timeout=deadline):
+            parts.append(chunk)
+            yield chunk
+
+    if ttl > 0:
+        response_cache.set(key, ''.join(parts), endpoint, backend.model_name, ttl, project_id)
+
+
+# asyncio primitives belong to one event loop, so keep one semaphore per loop.
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def llm_semaphore() -> asyncio.Semaphore:
+    """Caps in-flight async LLM calls at settings.LLM_MAX_CONCURRENCY."""
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(getattr(settings, 'LLM_MAX_CONCURRENCY', 64))
+    return semaphore
+
+
+async def agenerate_text(endpoint: str, prompt: str, project_id=None) -> str:
+    """Async twin of generate_text() that awaits the model call."""
+    backend = get_backend()
+    ttl = cache_settings()['TTL'].get(endpoint, 0)
+    key = cache_key(backend.model_name, prompt)
+    if ttl > 0:
+        # Memory hits never leave the event loop; only the DB tier needs a thread.
+        cached = response_cache.memory.get(key)
+        if cached is None:
+            cached = await sync_to_async(response_cache.get)(key)
+        if cached is not None:
+            return cached
+
+    async def call():
+        async with llm_semaphore():
+            with guarded_call(endpoint, backend) as deadline:
+                text = await asyncio.wait_for(backend.agenerate(prompt, timeout=deadline), deadline)
+        if ttl > 0:
+            await sync_to_async(response_cache.set)(key, text, endpoint, backend.model_name, ttl, project_id)
+        return text
+
+    return await async_in_flight.do(key, call)
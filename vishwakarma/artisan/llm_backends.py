@@ -0,0 +1,198 @@
+"""
+LLM providers behind artisan/llm.py.
+
+The backend is chosen with settings.LLM_BACKEND, in the same shape as
+Django's CACHES entries::
+
+    LLM_BACKEND = {
+        'BACKEND': 'artisan.llm_backends.LocalBackend',
+        'OPTIONS': {'LATENCY': {'distribution': 'lognormal', 'median': 0.8, 'sigma': 0.5}},
+    }
+
+GeminiBackend talks to Google Gemini. LocalBackend is an offline stand-in
+with configurable latency, error rate and canned/templated replies, meant
+for load-testing the Django side without the live service.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+
+
+class LLMError(Exception):
+    """Raised by a backend when the provider fails to produce a reply."""
+
+
+class BaseBackend:
+    model_name = ''
+
+    def __init__(self, **options):
+        self.options = options
+
+    def is_configured(self) -> bool:
+        return True
+
+    def warm_up(self):
+        pass
+
+    # ``timeout`` is the caller's deadline in seconds; backends should give up
+    # (raise) rather than keep the request waiting past it.
+
+    def generate(self, prompt: str, timeout: float = None) -> str:
+        raise NotImplementedError
+
+    def stream(self, prompt: str, timeout: float = None):
+        """Yield the reply in chunks; the default sends it in one piece."""
+        yield self.generate(prompt, timeout)
+
+    async def agenerate(self, prompt: str, timeout: float = None) -> str:
+        raise NotImplementedError
+
+
+class GeminiBackend(BaseBackend):
+    """
+    Google Gemini through google.generativeai. The library pulls in grpc and
+    protobuf, which takes seconds, so it is imported on the first call (or by
+    warm_up()) and one GenerativeModel is kept per process.
+    """
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.api_key = options.get('API_KEY', GEMINI_API_KEY)
+        self.model_name = options.get('MODEL', 'gemini-1.5-flash')
+        self._model = None
+        self._lock = threading.Lock()
+
+    def is_configured(self) -> bool:
+        return bool(self.api_key)
+
+    def get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import google.generativeai as genai
+                    genai.configure(api_key=self.api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def warm_up(self):
+        if self.is_configured():
+            self.get_model()
+
+    @staticmethod
+    def request_options(timeout):
+        return {'timeout': timeout} if timeout else None
+
+    def generate(self, prompt: str, timeout: float = None) -> str:
+        return self.get_model().generate_content(prompt, request_options=self.request_options(timeout)).text
+
+    def stream(self, prompt: str, timeout: float = None):
+        response = self.get_model().generate_content(
+            prompt, stream=True, request_options=self.request_options(timeout)
+        )
+        for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+    async def agenerate(self, prompt: str, timeout: float = None) -> str:
+        response = await self.get_model().generate_content_async(
+            prompt, request_options=self.request_options(timeout)
+        )
+        return response.text
+
+
+DEFAULT_LOCAL_RESPONSES = [
+    json.dumps({
+        "title": "Local Stand-in Analysis",
+        "content": "Deterministic reply from the local LLM backend ({prompt_length} prompt characters).",
+        "reply": "Configure LLM_BACKEND to use Gemini for real insights.",
+    }),
+]
+
+
+class LocalBackend(BaseBackend):
+    """
+    Offline stand-in for load testing. Options:
+
+    * ``LATENCY``  - seconds per call: ``{'distribution': 'fixed', 'value': 0.5}``,
+      ``'uniform'`` (``min``/``max``), ``'normal'`` (``mean``/``stddev``) or
+      ``'lognormal'`` (``median``/``sigma``). Defaults to no delay.
+    * ``ERROR_RATE`` - fraction of calls that raise LLMError.
+    * ``RESPONSES`` - replies to pick from; ``{prompt_length}`` and
+      ``{prompt_hash}`` are substituted. The pick depends only on the prompt,
+      so a given prompt always gets the same reply.
+    * ``CHUNK_SIZE`` - characters per chunk when streaming.
+    * ``SEED`` - seeds latency and error sampling for repeatable runs.
+    """
+    model_name = 'local'
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.latency = options.get('LATENCY', {'distribution': 'fixed', 'value': 0})
+        self.error_rate = float(options.get('ERROR_RATE', 0))
+        self.responses = options.get('RESPONSES') or DEFAULT_LOCAL_RESPONSES
+        self.chunk_size = int(options.get('CHUNK_SIZE', 16))
+        self._random = random.Random(options.get('SEED'))
+        self._lock = threading.Lock()
+
+    def sample_latency(self) -> float:
+        spec = self.latency
+        kind = spec.get('distribution', 'fixed')
+        with self._lock:
+            if kind == 'uniform':
+                value = self._random.uniform(spec.get('min', 0), spec.get('max', 0))
+            elif kind == 'normal':
+                value = self._random.gauss(spec.get('mean', 0), spec.get('stddev', 0))
+            elif kind == 'lognormal':
+                value = self._random.lognormvariate(math.log(spec.get('median', 1)), spec.get('sigma', 0))
+            else:
+                value = spec.get('value', 0)
+        return max(float(value), 0.0)
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def reply_for(self, prompt: str) -> str:
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        template = self.responses[int(digest, 16) % len(self.responses)]
+        return template.replace('{prompt_length}', str(len(prompt))).replace('{prompt_hash}', digest[:12])
+
+    @staticmethod
+    def check_deadline(latency, timeout):
+        if timeout is not None and latency > timeout:
+            raise TimeoutError(f"Simulated LLM reply took longer than {timeout}s")
+
+    def generate(self, prompt: str, timeout: float = None) -> str:
+        latency = self.sample_latency()
+        time.sleep(min(latency, timeout) if timeout is not None else latency)
+        self.check_deadline(latency, timeout)
+        if self.should_fail():
+            raise LLMError("Simulated LLM failure")
+        return self.reply_for(prompt)
+
+    def stream(self, prompt: str, timeout: float = None):
+        text = self.reply_for(prompt)
+        chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)] or ['']
+        latency = self.sample_latency()
+        delay = latency / len(chunks)
+        for i, chunk in enumerate(chunks):
+            time.sleep(delay)
+            self.check_deadline(delay * (i + 1), timeout)
+            if i == 0 and self.should_fail():
+                raise LLMError("Simulated LLM failure")
+            yield chunk
+
+    async def agenerate(self, prompt: str, timeout: float = None) -> str:
+        latency = self.sample_latency()
+        await asyncio.sleep(min(latency, timeout) if timeout is not None else latency)
+        self.check_deadline(latency, timeout)
+        if self.should_fail():
+            raise LLMError("Simulated LLM failure")
+        return self.reply_for(prompt)
@@ -0,0 +1,60 @@
+import random
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from artisan import metrics
+from artisan.models import Project
+
+# Monthly ranges the dashboard used to draw random numbers from; gauges
+# (engagement, conversion) are percentages and are not divided per day.
+MONTHLY_RANGES = {
+    'sales.revenue': (100000, 200000),
+    'sales.products.Premium Collection': (50000, 80000),
+    'sales.products.Classic Line': (30000, 60000),
+    'sales.products.Budget Series': (15000, 35000),
+    'marketing.platforms.Instagram.reach': (40000, 50000),
+    'marketing.platforms.YouTube.reach': (20000, 30000),
+    'marketing.platforms.Facebook.reach': (30000, 40000),
+    'marketing.platforms.Instagram.engagement': (7, 10),
+    'marketing.platforms.YouTube.engagement': (10, 14),
+    'marketing.platforms.Facebook.engagement': (5, 7),
+    'marketing.platforms.Instagram.conversion': (2, 3),
+    'marketing.platforms.YouTube.conversion': (3, 5),
+    'marketing.platforms.Facebook.conversion': (1, 2),
+    'marketing.campaigns.Summer Collection.spent': (10000, 20000),
+    'marketing.campaigns.Summer Collection.revenue': (30000, 60000),
+    'marketing.campaigns.Festive Special.spent': (10000, 18000),
+    'marketing.campaigns.Festive Special.revenue': (25000, 50000),
+    'customerSegments.ageGroups.18-25': (30000, 40000),
+    'customerSegments.ageGroups.26-35': (60000, 80000),
+    'customerSegments.ageGroups.36-50': (40000, 50000),
+    'customerSegments.gender.Female': (90000, 110000),
+    'customerSegments.gender.Male': (40000, 60000),
+}
+
+
+class Command(BaseCommand):
+    help = "Fill the metrics store with synthetic daily history for demos and load tests."
+
+    def add_arguments(self, parser):
+        parser.add_argument('project_ids', nargs='*', type=int, help="Projects to seed (default: all)")
+        parser.add_argument('--days', type=int, default=365)
+
+    def handle(self, *args, project_ids, days, **options):
+        projects = Project.objects.all()
+        if project_ids:
+            projects = projects.filter(pk__in=project_ids)
+            if projects.count() != len(set(project_ids)):
+                raise CommandError("Unknown project id")
+
+        today = date.today()
+        for project in projects:
+            points = []
+            for name, (low, high) in MONTHLY_RANGES.items():
+                per_day = 1 if metrics.METRICS[name] == metrics.MEAN else 30
+                for offset in range(days):
+                    day = today - timedelta(days=days - 1 - offset)
+                    points.append((name, day, random.uniform(low, high) / per_day))
+            metrics.ingest(project, points)
+            self.stdout.write(f"Seeded {len(points)} points for {project}")
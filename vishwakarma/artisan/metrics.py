@@ -0,0 +1,260 @@
+"""
+Per-project metrics time series behind statistics_view.
+
+Every (project, metric) pair is one MetricSeries row holding packed
+little-endian float64 arrays:
+
+* ``daily``   - one value per day from ``start_date``, NaN where nothing was recorded
+* ``monthly`` - ``sum, count`` pairs per calendar month from ``start_date``'s month
+* ``weekly``  - ``sum, count`` pairs per week from the Monday of ``start_date``'s week
+
+The rollups are adjusted point by point on ingest, so reading the last few
+months never touches ``daily`` and costs the same however long the history is.
+"""
+import math
+import sys
+from array import array
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import MetricSeries
+
+SUM = 'sum'
+MEAN = 'mean'
+
+PRODUCTS = ["Premium Collection", "Classic Line", "Budget Series"]
+PLATFORMS = ["Instagram", "YouTube", "Facebook"]
+CAMPAIGNS = ["Summer Collection", "Festive Special"]
+AGE_GROUPS = ["18-25", "26-35", "36-50"]
+GENDERS = ["Female", "Male"]
+
+# Metric name -> how its rollups are read (SUM totals, MEAN averages points)
+METRICS = {'sales.revenue': SUM}
+METRICS.update({f'sales.products.{name}': SUM for name in PRODUCTS})
+for name in PLATFORMS:
+    METRICS[f'marketing.platforms.{name}.reach'] = SUM
+    METRICS[f'marketing.platforms.{name}.engagement'] = MEAN
+    METRICS[f'marketing.platforms.{name}.conversion'] = MEAN
+for name in CAMPAIGNS:
+    METRICS[f'marketing.campaigns.{name}.spent'] = SUM
+    METRICS[f'marketing.campaigns.{name}.revenue'] = SUM
+METRICS.update({f'customerSegments.ageGroups.{name}': SUM for name in AGE_GROUPS})
+METRICS.update({f'customerSegments.gender.{name}': SUM for name in GENDERS})
+
+
+def max_span_days() -> int:
+    """Days one series may cover; ``daily`` holds a slot for each, recorded or not."""
+    return getattr(settings, 'METRICS_MAX_SPAN_DAYS', 10 * 366)
+
+
+def unpack(blob) -> array:
+    values = array('d')
+    values.frombytes(bytes(blob or b''))
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def pack(values: array) -> bytes:
+    if sys.byteorder == 'big':
+        values = array('d', values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def month_index(d: date) -> int:
+    return d.year * 12 + d.month - 1
+
+
+def week_start(d: date) -> date:
+    return d - timedelta(days=d.weekday())
+
+
+def month_start(index: int) -> date:
+    return date(index // 12, index % 12 + 1, 1)
+
+
+class SeriesWriter:
+    """Unpacks one MetricSeries, applies points in memory and saves once."""
+
+    def __init__(self, series: MetricSeries):
+        self.series = series
+        self.daily = unpack(series.daily)
+        self.monthly = unpack(series.monthly)
+        self.weekly = unpack(series.weekly)
+
+    def _rebase(self, new_start: date):
+        # A point older than start_date: pad every array at the front
+        old_start = self.series.start_date
+        self.daily[0:0] = array('d', [math.nan]) * (old_start - new_start).days
+        self.monthly[0:0] = array('d', [0.0, 0.0]) * (month_index(old_start) - month_index(new_start))
+        self.weekly[0:0] = array('d', [0.0, 0.0]) * ((week_start(old_start) - week_start(new_start)).days // 7)
+        self.series.start_date = new_start
+
+    @staticmethod
+    def _bump(rollup: array, bucket: int, delta_sum: float, delta_count: int):
+        if len(rollup) < 2 * (bucket + 1):
+            rollup.extend([0.0] * (2 * (bucket + 1) - len(rollup)))
+        rollup[2 * bucket] += delta_sum
+        rollup[2 * bucket + 1] += delta_count
+
+    def add(self, day: date, value: float):
+        """
+        Record ``value`` for ``day``, replacing any earlier value for that day.
+        ValueError when the day would stretch the series past max_span_days().
+        """
+        start = self.series.start_date
+        end = start + timedelta(days=max(len(self.daily), 1) - 1)
+        if (max(day, end) - min(day, start)).days >= max_span_days():
+            raise ValueError(f"{day} is more than {max_span_days()} days away from the other '{self.series.name}' points")
+        if day < self.series.start_date:
+            self._rebase(day)
+        start = self.series.start_date
+        offset = (day - start).days
+        if offset >= len(self.daily):
+            self.daily.extend([math.nan] * (offset + 1 - len(self.daily)))
+
+        previous = self.daily[offset]
+        if math.isnan(previous):
+            delta_sum, delta_count = value, 1
+        else:
+            delta_sum, delta_count = value - previous, 0
+        self.daily[offset] = value
+
+        self._bump(self.monthly, month_index(day) - month_index(start), delta_sum, delta_count)
+        self._bump(self.weekly, (week_start(day) - week_start(start)).days // 7, delta_sum, delta_count)
+
+    def save(self):
+        self.series.daily = pack(self.daily)
+        self.series.monthly = pack(self.monthly)
+        self.series.weekly = pack(self.weekly)
+        self.series.save()
+
+
+def ingest(project, points):
+    """
+    Store ``points`` - an iterable of ``(metric, date, value)`` - for
+    ``project``. Each touched series is read and written once. Nothing is
+    stored when a point raises ValueError.
+    """
+    by_metric = {}
+    for name, day, value in points:
+        by_metric.setdefault(name, []).append((day, float(value)))
+
+    with transaction.atomic():
+        existing = {
+            s.name: s for s in MetricSeries.objects.select_for_update().filter(project=project, name__in=by_metric)
+        }
+        for name, series_points in by_metric.items():
+            series = existing.get(name)
+            if series is None:
+                series = MetricSeries(project=project, name=name, start_date=min(d for d, _ in series_points))
+            writer = SeriesWriter(series)
+            for day, value in series_points:
+                writer.add(day, value)
+            writer.save()
+    return sum(len(p) for p in by_metric.values())
+
+
+def monthly_tail(series: MetricSeries, months: int, until: date):
+    """
+    Rollup values for the ``months`` calendar months ending with ``until``'s
+    month, oldest first. Only the tail of the monthly rollup is unpacked.
+    """
+    rollup = series.monthly if series is not None else b''
+    first_bucket = month_index(until) - months + 1 - (month_index(series.start_date) if series is not None else 0)
+    values = []
+    for bucket in range(first_bucket, first_bucket + months):
+        if series is None or bucket < 0 or 16 * (bucket + 1) > len(rollup):
+            values.append((0.0, 0))
+            continue
+        total, count = unpack(rollup[16 * bucket:16 * (bucket + 1)])
+        values.append((total, int(count)))
+    return values
+
+
+def rollup_value(kind, total, count):
+    if kind == MEAN:
+        return total / count if count else 0.0
+    return total
+
+
+def growth_label(current, previous):
+    if not previous:
+        return "+0%"
+    change = round((current - previous) * 100 / previous)
+    return f"+{change}%" if change >= 0 else f"{change}%"
+
+
+def project_statistics(project_id, today=None):
+    """The statistics_view payload for one project, read from the rollups only."""
+    today = today or date.today()
+    series = {}
+    if project_id is not None:
+        series = {s.name: s for s in MetricSeries.objects.filter(project_id=project_id).defer('daily', 'weekly')}
+
+    # Scalars and growth compare complete months; the revenue chart ends
+    # with the current, partial month.
+    last_complete = month_start(month_index(today)) - timedelta(days=1)
+
+    def last_months(name, months, until=last_complete):
+        return [rollup_value(METRICS[name], *bucket) for bucket in monthly_tail(series.get(name), months, until)]
+
+    def current(name):
+        return last_months(name, 1)[0]
+
+    def share(values):
+        total = sum(values)
+        return [round(v * 100 / total) if total else 0 for v in values]
+
+    month_labels = [month_start(month_index(today) - i).strftime('%b') for i in range(5, -1, -1)]
+
+    products = []
+    for name in PRODUCTS:
+        previous, latest = last_months(f'sales.products.{name}', 2)
+        products.append({"name": name, "sales": round(latest), "growth": growth_label(latest, previous)})
+
+    platforms = [{
+        "name": name,
+        "reach": round(current(f'marketing.platforms.{name}.reach')),
+        "engagement": f"{current(f'marketing.platforms.{name}.engagement'):.1f}%",
+        "conversion": f"{current(f'marketing.platforms.{name}.conversion'):.1f}%",
+    } for name in PLATFORMS]
+
+    campaigns = []
+    for name in CAMPAIGNS:
+        spent = current(f'marketing.campaigns.{name}.spent')
+        revenue = current(f'marketing.campaigns.{name}.revenue')
+        campaigns.append({
+            "name": name,
+            "roi": round(revenue * 100 / spent) if spent else 0,
+            "spent": round(spent),
+            "revenue": round(revenue),
+        })
+
+    age_values = [current(f'customerSegments.ageGroups.{name}') for name in AGE_GROUPS]
+    gender_values = [current(f'customerSegments.gender.{name}') for name in GENDERS]
+
+    return {
+        "sales": {
+            "revenue": [round(v) for v in last_months('sales.revenue', 6, today)],
+            "months": month_labels,
+            "products": products,
+        },
+        "marketing": {
+            "platforms": platforms,
+            "campaigns": campaigns,
+        },
+        "customerSegments": {
+            "ageGroups": [
+                {"range": name, "percentage": pct, "value": round(value)}
+                for name, pct, value in zip(AGE_GROUPS, share(age_values), age_values)
+            ],
+            "gender": [
+                {"type": name, "percentage": pct, "value": round(value)}
+                for name, pct, value in zip(GENDERS, share(gender_values), gender_values)
+            ],
+        },
+    }
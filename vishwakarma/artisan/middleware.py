@@ -0,0 +1,102 @@
+import cProfile
+import logging
+import random
+import time
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .instrumentation import RequestStats, current_stats, record_request
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INSTRUMENTATION = {
+    # Requests slower than this are logged, and dumped when they were profiled.
+    'SLOW_REQUEST_MS': 1000,
+    # Fraction of sync requests run under cProfile; 0 disables profiling.
+    'PROFILE_SAMPLE_RATE': 0.0,
+    'PROFILE_DIR': None,
+}
+
+
+def instrumentation_settings() -> dict:
+    return {**DEFAULT_INSTRUMENTATION, **getattr(settings, 'INSTRUMENTATION', {})}
+
+
+def view_label(request) -> str:
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unresolved>'
+    return match.view_name or match._func_path
+
+
+def response_size(response):
+    # Streaming bodies are produced after the middleware returns.
+    if response.streaming:
+        return None
+    return len(response.content)
+
+
+class InstrumentationMiddleware:
+    """
+    Records wall time, DB query count/time, LLM time and response size per
+    view into artisan.instrumentation.registry, and optionally profiles a
+    sample of sync requests, keeping the profiles of slow ones.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        config = instrumentation_settings()
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        profiler = cProfile.Profile() if random.random() < config['PROFILE_SAMPLE_RATE'] else None
+        started = time.perf_counter()
+        try:
+            if profiler is not None:
+                response = profiler.runcall(self.get_response, request)
+            else:
+                response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        duration = time.perf_counter() - started
+        self.finish(request, response, duration, stats, config, profiler)
+        return response
+
+    async def __acall__(self, request):
+        config = instrumentation_settings()
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        duration = time.perf_counter() - started
+        self.finish(request, response, duration, stats, config)
+        return response
+
+    def finish(self, request, response, duration, stats, config, profiler=None):
+        view = view_label(request)
+        record_request(view, request.method, duration, stats, response_size(response))
+        if duration * 1000 < config['SLOW_REQUEST_MS']:
+            return
+        logger.warning(
+            "Slow request %s %s (%s): %.0fms total, %.0fms in %d DB queries, %.0fms in LLM calls",
+            request.method, request.path, view, duration * 1000,
+            stats.db_seconds * 1000, stats.db_queries, stats.llm_seconds * 1000,
+        )
+        if profiler is not None and config['PROFILE_DIR']:
+            directory = Path(config['PROFILE_DIR'])
+            directory.mkdir(parents=True, exist_ok=True)
+            filename = f"{view.replace(':', '_')}-{time.strftime('%Y%m%d-%H%M%S')}-{int(duration * 1000)}ms.prof"
+            profiler.dump_stats(directory / filename)
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.4 on 2026-10-18 17:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('artisan', '0012_project_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=128)),
+                ('start_date', models.DateField()),
+                ('daily', models.BinaryField(default=bytes)),
+                ('monthly', models.BinaryField(default=bytes)),
+                ('weekly', models.BinaryField(default=bytes)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='metric_series', to='artisan.project')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('project', 'name'), name='unique_project_metric')],
+            },
+        ),
+    ]
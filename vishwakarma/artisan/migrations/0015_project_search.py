@@ -0,0 +1,81 @@
+# Generated by Django 5.1.4 on 2026-10-18 17:56
+
+from django.db import migrations, models
+
+# Frozen copies of the DDL in artisan/search.py as of this migration; later
+# changes to the search index need a migration of their own.
+FTS_TABLE = 'artisan_project_fts'
+FTS_TRIGGERS = ('artisan_project_fts_ai', 'artisan_project_fts_ad', 'artisan_project_fts_au')
+PG_SEARCH_INDEX = 'artisan_project_search_idx'
+PG_SEARCH_COLUMNS = (
+    "to_tsvector('english'::regconfig, "
+    "coalesce(\"name\", '') || ' ' || "
+    "coalesce(\"description\", '') || ' ' || "
+    "coalesce(\"answers\"::text, ''))"
+)
+
+SQLITE_FTS_INSERT = (
+    "INSERT INTO artisan_project_fts(rowid, name, description, answers) "
+    "SELECT {row}.id, {row}.name, {row}.description, "
+    "(SELECT group_concat(value, ' ') FROM json_each({row}.answers))"
+)
+SQLITE_FTS_SQL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS artisan_project_fts USING fts5(name, description, answers)",
+    f"""CREATE TRIGGER IF NOT EXISTS artisan_project_fts_ai AFTER INSERT ON artisan_project BEGIN
+        {SQLITE_FTS_INSERT.format(row='new')};
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS artisan_project_fts_ad AFTER DELETE ON artisan_project BEGIN
+        DELETE FROM artisan_project_fts WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS artisan_project_fts_au AFTER UPDATE OF name, description, answers
+    ON artisan_project BEGIN
+        DELETE FROM artisan_project_fts WHERE rowid = old.id;
+        {SQLITE_FTS_INSERT.format(row='new')};
+    END""",
+    "DELETE FROM artisan_project_fts",
+    SQLITE_FTS_INSERT.format(row='artisan_project') + " FROM artisan_project",
+]
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {PG_SEARCH_INDEX} ON artisan_project USING gin (({PG_SEARCH_COLUMNS}))"
+        )
+    elif connection.vendor == 'sqlite':
+        for statement in SQLITE_FTS_SQL:
+            schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute(f"DROP INDEX IF EXISTS {PG_SEARCH_INDEX}")
+    elif connection.vendor == 'sqlite':
+        for trigger in FTS_TRIGGERS:
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('artisan', '0014_chatsession'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['type', '-id'], name='artisan_project_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['questions_answered', '-id'], name='artisan_project_answered_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['created_date', '-id'], name='artisan_project_created_idx'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Frozen copy of analyses.META_KEYS
+META_KEYS = frozenset({'question_index', 'version', 'is_gemini', 'input_hash', 'model_name'})
+
+
+def copy_analysis_content(apps, schema_editor):
+    """One version-1 row per analysis in the old blob."""
+    Project = apps.get_model('artisan', 'Project')
+    ProjectAnalysis = apps.get_model('artisan', 'ProjectAnalysis')
+    rows = []
+    for project in Project.objects.exclude(analysis_content=None).iterator(chunk_size=500):
+        content = project.analysis_content
+        if isinstance(content, dict):
+            # Saved by analysis_view for its latest question
+            content = {max(len(project.answers or []) - 1, 0): content} if content else {}
+        elif isinstance(content, list):
+            content = {i: item for i, item in enumerate(content) if isinstance(item, dict)}
+        else:
+            content = {}
+        for index, item in content.items():
+            input_hash = item.get('input_hash', '')
+            rows.append(ProjectAnalysis(
+                project_id=project.pk,
+                question_index=index,
+                # Metadata lives in columns; left in content it would differ
+                # from what analyses.build_row stores and force a new version
+                content={k: v for k, v in item.items() if k not in META_KEYS},
+                is_gemini=bool(item.get('is_gemini', input_hash)),
+                input_hash=input_hash,
+            ))
+        if len(rows) >= 500:
+            ProjectAnalysis.objects.bulk_create(rows)
+            rows = []
+    ProjectAnalysis.objects.bulk_create(rows)
+
+
+def restore_analysis_content(apps, schema_editor):
+    Project = apps.get_model('artisan', 'Project')
+    ProjectAnalysis = apps.get_model('artisan', 'ProjectAnalysis')
+    contents = {}
+    for row in ProjectAnalysis.objects.filter(is_current=True).order_by('project_id', 'question_index'):
+        entry = {**row.content, 'is_gemini': row.is_gemini}
+        if row.input_hash:
+            entry['input_hash'] = row.input_hash
+        contents.setdefault(row.project_id, []).append(entry)
+    for project_id, content in contents.items():
+        Project.objects.filter(pk=project_id).update(analysis_content=content)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('artisan', '0015_project_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question_index', models.PositiveSmallIntegerField()),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('is_current', models.BooleanField(default=True)),
+                ('content', models.JSONField(default=dict)),
+                ('model_name', models.CharField(blank=True, default='', max_length=64)),
+                ('is_gemini', models.BooleanField(default=False)),
+                ('input_hash', models.CharField(blank=True, default='', max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='analyses', to='artisan.project')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('project', 'question_index', 'version'), name='unique_analysis_version'), models.UniqueConstraint(condition=models.Q(('is_current', True)), fields=('project', 'question_index'), name='unique_current_analysis')],
+            },
+        ),
+        migrations.RunPython(copy_analysis_content, restore_analysis_content),
+        migrations.RemoveField(
+            model_name='project',
+            name='analysis_content',
+        ),
+    ]
@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 
 class Project(models.Model):
@@ -14,21 +16,189 @@ class Project(models.Model):
     questions_answered = models.BooleanField(default=False)
     answers = models.JSONField(default=list, blank=True)
     charts = models.JSONField(default=dict, blank=True)
-    analysis_content = models.JSONField(blank=True, null=True)
     description = models.TextField(blank=True, null=True)  # <-- Add this line
 
     # <-- Added field to fix the NOT NULL constraint error
     is_first_iteration = models.BooleanField(default=True)
+    # Drives the ETag/Last-Modified validators of the project endpoints
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-id']
+        # Filters of api_projects, each ending in the -id keyset order it pages by.
+        # Full-text search indexes are vendor-specific; see artisan/search.py.
+        indexes = [
+            models.Index(fields=['type', '-id'], name='artisan_project_type_idx'),
+            models.Index(fields=['questions_answered', '-id'], name='artisan_project_answered_idx'),
+            models.Index(fields=['created_date', '-id'], name='artisan_project_created_idx'),
+        ]
 
     def __str__(self) -> str:
         return f"{self.name} ({self.type})"
 
+    @property
+    def analysis_content(self) -> list:
+        """
+        The current analysis of each question, in question order. Uses the
+        rows prefetched by analyses.with_analyses() when present.
+        """
+        rows = getattr(self, 'current_analyses', None)
+        if rows is None:
+            rows = self.analyses.filter(is_current=True).order_by('question_index') if self.pk else []
+        return [row.as_entry() for row in rows]
+
 
 class ApiKeys(models.Model):
     project = models.OneToOneField(Project, on_delete=models.CASCADE, related_name='api_keys', null=True, blank=True)
     instagram = models.CharField(max_length=128, blank=True, null=True)
     youtube = models.CharField(max_length=128, blank=True, null=True)
     flipkart = models.CharField(max_length=128, blank=True, null=True)
+
+
+class ProjectAnalysis(models.Model):
+    """
+    One version of the analysis of one question (see artisan/analyses.py).
+    Regenerating or editing an analysis adds a version and clears
+    ``is_current`` on the previous one, so the history is kept.
+    """
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='analyses')
+    question_index = models.PositiveSmallIntegerField()
+    version = models.PositiveIntegerField(default=1)
+    is_current = models.BooleanField(default=True)
+    # title, analysis, chartType, chartData as returned by analysis_view
+    content = models.JSONField(default=dict)
+    model_name = models.CharField(max_length=64, blank=True, default='')
+    is_gemini = models.BooleanField(default=False)
+    # Digest of the answers the analysis was generated from (artisan/reanalysis.py)
+    input_hash = models.CharField(max_length=64, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # Also the (project, question_index) index for history lookups
+            models.UniqueConstraint(
+                fields=['project', 'question_index', 'version'], name='unique_analysis_version',
+            ),
+            models.UniqueConstraint(
+                fields=['project', 'question_index'], condition=models.Q(is_current=True),
+                name='unique_current_analysis',
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.project_id}:Q{self.question_index} v{self.version}"
+
+    def as_entry(self) -> dict:
+        return {**self.content, "question_index": self.question_index, "version": self.version}
+
+
+class CachedResponse(models.Model):
+    """Persistent tier of the LLM response cache (see artisan/llm.py)."""
+    key = models.CharField(max_length=64, primary_key=True)
+    endpoint = models.CharField(max_length=32)
+    model_name = models.CharField(max_length=64)
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='cached_responses', null=True, blank=True)
+    response = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self) -> str:
+        return f"{self.endpoint}:{self.key[:12]}"
+
+
+class AnalysisJob(models.Model):
+    """An analysis_view request queued on the local worker pool (artisan/jobs.py)."""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='analysis_jobs', null=True, blank=True)
+    request_hash = models.CharField(max_length=64)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # Identical requests share one live job; finished ones may be rerun.
+            models.UniqueConstraint(
+                fields=['request_hash'],
+                condition=models.Q(status__in=['pending', 'running']),
+                name='unique_live_analysis_job',
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.id} ({self.status})"
+
+
+class MetricSeries(models.Model):
+    """
+    One metric of one project (e.g. "sales.revenue") stored as packed float64
+    arrays rather than a row per point; see artisan/metrics.py for the layout.
+    """
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='metric_series')
+    name = models.CharField(max_length=128)
+    start_date = models.DateField()
+    # Daily values from start_date, NaN where no point was recorded
+    daily = models.BinaryField(default=bytes)
+    # (sum, count) pairs per calendar month / ISO week, maintained on ingest
+    monthly = models.BinaryField(default=bytes)
+    weekly = models.BinaryField(default=bytes)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'name'], name='unique_project_metric'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.project_id}:{self.name}"
+
+
+class ChatSession(models.Model):
+    """
+    A chat conversation about one project (see artisan/chat.py). Turns older
+    than the recent window are folded into ``summary``; ``summarized_count``
+    is how many messages the summary covers.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='chat_sessions', null=True, blank=True)
+    summary = models.TextField(blank=True, default='')
+    summarized_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.id} ({self.project_id})"
+
+
+class ChatMessage(models.Model):
+    ROLE_USER = 'user'
+    ROLE_ASSISTANT = 'assistant'
+    ROLE_CHOICES = [
+        (ROLE_USER, 'User'),
+        (ROLE_ASSISTANT, 'Assistant'),
+    ]
+
+    session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='messages')
+    role = models.CharField(max_length=16, choices=ROLE_CHOICES)
+    content = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self) -> str:
+        return f"{self.role}: {self.content[:40]}"
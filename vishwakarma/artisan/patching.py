@@ -0,0 +1,240 @@
+"""
+JSON Patch (RFC 6902) and JSON Merge Patch (RFC 7396) for api_project_detail.
+
+A project is patched as the document project_document() returns. The patch
+is applied in Python to validate it and build the response. The result is
+saved with ``update_fields`` limited to the columns it touched, so changing
+one answer no longer rewrites every column.
+
+For JSON Patch ops that only replace, add or remove single values inside
+``answers`` or ``charts``, native_update() builds the equivalent
+``jsonb_set`` / ``#-`` (PostgreSQL) or ``json_set`` / ``json_remove``
+(SQLite) expression. The database then edits the stored value in place, and
+concurrent patches to different answers don't overwrite each other.
+"""
+import copy
+import json
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+JSON_PATCH = 'application/json-patch+json'
+MERGE_PATCH = 'application/merge-patch+json'
+
+# Members of the patchable document; analysis_content is stored per question.
+DOCUMENT_FIELDS = (
+    "name", "type", "description", "created_date", "questions_answered", "answers", "charts", "analysis_content",
+)
+# JSON columns that native_update() can edit in place.
+NATIVE_FIELDS = ("answers", "charts")
+MAX_OPERATIONS = 100
+
+
+class PatchError(ValueError):
+    """The patch is malformed or does not apply to the document (400)."""
+
+
+class PatchConflict(PatchError):
+    """A ``test`` operation failed (409)."""
+
+
+def project_document(project) -> dict:
+    return {
+        "name": project.name,
+        "type": project.type,
+        "description": project.description,
+        "created_date": project.created_date.isoformat(),
+        "questions_answered": project.questions_answered,
+        "answers": copy.deepcopy(project.answers),
+        "charts": copy.deepcopy(project.charts),
+        "analysis_content": project.analysis_content,
+    }
+
+
+def parse_pointer(path) -> list:
+    """RFC 6901 JSON Pointer -> reference tokens."""
+    if not isinstance(path, str) or (path and not path.startswith('/')):
+        raise PatchError(f"Invalid JSON pointer: {path!r}")
+    return [token.replace('~1', '/').replace('~0', '~') for token in path.split('/')[1:]]
+
+
+def array_index(container: list, token: str, for_add=False) -> int:
+    if for_add and token == '-':
+        return len(container)
+    if not token.isdigit() or (token != '0' and token.startswith('0')):
+        raise PatchError(f"Invalid array index: {token!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not for_add):
+        raise PatchError(f"Array index out of range: {token}")
+    return index
+
+
+def resolve(document, tokens):
+    for token in tokens:
+        if isinstance(document, dict) and token in document:
+            document = document[token]
+        elif isinstance(document, list):
+            document = document[array_index(document, token)]
+        else:
+            raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+    return document
+
+
+def add(document, tokens, value):
+    if not tokens:
+        return value
+    parent = resolve(document, tokens[:-1])
+    if isinstance(parent, dict):
+        parent[tokens[-1]] = value
+    elif isinstance(parent, list):
+        parent.insert(array_index(parent, tokens[-1], for_add=True), value)
+    else:
+        raise PatchError(f"Cannot add to a scalar at /{'/'.join(tokens[:-1])}")
+    return document
+
+
+def remove(document, tokens):
+    if not tokens:
+        raise PatchError("Cannot remove the whole document")
+    parent = resolve(document, tokens[:-1])
+    if isinstance(parent, dict) and tokens[-1] in parent:
+        return parent.pop(tokens[-1])
+    if isinstance(parent, list):
+        return parent.pop(array_index(parent, tokens[-1]))
+    raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+
+
+def apply_operation(document, operation):
+    if not isinstance(operation, dict) or 'op' not in operation or 'path' not in operation:
+        raise PatchError("Every operation needs 'op' and 'path'")
+    op = operation['op']
+    tokens = parse_pointer(operation['path'])
+    if op in ('add', 'replace', 'test') and 'value' not in operation:
+        raise PatchError(f"'{op}' needs a 'value'")
+    if op == 'add':
+        return add(document, tokens, copy.deepcopy(operation['value']))
+    if op == 'remove':
+        remove(document, tokens)
+        return document
+    if op == 'replace':
+        resolve(document, tokens)
+        if tokens:
+            remove(document, tokens)
+        return add(document, tokens, copy.deepcopy(operation['value']))
+    if op in ('move', 'copy'):
+        source = parse_pointer(operation.get('from'))
+        if op == 'move' and tokens[:len(source)] == source and tokens != source:
+            raise PatchError("Cannot move a value into one of its children")
+        value = copy.deepcopy(resolve(document, source))
+        if op == 'move':
+            remove(document, source)
+        return add(document, tokens, value)
+    if op == 'test':
+        if resolve(document, tokens) != operation['value']:
+            raise PatchConflict(f"Test failed at {operation['path']}")
+        return document
+    raise PatchError(f"Unknown operation: {op!r}")
+
+
+def apply_json_patch(document: dict, operations) -> dict:
+    """The document after ``operations``; the input is left untouched."""
+    if not isinstance(operations, list):
+        raise PatchError("A JSON Patch must be an array of operations")
+    if len(operations) > MAX_OPERATIONS:
+        raise PatchError(f"At most {MAX_OPERATIONS} operations per patch")
+    document = copy.deepcopy(document)
+    for operation in operations:
+        document = apply_operation(document, operation)
+    if not isinstance(document, dict) or set(document) != set(DOCUMENT_FIELDS):
+        raise PatchError(f"The patched project must keep exactly these members: {', '.join(DOCUMENT_FIELDS)}")
+    return document
+
+
+def apply_merge_patch(target, patch):
+    """RFC 7396: objects merge recursively, null deletes, anything else replaces."""
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+    result = copy.deepcopy(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
+
+
+def merge_patch_document(document: dict, patch) -> dict:
+    if not isinstance(patch, dict):
+        raise PatchError("A merge patch must be a JSON object")
+    unknown = set(patch) - set(DOCUMENT_FIELDS)
+    if unknown:
+        raise PatchError(f"Unknown member(s): {', '.join(sorted(unknown))}")
+    removed = [key for key, value in patch.items() if value is None and key not in ('description', 'analysis_content')]
+    if removed:
+        raise PatchError(f"Cannot remove: {', '.join(sorted(removed))}")
+    patched = apply_merge_patch(document, patch)
+    patched.setdefault('description', None)
+    patched.setdefault('analysis_content', [])
+    return patched
+
+
+def changed_members(before: dict, after: dict) -> dict:
+    return {key: after[key] for key in DOCUMENT_FIELDS if after.get(key) != before.get(key)}
+
+
+def sqlite_path(value, tokens) -> str:
+    """JSON path for ``tokens`` inside ``value``; arrays and objects need different steps."""
+    path = '$'
+    for token in tokens:
+        if isinstance(value, list):
+            path += f'[{token}]'
+            value = value[int(token)] if int(token) < len(value) else None
+        else:
+            path += '."' + token.replace('"', '""') + '"'
+            value = value.get(token) if isinstance(value, dict) else None
+    return path
+
+
+def postgres_path(tokens) -> str:
+    return '{' + ','.join('"' + t.replace('\\', '\\\\').replace('"', '\\"') + '"' for t in tokens) + '}'
+
+
+def native_update(document: dict, operations) -> dict:
+    """
+    ``{column: expression}`` applying ``operations`` inside the JSON columns
+    in the database, or None when some operation has no native equivalent
+    (array inserts, move/copy/test, whole-column writes, other fields).
+    """
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        return None
+    state = copy.deepcopy(document)
+    sql = {}
+    params = {}
+    for operation in operations:
+        op = operation['op']
+        tokens = parse_pointer(operation['path'])
+        if op not in ('add', 'replace', 'remove') or len(tokens) < 2 or tokens[0] not in NATIVE_FIELDS:
+            return None
+        parent = resolve(state, tokens[:-1])
+        # json_set/jsonb_set overwrite array slots, so array "add" (an insert) is left to Python
+        if op == 'add' and not isinstance(parent, dict):
+            return None
+        column, inner = tokens[0], tokens[1:]
+        current = sql.get(column, connection.ops.quote_name(column))
+        values = params.setdefault(column, [])
+        if connection.vendor == 'postgresql':
+            if op == 'remove':
+                sql[column] = f"({current} #- %s::text[])"
+                values.append(postgres_path(inner))
+            else:
+                sql[column] = f"jsonb_set({current}, %s::text[], %s::jsonb, true)"
+                values += [postgres_path(inner), json.dumps(operation['value'])]
+        else:
+            if op == 'remove':
+                sql[column] = f"json_remove({current}, %s)"
+                values.append(sqlite_path(state[column], inner))
+            else:
+                sql[column] = f"json_set({current}, %s, json(%s))"
+                values += [sqlite_path(state[column], inner), json.dumps(operation['value'])]
+        state = apply_operation(state, operation)
+    return {column: RawSQL(expression, params[column]) for column, expression in sql.items()}
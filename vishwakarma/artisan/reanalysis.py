@@ -0,0 +1,80 @@
+"""
+Incremental re-analysis of a project's answers.
+
+Every generated analysis records ``input_hash``, a digest of what its prompt
+was built from: the question index, the answer and the answers before it
+(analyses.input_hash). After the answers change, only the questions whose
+hash no longer matches are sent to the LLM again and the other analyses are
+kept as they are. Every analysis prompt includes the earlier answers, so
+editing answer ``i`` regenerates questions ``i`` onwards, while editing the
+last answer or appending new ones costs one call per touched question
+instead of a full set.
+
+Fallback analyses (LLM unavailable) and hand-written ones have no hash and
+are regenerated by the next pass.
+"""
+import logging
+
+from django.db import close_old_connections, transaction
+
+from . import analyses
+from .jobs import get_executor
+from .models import Project
+
+logger = logging.getLogger(__name__)
+
+
+def stale_questions(project, force=False) -> list:
+    """Indexes of the answers whose current analysis is missing or out of date."""
+    answers = project.answers or []
+    current = analyses.current_rows(project)
+    return [
+        i for i in range(len(answers))
+        if force or i not in current or current[i].input_hash != analyses.input_hash(i, answers)
+    ]
+
+
+def reanalyze_project(project_id, force=False) -> dict:
+    """
+    Regenerate the stale analyses of a project and store them in one write.
+    Raises Project.DoesNotExist. When the answers change while the LLM calls
+    run, nothing is saved (``superseded``); the edit that changed them is
+    expected to request its own pass.
+    """
+    from .views import analyze_answers
+
+    project = Project.objects.get(pk=project_id)
+    answers = list(project.answers or [])
+    current = analyses.current_rows(project)
+    stale = stale_questions(project, force)
+    # A fallback (LLM unavailable) never replaces an existing analysis
+    fresh = {
+        i: analysis for i, analysis in analyze_answers(answers, stale).items()
+        if analysis['is_gemini'] or i not in current
+    }
+
+    result = {"regenerated": sorted(fresh), "kept": len(answers) - len(fresh), "superseded": False}
+    with transaction.atomic():
+        project = Project.objects.select_for_update().get(pk=project_id)
+        if project.answers != answers:
+            return {**result, "regenerated": [], "superseded": True}
+        # Analyses of questions that no longer have an answer are retired
+        analyses.save_analyses(project, fresh, answers, keep=range(len(answers)))
+    return result
+
+
+def run_reanalysis(project_id, force=False):
+    close_old_connections()
+    try:
+        reanalyze_project(project_id, force)
+    except Project.DoesNotExist:
+        pass
+    except Exception:
+        logger.exception("Re-analysis of project %s failed", project_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_reanalysis(project_id, force=False):
+    """Re-analyze on the analysis worker pool once the current transaction commits."""
+    transaction.on_commit(lambda: get_executor().submit(run_reanalysis, project_id, force))
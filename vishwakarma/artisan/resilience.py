@@ -0,0 +1,145 @@
+"""
+Deadlines and a circuit breaker for LLM calls.
+
+Every call gets a per-endpoint deadline, passed down to the backend (the
+Gemini client turns it into an RPC timeout). The breaker opens after
+BREAKER_FAILURES consecutive failures, where a timeout or a reply slower
+than BREAKER_SLOW_SECONDS counts as a failure. While it is open, calls fail
+at once with CircuitOpen and the views serve their fallbacks. After
+BREAKER_RESET_SECONDS one trial call is let through: success closes the
+breaker and failure opens it again. Only the trial's outcome moves a breaker
+that is not closed; calls that started before it opened may still finish,
+and their results are ignored.
+
+Breaker state is per process and is shown at /api/llm/status/ and /metrics.
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+
+from .llm_backends import LLMError
+
+DEFAULT_RESILIENCE_SETTINGS = {
+    # Seconds per endpoint; 'default' covers endpoints not listed.
+    'DEADLINES': {
+        'analysis': 10,
+        'chat': 20,
+        'generate_content': 30,
+        'default': 30,
+    },
+    'BREAKER_FAILURES': 5,
+    'BREAKER_SLOW_SECONDS': 15,
+    'BREAKER_RESET_SECONDS': 30,
+}
+
+
+class LLMUnavailable(LLMError):
+    """The LLM was not asked or did not answer in time; serve a fallback."""
+
+
+class DeadlineExceeded(LLMUnavailable):
+    pass
+
+
+class CircuitOpen(LLMUnavailable):
+    pass
+
+
+def resilience_settings() -> dict:
+    configured = getattr(settings, 'LLM_RESILIENCE', {})
+    return {
+        **DEFAULT_RESILIENCE_SETTINGS,
+        **configured,
+        'DEADLINES': {**DEFAULT_RESILIENCE_SETTINGS['DEADLINES'], **configured.get('DEADLINES', {})},
+    }
+
+
+def deadline_for(endpoint: str) -> float:
+    deadlines = resilience_settings()['DEADLINES']
+    return deadlines.get(endpoint, deadlines['default'])
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.last_failure = ''
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        Raise CircuitOpen unless a call may go through now. Returns True when
+        the call is the half-open trial; pass that on to record()/release().
+        """
+        config = resilience_settings()
+        with self._lock:
+            if self.state == self.CLOSED:
+                return False
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= config['BREAKER_RESET_SECONDS']:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+        raise CircuitOpen("LLM circuit breaker is open")
+
+    def retry_after(self) -> int:
+        """Seconds until the breaker lets a trial call through; 0 when it would now."""
+        if self.state != self.OPEN:
+            return 0
+        remaining = resilience_settings()['BREAKER_RESET_SECONDS'] - (time.monotonic() - self.opened_at)
+        return max(math.ceil(remaining), 0)
+
+    def record(self, elapsed: float, error: Exception = None, trial=False):
+        config = resilience_settings()
+        failed = error is not None or elapsed > config['BREAKER_SLOW_SECONDS']
+        with self._lock:
+            if trial:
+                self._trial_running = False
+            elif self.state != self.CLOSED:
+                # Started before the breaker opened; only the trial decides now
+                return
+            if not failed:
+                self.state = self.CLOSED
+                self.consecutive_failures = 0
+                return
+            self.consecutive_failures += 1
+            self.last_failure = f"slow reply ({elapsed:.1f}s)" if error is None else f"{type(error).__name__}: {error}"
+            if trial or self.consecutive_failures >= config['BREAKER_FAILURES']:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def release(self, trial=False):
+        """Forget a call that ended without an outcome, freeing the half-open trial if it was one."""
+        if trial:
+            with self._lock:
+                self._trial_running = False
+
+    def is_open(self) -> bool:
+        """True while calls are being refused (the reset period has not passed)."""
+        return self.retry_after() > 0
+
+    def reset(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def to_dict(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "last_failure": self.last_failure,
+            "retry_after": self.retry_after(),
+        }
+
+
+breaker = CircuitBreaker()
@@ -0,0 +1,275 @@
+"""
+Chat context retrieval.
+
+Instead of pasting whole projects into the chat prompt, project answers and
+analyses are split into chunks and indexed with BM25; chatbot_view sends the
+model the project's header plus the top-k chunks for the user's message.
+Leaving out the project searches every project, which makes cross-project
+questions possible without blowing the context window.
+
+The index lives in the process and is refreshed lazily: each search compares
+the projects' ``updated_at`` with what was indexed and re-chunks only what
+changed, so edits made by other workers are picked up too. A chat about one
+project checks only that project's row.
+
+A message with no indexed term (e.g. "summarize my project") scores nothing;
+the prompt then gets the project's leading chunks, or across projects the
+most recently updated ones, instead of a bare header.
+"""
+import math
+import re
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .analyses import with_analyses
+from .models import Project
+
+DEFAULT_RETRIEVAL_SETTINGS = {
+    'CHUNK_SIZE': 500,
+    'CHUNK_OVERLAP': 50,
+    'TOP_K': 6,
+}
+
+# Standard BM25 parameters
+K1 = 1.5
+B = 0.75
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do for from has have how i if in into is it its me my "
+    "of on or our so than that the their them then there these they this to was we what when "
+    "which who why will with would you your".split()
+)
+
+
+def retrieval_settings() -> dict:
+    return {**DEFAULT_RETRIEVAL_SETTINGS, **getattr(settings, 'RETRIEVAL', {})}
+
+
+def tokenize(text: str) -> list:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def simple_split(text: str, chunk_size: int, overlap: int) -> list:
+    """Paragraph, then sentence, then hard splits; used when langchain is not installed."""
+    chunks = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        while len(paragraph) > chunk_size:
+            cut = paragraph.rfind('. ', 0, chunk_size)
+            cut = cut + 1 if cut > chunk_size // 2 else chunk_size
+            chunks.append(paragraph[:cut].strip())
+            paragraph = paragraph[max(cut - overlap, 1):].strip()
+        if paragraph:
+            chunks.append(paragraph)
+    return chunks
+
+
+_splitter = None
+
+
+def split_text(text: str) -> list:
+    global _splitter
+    config = retrieval_settings()
+    if _splitter is None:
+        try:
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
+        except ImportError:
+            _splitter = False
+        else:
+            _splitter = RecursiveCharacterTextSplitter(
+                chunk_size=config['CHUNK_SIZE'], chunk_overlap=config['CHUNK_OVERLAP']
+            )
+    if _splitter:
+        return _splitter.split_text(text)
+    return simple_split(text, config['CHUNK_SIZE'], config['CHUNK_OVERLAP'])
+
+
+def project_header(project) -> str:
+    header = (
+        f"Project: {project.name}\n"
+        f"Type: {project.type}\n"
+        f"Created: {project.created_date}\n"
+        f"Questions Answered: {'Yes' if project.questions_answered else 'No'}"
+    )
+    if project.description:
+        header += f"\nDescription: {project.description}"
+    return header
+
+
+def analysis_sections(analysis_content) -> list:
+    """Readable text for each analysis entry (a dict, or a list of dicts)."""
+    items = analysis_content if isinstance(analysis_content, list) else [analysis_content]
+    sections = []
+    for item in items:
+        if not isinstance(item, dict):
+            sections.append(str(item))
+            continue
+        lines = [f"Analysis: {item.get('title', 'Untitled')}"]
+        for key in ('content', 'analysis', 'reply'):
+            if item.get(key):
+                lines.append(str(item[key]))
+        chart = item.get('chartData') or {}
+        if chart.get('labels') and chart.get('data'):
+            pairs = ', '.join(f"{label}: {value}" for label, value in zip(chart['labels'], chart['data']))
+            lines.append(f"Chart ({item.get('chartType', 'chart')}): {pairs}")
+        sections.append('\n'.join(lines))
+    return sections
+
+
+def project_chunks(project) -> list:
+    """``(text, tokens)`` pairs for the answers and analyses of ``project``."""
+    sections = [f"Answer {i}: {answer}" for i, answer in enumerate(project.answers or [], 1)]
+    if project.analysis_content:
+        sections += analysis_sections(project.analysis_content)
+    chunks = []
+    for section in sections:
+        for text in split_text(section):
+            tokens = tokenize(text)
+            if tokens:
+                chunks.append((text, tokens))
+    return chunks
+
+
+class ProjectIndex:
+    """BM25 over the chunks of every project, refreshed per project on change."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._indexed = {}     # project id -> updated_at
+        self._headers = {}     # project id -> header text
+        self._chunks = {}      # project id -> [(text, Counter, length)]
+        self._doc_freq = Counter()
+        self._total_length = 0
+        self._total_chunks = 0
+
+    def _forget(self, project_id):
+        for _, counts, length in self._chunks.pop(project_id, []):
+            self._doc_freq.subtract(counts.keys())
+            self._total_length -= length
+            self._total_chunks -= 1
+        self._headers.pop(project_id, None)
+        self._indexed.pop(project_id, None)
+
+    def _add(self, project):
+        entries = []
+        for text, tokens in project_chunks(project):
+            counts = Counter(tokens)
+            entries.append((text, counts, len(tokens)))
+            self._doc_freq.update(counts.keys())
+            self._total_length += len(tokens)
+            self._total_chunks += 1
+        self._chunks[project.pk] = entries
+        self._headers[project.pk] = project_header(project)
+        self._indexed[project.pk] = project.updated_at
+
+    def refresh(self):
+        """Bring the index in line with the Project table, re-chunking only changes."""
+        version = tuple(Project.objects.aggregate(count=Count('id'), latest=Max('updated_at')).values())
+        with self._lock:
+            if version == self._version:
+                return
+            current = dict(Project.objects.values_list('id', 'updated_at'))
+            for project_id in set(self._indexed) - set(current):
+                self._forget(project_id)
+            changed = [pk for pk, updated_at in current.items() if self._indexed.get(pk) != updated_at]
+            for project in with_analyses(Project.objects.filter(pk__in=changed)).iterator(chunk_size=200):
+                self._forget(project.pk)
+                self._add(project)
+            self._doc_freq = +self._doc_freq  # drop zero counts
+            self._version = version
+
+    def refresh_project(self, project_id) -> bool:
+        """Re-chunk one project if its row changed since indexing; False when it does not exist."""
+        updated_at = Project.objects.filter(pk=project_id).values_list('updated_at', flat=True).first()
+        with self._lock:
+            if updated_at is None:
+                self._forget(project_id)
+                return False
+            if self._indexed.get(project_id) != updated_at:
+                project = with_analyses(Project.objects.filter(pk=project_id)).first()
+                self._forget(project_id)
+                if project is not None:
+                    self._add(project)
+                self._doc_freq = +self._doc_freq
+            return project_id in self._indexed
+
+    def header(self, project_id):
+        return self._headers.get(project_id)
+
+    def search(self, query: str, k: int, project_id=None) -> list:
+        """
+        Top ``k`` ``(score, project_id, text)`` for ``query``, optionally
+        within one project. Call refresh() first.
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            if not terms or not self._total_chunks:
+                return []
+            average_length = self._total_length / self._total_chunks
+            idf = {
+                term: math.log(1 + (self._total_chunks - df + 0.5) / (df + 0.5))
+                for term in terms if (df := self._doc_freq.get(term, 0))
+            }
+            projects = [project_id] if project_id is not None else list(self._chunks)
+            scored = []
+            for pid in projects:
+                for text, counts, length in self._chunks.get(pid, []):
+                    score = 0.0
+                    for term, weight in idf.items():
+                        tf = counts.get(term)
+                        if tf:
+                            score += weight * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / average_length))
+                    if score > 0:
+                        scored.append((score, pid, text))
+        scored.sort(key=lambda hit: hit[0], reverse=True)
+        return scored[:k]
+
+    def leading(self, k: int, project_id=None) -> list:
+        """
+        ``k`` chunks for when nothing scores, as ``(0, project_id, text)``:
+        the project's first chunks, or the first chunk of each most recently
+        updated project.
+        """
+        with self._lock:
+            if project_id is not None:
+                return [(0.0, project_id, text) for text, _, _ in self._chunks.get(project_id, [])[:k]]
+            recent = sorted(
+                (pid for pid in self._chunks if self._chunks[pid]), key=lambda pid: self._indexed[pid], reverse=True
+            )
+            return [(0.0, pid, self._chunks[pid][0][0]) for pid in recent[:k]]
+
+
+index = ProjectIndex()
+
+
+def get_chat_context(user_message: str, project_id=None, k=None):
+    """
+    Prompt context for one chat turn and the number of chunks in it: the
+    project's header plus its chunks most relevant to ``user_message``, or,
+    without ``project_id``, the best chunks across all projects.
+    """
+    k = k or retrieval_settings()['TOP_K']
+    if project_id is not None:
+        try:
+            project_id = int(project_id)
+        except (TypeError, ValueError):
+            project_id = None
+        if project_id is None or not index.refresh_project(project_id):
+            return "No project found with the given ID.", 0
+        hits = index.search(user_message, k, project_id) or index.leading(k, project_id)
+        return "\n\n".join([index.header(project_id)] + [text for _, _, text in hits]), len(hits)
+
+    index.refresh()
+    hits = index.search(user_message, k) or index.leading(k)
+    if not hits:
+        return "No project data matched the question.", 0
+    blocks = []
+    for pid in dict.fromkeys(pid for _, pid, _ in hits):
+        texts = [text for _, hit_pid, text in hits if hit_pid == pid]
+        blocks.append("\n\n".join([index.header(pid)] + texts))
+    return "\n---\n".join(blocks), len(hits)
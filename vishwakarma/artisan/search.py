@@ -0,0 +1,117 @@
+"""
+Full-text search over project names, descriptions and answers.
+
+Each database gets its own index, created by migration 0015:
+
+* PostgreSQL: a GIN index on SEARCH_VECTOR, which search_projects() repeats
+  verbatim so the planner can use it.
+* SQLite: an FTS5 table, artisan_project_fts, keyed by project id and kept
+  in sync with artisan_project by triggers. Rebuilding the project table in
+  a later SQLite migration drops those triggers, so install_sqlite_fts() also
+  runs after every migrate and reindexes when it had to recreate them.
+* Anything else falls back to icontains lookups.
+
+Every backend matches each word of the query as a prefix and requires all
+of them, so ``terra`` finds "Terracotta" everywhere.
+"""
+import re
+
+from django.db import connection, connections
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'artisan_project_fts'
+FTS_TRIGGERS = ('artisan_project_fts_ai', 'artisan_project_fts_ad', 'artisan_project_fts_au')
+
+SEARCH_VECTOR = (
+    "to_tsvector('english'::regconfig, "
+    "coalesce(\"artisan_project\".\"name\", '') || ' ' || "
+    "coalesce(\"artisan_project\".\"description\", '') || ' ' || "
+    "coalesce(\"artisan_project\".\"answers\"::text, ''))"
+)
+PG_SEARCH_INDEX = 'artisan_project_search_idx'
+
+TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+# Answers are stored as JSON text with \uXXXX escapes; index the decoded strings.
+SQLITE_ANSWERS_TEXT = "(SELECT group_concat(value, ' ') FROM json_each({row}.answers))"
+SQLITE_FTS_INSERT = (
+    f"INSERT INTO {FTS_TABLE}(rowid, name, description, answers) "
+    f"SELECT {{row}}.id, {{row}}.name, {{row}}.description, {SQLITE_ANSWERS_TEXT}"
+)
+
+SQLITE_FTS_SQL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(name, description, answers)",
+    f"""CREATE TRIGGER IF NOT EXISTS artisan_project_fts_ai AFTER INSERT ON artisan_project BEGIN
+        {SQLITE_FTS_INSERT.format(row='new')};
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS artisan_project_fts_ad AFTER DELETE ON artisan_project BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS artisan_project_fts_au AFTER UPDATE OF name, description, answers
+    ON artisan_project BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        {SQLITE_FTS_INSERT.format(row='new')};
+    END""",
+]
+
+
+def sqlite_has_fts(conn=connection) -> bool:
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        return cursor.fetchone() is not None
+
+
+def install_sqlite_fts(conn=connection):
+    """Create the FTS5 table and triggers if missing; reindex every project when anything was."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE name IN (%s, %s, %s, %s)", [FTS_TABLE, *FTS_TRIGGERS]
+        )
+        if cursor.fetchone()[0] == 1 + len(FTS_TRIGGERS):
+            return
+        for statement in SQLITE_FTS_SQL:
+            cursor.execute(statement)
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(SQLITE_FTS_INSERT.format(row='artisan_project') + " FROM artisan_project")
+
+
+def ensure_search_index(sender, using, **kwargs):
+    """post_migrate receiver: put back FTS triggers dropped by a table rebuild."""
+    conn = connections[using]
+    if conn.vendor == 'sqlite' and sqlite_has_fts(conn):
+        install_sqlite_fts(conn)
+
+
+def fts5_query(text: str) -> str:
+    """Every word as a quoted prefix term, so user input can't break the FTS syntax."""
+    return " ".join(f'"{term}"*' for term in TERM_RE.findall(text))
+
+
+def tsquery(text: str) -> str:
+    """
+    The PostgreSQL twin of fts5_query(): every word as a prefix term, all
+    required. Words are quoted as lexemes so user input can't break the
+    tsquery syntax.
+    """
+    return " & ".join("'" + term.replace("'", "''") + "':*" for term in TERM_RE.findall(text))
+
+
+def search_projects(queryset, text: str):
+    """Narrow ``queryset`` to the projects matching every word of ``text``."""
+    if not TERM_RE.search(text):
+        return queryset.none()
+    if connection.vendor == 'postgresql':
+        return queryset.filter(RawSQL(
+            f"{SEARCH_VECTOR} @@ to_tsquery('english'::regconfig, %s)", [tsquery(text)],
+            output_field=BooleanField(),
+        ))
+    if connection.vendor == 'sqlite' and sqlite_has_fts():
+        return queryset.filter(pk__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [fts5_query(text)]
+        ))
+    for term in TERM_RE.findall(text):
+        queryset = queryset.filter(
+            Q(name__icontains=term) | Q(description__icontains=term) | Q(answers__icontains=term)
+        )
+    return queryset
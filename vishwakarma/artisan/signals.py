@@ -0,0 +1,36 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .instrumentation import db_execute_wrapper
+from .llm import response_cache
+from .models import MetricSeries, Project
+
+
+def invalidate_projects(project_ids):
+    """
+    Drop state derived from these projects. Bulk writes (bulk_create,
+    bulk_update, queryset.update) skip post_save and call this directly.
+    """
+    project_ids = list(project_ids)
+    # Cached chat/content replies were built from the old project context.
+    response_cache.invalidate_projects(project_ids)
+
+
+@receiver(post_save, sender=Project)
+def invalidate_saved_project(sender, instance, **kwargs):
+    invalidate_projects([instance.pk])
+
+
+@receiver(post_delete, sender=Project)
+def invalidate_deleted_project(sender, instance, **kwargs):
+    # CachedResponse rows go with the project through the FK cascade
+    response_cache.memory.invalidate_projects([instance.pk])
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    # Stays installed for the connection's lifetime; it only records while
+    # InstrumentationMiddleware has a request open in the current context.
+    if db_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_execute_wrapper)
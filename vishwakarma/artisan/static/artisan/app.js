@@ -13,9 +13,11 @@ class VishwakarmaApp {
         this.apiKeysSetup = false;
         this.customApiKeys = [];
         this.chatHistory = [];
+        this.chatSessions = {}; // project id -> server-side chat session id
         
         // Data from backend
         this.projects = [];
+        this.projectsCursor = null; // keyset cursor for the next dashboard page
 
         this.questions = [
             "What are you good at ( Capabilities & Expertise )?",
@@ -126,20 +128,30 @@ class VishwakarmaApp {
         this.bindEvents();
         console.log('App initialized successfully');
     }
-    async fetchProjects() {
+    async fetchProjects(append = false) {
+        // The dashboard only needs the card fields; answers, charts and
+        // analysis are loaded per project in openProject().
+        const params = new URLSearchParams({
+            limit: '50',
+            fields: 'id,name,type,description,created_date'
+        });
+        if (append && this.projectsCursor) params.set('cursor', this.projectsCursor);
+
         try {
-            const response = await fetch('/api/projects/', {
+            const response = await fetch(`/api/projects/?${params}`, {
                 headers: {
                     'Accept': 'application/json'
                 }
             });
             if (!response.ok) throw new Error('Failed to load projects');
             const data = await response.json();
-            this.projects = data.results || [];
+            const page = data.results || [];
+            this.projects = append ? [...this.projects, ...page] : page;
+            this.projectsCursor = data.next_cursor || null;
             this.renderDashboard();
         } catch (error) {
             console.error('Error fetching projects:', error);
-            this.projects = [];
+            if (!append) this.projects = [];
             this.renderDashboard();
         }
     }
@@ -158,6 +170,13 @@ class VishwakarmaApp {
                 return;
             }
             
+            // Next page of projects
+            if (e.target.id === 'load-more-projects') {
+                e.preventDefault();
+                this.fetchProjects(true);
+                return;
+            }
+
             // Delete button
             if (e.target.classList.contains('btn--delete')) {
                 e.preventDefault();
@@ -348,7 +367,9 @@ class VishwakarmaApp {
                     <button class="btn btn--delete" data-project-id="${project.id}">Delete</button>
                 </div>
             </div>
-        `).join('');
+        `).join('') + (this.projectsCursor ? `
+            <button id="load-more-projects" class="btn btn--outline">Load more projects</button>
+        ` : '');
         
         console.log(`Rendered ${this.projects.length} projects`);
     }
@@ -706,13 +727,19 @@ class VishwakarmaApp {
         }
     }
 
-    openProject(projectId) {
+    async openProject(projectId) {
         console.log('Opening project:', projectId);
-        this.currentProject = this.projects.find(p => p.id === projectId);
-        if (this.currentProject) {
+        try {
+            const response = await fetch(`/api/projects/${projectId}/`, {
+                headers: {
+                    'Accept': 'application/json'
+                }
+            });
+            if (!response.ok) throw new Error('Failed to load project');
+            this.currentProject = await response.json();
             this.showProjectView();
-        } else {
-            console.error('Project not found:', projectId);
+        } catch (error) {
+            console.error('Project not found:', projectId, error);
         }
     }
 
@@ -750,6 +777,7 @@ class VishwakarmaApp {
     showSegment(segment) {
         console.log('Showing segment:', segment);
         this.currentSegment = segment;
+        this.stopStatistics();
         const content = document.getElementById('segment-content');
         if (!content) return;
         
@@ -887,39 +915,108 @@ class VishwakarmaApp {
 
         document.getElementById('edit-api-keys').onclick = () => this.openApiModal();
 
-        // Fetch and update statistics every 2 seconds
-        const updateStats = async () => {
-            try {
-                const response = await fetch('/api/statistics/', { method: 'GET' });
-                if (!response.ok) throw new Error('Failed to fetch statistics');
-                const stats = await response.json();
-
-                // Only show stats for platforms with API keys
-                if (apiKeys.instagram) {
-                    document.getElementById('stat-reach').textContent = stats.marketing.platforms[0].reach;
-                    document.getElementById('stat-engagement').textContent = stats.marketing.platforms[0].engagement;
-                }
-                if (apiKeys.youtube) {
-                    // YouTube stats logic here
-                }
-                if (apiKeys.flipkart) {
-                    // Flipkart stats logic here
-                }
+        // Statistics are pushed by the server: a full snapshot first, then
+        // only the values that changed.
+        const renderStats = (stats) => {
+            // Only show stats for platforms with API keys
+            if (apiKeys.instagram) {
+                document.getElementById('stat-reach').textContent = stats.marketing.platforms[0].reach;
+                document.getElementById('stat-engagement').textContent = stats.marketing.platforms[0].engagement;
+            }
+            if (apiKeys.youtube) {
+                // YouTube stats logic here
+            }
+            if (apiKeys.flipkart) {
+                // Flipkart stats logic here
+            }
 
-                document.getElementById('stat-revenue').textContent = `₹${stats.sales.revenue[stats.sales.revenue.length - 1]}`;
-                document.getElementById('stat-growth').textContent = stats.sales.products[0].growth;
+            document.getElementById('stat-revenue').textContent = `₹${stats.sales.revenue[stats.sales.revenue.length - 1]}`;
+            document.getElementById('stat-growth').textContent = stats.sales.products[0].growth;
 
-                setTimeout(() => {
-                    this.createStatisticsCharts(stats);
-                }, 100);
-            } catch (error) {
-                console.error('Error updating statistics:', error);
+            setTimeout(() => {
+                this.createStatisticsCharts(stats);
+            }, 100);
+        };
+
+        this.stopStatistics();
+        const projectId = this.currentProject?.id;
+        const query = projectId ? `project_id=${projectId}` : '';
+
+        let stats = null;
+        const applyChanges = (changes) => {
+            changes.forEach(([path, value]) => {
+                let target = stats;
+                path.slice(0, -1).forEach(key => { target = target[key]; });
+                target[path[path.length - 1]] = value;
+            });
+        };
+
+        // The push stream is only offered when the page is served over ASGI,
+        // where an open connection does not pin a worker thread.
+        const streamUrl = document.body.dataset.statisticsStream;
+        if (streamUrl && window.EventSource) {
+            this.statsSource = new EventSource(`${streamUrl}${query ? `?${query}` : ''}`);
+            this.statsSource.addEventListener('snapshot', (e) => {
+                stats = JSON.parse(e.data).stats;
+                renderStats(stats);
+            });
+            this.statsSource.addEventListener('delta', (e) => {
+                if (!stats) return;
+                applyChanges(JSON.parse(e.data).changes);
+                renderStats(stats);
+            });
+            this.statsSource.onerror = () => {
+                console.error('Statistics stream interrupted, reconnecting...');
+            };
+            return;
+        }
+
+        // Otherwise poll. Under ASGI each request is held until the stats move
+        // past the version we have; under WSGI it is answered at once and
+        // retry_after says how long to back off before the next one.
+        const pollUrl = document.body.dataset.statisticsPoll || '/api/statistics/';
+        const controller = new AbortController();
+        this.statsPoll = controller;
+        const poll = async () => {
+            let version = '';
+            while (!controller.signal.aborted) {
+                try {
+                    const response = await fetch(`${pollUrl}?${query}${query ? '&' : ''}since=${version}`, {
+                        method: 'GET',
+                        signal: controller.signal
+                    });
+                    if (!response.ok) throw new Error('Failed to fetch statistics');
+                    const data = await response.json();
+                    if (data.stats) {
+                        stats = data.stats;
+                        renderStats(stats);
+                    } else if (stats && data.changes.length) {
+                        applyChanges(data.changes);
+                        renderStats(stats);
+                    }
+                    version = data.version;
+                    if (data.retry_after) {
+                        await new Promise(resolve => setTimeout(resolve, data.retry_after * 1000));
+                    }
+                } catch (error) {
+                    if (controller.signal.aborted) return;
+                    console.error('Error updating statistics:', error);
+                    await new Promise(resolve => setTimeout(resolve, 2000));
+                }
             }
         };
+        poll();
+    }
 
-        updateStats();
-        if (this.statsInterval) clearInterval(this.statsInterval);
-        this.statsInterval = setInterval(updateStats, 2000);
+    stopStatistics() {
+        if (this.statsSource) {
+            this.statsSource.close();
+            this.statsSource = null;
+        }
+        if (this.statsPoll) {
+            this.statsPoll.abort();
+            this.statsPoll = null;
+        }
     }
 
     renderChatSegment(container) {
@@ -993,31 +1090,43 @@ class VishwakarmaApp {
 
         // Show typing indicator
         const typingMessage = this.addMessage('system', '🤖 Thinking...');
+        const projectKey = this.currentProject?.id ?? 'all';
 
         try {
             const response = await fetch('/api/chat/', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
+                    'Accept': 'text/event-stream'
                 },
                 body: JSON.stringify({ 
                     message: message,
-                    project_id: this.currentProject?.id // <-- Pass current project ID
+                    project_id: this.currentProject?.id, // <-- Pass current project ID
+                    session_id: this.chatSessions[projectKey], // server keeps the history
+                    stream: true
                 })
             });
 
-            const data = await response.json();
-
-            // Remove typing indicator
-            if (typingMessage && typingMessage.parentNode) {
-                typingMessage.parentNode.removeChild(typingMessage);
+            if (!response.ok) {
+                if (response.status === 404) delete this.chatSessions[projectKey];
+                const data = await response.json().catch(() => ({}));
+                typingMessage.textContent = `Error: ${data.error || 'Failed to get response'}`;
+                return;
             }
 
-            // Add AI response
-            if (response.ok && data.reply) {
-                this.addMessage('system', data.reply);
+            // Render the reply progressively as chunks arrive
+            let partial = '';
+            const data = await this.readEventStream(response, (delta) => {
+                partial += delta;
+                typingMessage.textContent = partial;
+                typingMessage.parentNode.scrollTop = typingMessage.parentNode.scrollHeight;
+            });
+
+            if (data.session_id) this.chatSessions[projectKey] = data.session_id;
+            if (data.reply) {
+                typingMessage.textContent = this.formatChatResponse(data.reply);
             } else {
-                this.addMessage('system', `Error: ${data.error || 'Failed to get response'}`);
+                typingMessage.textContent = `Error: ${data.error || 'Failed to get response'}`;
             }
 
         } catch (error) {
@@ -1033,6 +1142,43 @@ class VishwakarmaApp {
         }
     }
 
+    async readEventStream(response, onDelta) {
+        // Parse a text/event-stream body; resolves with the payload of the final
+        // "done" (or "error") event.
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let result = {};
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let eventName = 'message';
+                let dataLine = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event: ')) eventName = line.slice(7);
+                    if (line.startsWith('data: ')) dataLine += line.slice(6);
+                });
+                if (!dataLine) continue;
+
+                const payload = JSON.parse(dataLine);
+                if (eventName === 'message' && payload.delta) {
+                    onDelta(payload.delta);
+                } else if (eventName === 'done' || eventName === 'error') {
+                    result = payload;
+                }
+            }
+        }
+        return result;
+    }
+
     addMessage(type, text) {
         const messagesContainer = document.getElementById('chat-messages');
         if (!messagesContainer) return null;
@@ -1361,6 +1507,7 @@ class VishwakarmaApp {
         if (projectView) projectView.classList.add('hidden');
         if (dashboardView) dashboardView.classList.remove('hidden');
         
+        this.stopStatistics();
         this.currentProject = null;
     }
 
@@ -0,0 +1,186 @@
+"""
+Statistics snapshots shared by every dashboard that is watching a project.
+
+statistics_view, the ASGI long-poll and the ASGI push feed read from
+StatisticsHub instead of building the stats dict per request. The hub
+rebuilds a project's snapshot at most once per STATISTICS_REFRESH_SECONDS,
+under a lock of that project only.
+
+A snapshot's version is a digest of its stats, so every worker process
+gives the same data the same version and a poll may land on any of them.
+Each project keeps the last HISTORY_LENGTH versions it served, so a
+dashboard on one of them gets a change list; any other version gets the
+whole snapshot. Feeds of at most MAX_FEEDS projects are kept, least
+recently used first out.
+
+Under WSGI, statistics_view answers at once and tells the dashboard how
+long to wait before asking again; only ASGI workers hold a poll open.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .metrics import project_statistics
+
+HISTORY_LENGTH = 16
+MAX_FEEDS = 1024
+
+
+def flatten(value, path=()):
+    """{"a": [{"b": 1}]} -> {("a", 0, "b"): 1}"""
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        items = enumerate(value)
+    else:
+        return {path: value}
+    flat = {}
+    for key, child in items:
+        flat.update(flatten(child, path + (key,)))
+    return flat
+
+
+def diff(old_flat: dict, new_flat: dict) -> list:
+    """
+    Changes that turn ``old_flat`` into ``new_flat`` as ``[path, value]``
+    pairs; a removed path is sent with value None.
+    """
+    changes = [[list(path), value] for path, value in new_flat.items() if old_flat.get(path, object()) != value]
+    changes += [[list(path), None] for path in old_flat if path not in new_flat]
+    return changes
+
+
+def stats_version(stats) -> str:
+    canonical = json.dumps(stats, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+class Snapshot:
+    def __init__(self, stats, previous=None):
+        self.version = stats_version(stats)
+        self.stats = stats
+        self.flat = flatten(stats)
+        self.built_at = time.monotonic()
+        self.previous_version = previous.version if previous else None
+        self.delta = diff(previous.flat, self.flat) if previous else None
+
+
+class ProjectFeed:
+    """The current snapshot of one project and the flattened versions before it."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = None
+        self.history = OrderedDict()  # version -> flat stats
+
+
+class StatisticsHub:
+    def __init__(self):
+        self._feeds = OrderedDict()  # project id -> ProjectFeed, least recently used first
+        self._lock = threading.Lock()
+
+    @property
+    def refresh_seconds(self):
+        return getattr(settings, 'STATISTICS_REFRESH_SECONDS', 2)
+
+    def feed(self, project_id) -> ProjectFeed:
+        with self._lock:
+            feed = self._feeds.get(project_id)
+            if feed is None:
+                feed = self._feeds[project_id] = ProjectFeed()
+                while len(self._feeds) > MAX_FEEDS:
+                    self._feeds.popitem(last=False)
+            else:
+                self._feeds.move_to_end(project_id)
+            return feed
+
+    def clear(self):
+        with self._lock:
+            self._feeds.clear()
+
+    def snapshot(self, project_id=None) -> Snapshot:
+        """Current snapshot for ``project_id``, rebuilt only when it is stale."""
+        feed = self.feed(project_id)
+        with feed.lock:
+            current = feed.current
+            if current is not None and time.monotonic() - current.built_at < self.refresh_seconds:
+                return current
+            stats = project_statistics(project_id)
+            if current is not None and stats_version(stats) == current.version:
+                # Nothing moved: keep the version so subscribers send nothing
+                current.built_at = time.monotonic()
+                return current
+            feed.current = Snapshot(stats, current)
+            feed.history[feed.current.version] = feed.current.flat
+            feed.history.move_to_end(feed.current.version)
+            while len(feed.history) > HISTORY_LENGTH:
+                feed.history.popitem(last=False)
+            return feed.current
+
+    def changes_since(self, version, project_id=None, flat=None):
+        """
+        Return ``(snapshot, changes)`` for a subscriber that last saw
+        ``version`` (and ``flat``, when it has them). ``changes`` is empty
+        when nothing moved and None when the version is unknown here and
+        the subscriber needs the whole snapshot.
+        """
+        current = self.snapshot(project_id)
+        if current.version == version:
+            return current, []
+        if current.previous_version == version:
+            return current, current.delta
+        if flat is None:
+            flat = self.feed(project_id).history.get(version)
+        if flat is None:
+            return current, None
+        return current, diff(flat, current.flat)
+
+
+hub = StatisticsHub()
+
+
+def sse(event, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_settings():
+    return (
+        getattr(settings, 'STATISTICS_REFRESH_SECONDS', 2),
+        getattr(settings, 'STATISTICS_STREAM_SECONDS', 55),
+    )
+
+
+def poll_payload(snapshot, changes, retry_after=0) -> dict:
+    """
+    Long-poll answer: ``{"version", "changes"}``, or ``{"version", "stats"}``
+    for a dashboard the hub has no delta for. ``retry_after`` is how many
+    seconds to wait before the next poll.
+    """
+    payload = {"version": snapshot.version, "retry_after": retry_after}
+    if changes is None:
+        payload["stats"] = snapshot.stats
+    else:
+        payload["changes"] = changes
+    return payload
+
+
+async def wait_for_changes(version, project_id=None):
+    """
+    ASGI long-poll for a dashboard that last saw ``version``: returns
+    ``(snapshot, changes)`` as soon as the stats move, or after
+    STATISTICS_LONG_POLL_SECONDS with no changes. A waiting poll costs no
+    worker thread; WSGI deployments answer at once instead (statistics_view).
+    """
+    interval = hub.refresh_seconds
+    deadline = time.monotonic() + getattr(settings, 'STATISTICS_LONG_POLL_SECONDS', 25)
+    current, changes = await sync_to_async(hub.changes_since)(version, project_id)
+    while changes == [] and time.monotonic() < deadline:
+        await asyncio.sleep(max(min(interval, deadline - time.monotonic()), 0))
+        current, changes = await sync_to_async(hub.changes_since)(version, project_id)
+    return current, changes
@@ -1,3 +1,1159 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import threading
+import time
+from datetime import date, timedelta
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import (
+    analyses, charts, chat, context, instrumentation, jobs, llm, metrics, patching, reanalysis, retrieval, search, statistics, views,
+)
+from .llm import generate_text, response_cache
+from .llm_backends import LLMError, LocalBackend
+from .models import AnalysisJob, CachedResponse, ChatSession, MetricSeries, Project, ProjectAnalysis
+from .resilience import CircuitBreaker, CircuitOpen, breaker
+
+LOCAL_LLM = {'BACKEND': 'artisan.llm_backends.LocalBackend', 'OPTIONS': {'SEED': 1}}
+FAILING_LLM = {'BACKEND': 'artisan.llm_backends.LocalBackend', 'OPTIONS': {'SEED': 1, 'ERROR_RATE': 1}}
+PROJECT_TYPE = Project.PROJECT_TYPE_CHOICES[0][0]
+
+
+def make_project(name='Loom', answers=('Handwoven sarees', 'Jaipur boutiques'), **fields):
+    fields.setdefault('type', PROJECT_TYPE)
+    return Project.objects.create(name=name, answers=list(answers), **fields)
+
+
+def post_json(client, url, data, **extra):
+    return client.post(url, json.dumps(data), content_type='application/json', **extra)
+
+
+def sse_events(response):
+    """``[(event, data)]`` of a Server-Sent Events response; unnamed events are ``message``."""
+    events = []
+    for block in b''.join(response.streaming_content).decode('utf-8').split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line and not line.startswith(':'))
+        if 'data' in fields:
+            events.append((fields.get('event', 'message'), json.loads(fields['data'])))
+    return events
+
+
+class LLMTestCase(TestCase):
+    """Runs against the offline LocalBackend with a clean breaker and response cache."""
+
+    def setUp(self):
+        breaker.reset()
+        response_cache.memory.clear()
+
+    def tearDown(self):
+        breaker.reset()
+        response_cache.memory.clear()
+
+
+@override_settings(LLM_BACKEND=LOCAL_LLM)
+class ResponseCacheTests(LLMTestCase):
+    def test_repeated_prompt_is_served_from_the_cache(self):
+        backend = llm.get_backend()
+        with mock.patch.object(backend, 'generate', wraps=backend.generate) as generate:
+            first = generate_text('chat', 'What sells best?')
+            second = generate_text('chat', 'What sells best?')
+        self.assertEqual(first, second)
+        self.assertEqual(generate.call_count, 1)
+        self.assertTrue(CachedResponse.objects.filter(endpoint='chat').exists())
+
+    def test_table_tier_is_shared_after_a_memory_miss(self):
+        reply = generate_text('chat', 'Where do I sell?')
+        response_cache.memory.clear()
+        with mock.patch.object(llm.get_backend(), 'generate') as generate:
+            self.assertEqual(generate_text('chat', 'Where do I sell?'), reply)
+        generate.assert_not_called()
+
+    def test_failed_cache_write_still_returns_the_reply(self):
+        with mock.patch.object(CachedResponse.objects, 'update_or_create', side_effect=OperationalError('locked')):
+            with self.assertLogs('artisan.llm', 'ERROR'):
+                self.assertTrue(generate_text('chat', 'Anything new?'))
+
+    def test_editing_the_project_evicts_its_entries(self):
+        project = make_project()
+        generate_text('chat', 'About my project', project_id=project.pk)
+        project.save()
+        self.assertFalse(CachedResponse.objects.filter(project=project).exists())
+
+
+@override_settings(LLM_BACKEND=LOCAL_LLM)
+class AsyncViewTests(LLMTestCase):
+    ANSWER = {'question_index': 0, 'answer': 'Handwoven sarees', 'previous_answers': []}
+
+    def test_async_analysis_matches_the_sync_view(self):
+        sync = post_json(self.client, '/api/analysis/', self.ANSWER).json()
+        response_cache.memory.clear()
+        asynchronous = post_json(self.client, '/api/async/analysis/', self.ANSWER).json()
+        self.assertTrue(asynchronous['is_gemini'])
+        for key in ('title', 'analysis', 'chartType', 'is_gemini'):
+            self.assertEqual(asynchronous[key], sync[key], key)
+
+    @override_settings(LLM_BACKEND=FAILING_LLM)
+    def test_failed_call_serves_the_fallback(self):
+        data = post_json(self.client, '/api/async/analysis/', self.ANSWER).json()
+        self.assertFalse(data['is_gemini'])
+        self.assertEqual(data['title'], "Target Market Analysis")
+
+    def test_async_option_queues_a_job(self):
+        with mock.patch('artisan.jobs.transaction.on_commit'):
+            response = post_json(self.client, '/api/async/analysis/', {**self.ANSWER, 'async': True})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], 'pending')
+
+    def test_stream_option_is_refused(self):
+        response = post_json(self.client, '/api/async/chat/', {'message': 'Hi', 'stream': True})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('/api/chat/', response.json()['error'])
+        response = post_json(self.client, '/api/async/generate-content/', {'prompt': 'Hi', 'stream': True})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(LLM_BACKEND={**LOCAL_LLM, 'OPTIONS': {'SEED': 1, 'CHUNK_SIZE': 8}})
+class StreamingTests(LLMTestCase):
+    def test_chat_stream_sends_deltas_then_the_full_reply(self):
+        response = post_json(self.client, '/api/chat/', {'message': 'What sells?', 'stream': True})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = sse_events(response)
+        deltas = [data['delta'] for event, data in events if event == 'message']
+        self.assertGreater(len(deltas), 1)
+        self.assertEqual(events[-1][0], 'done')
+        self.assertEqual(events[-1][1]['reply'], ''.join(deltas))
+
+    def test_accept_header_opts_in(self):
+        response = post_json(self.client, '/api/generate-content/', {'prompt': 'A post'}, HTTP_ACCEPT='text/event-stream')
+        events = sse_events(response)
+        self.assertEqual(events[-1][0], 'done')
+        self.assertIn('content', events[-1][1])
+
+    def test_completed_stream_is_recorded_in_the_session(self):
+        events = sse_events(post_json(self.client, '/api/chat/', {'message': 'Hello', 'stream': True}))
+        session_id = events[-1][1]['session_id']
+        messages = self.client.get(f'/api/chat/sessions/{session_id}/').json()['messages']
+        self.assertEqual([m['content'] for m in messages], ['Hello', events[-1][1]['reply']])
+
+    @override_settings(LLM_BACKEND=FAILING_LLM)
+    def test_failure_mid_stream_is_an_error_event(self):
+        events = sse_events(post_json(self.client, '/api/generate-content/', {'prompt': 'A post', 'stream': True}))
+        self.assertEqual(events[-1][0], 'error')
+
+
+@override_settings(LLM_BACKEND=LOCAL_LLM)
+class AnalysisJobTests(LLMTestCase):
+    PAYLOAD = {'question_index': 0, 'answer': 'Handwoven sarees', 'previous_answers': []}
+
+    def setUp(self):
+        super().setUp()
+        on_commit = mock.patch('artisan.jobs.transaction.on_commit')
+        self.scheduled = on_commit.start()
+        self.addCleanup(on_commit.stop)
+
+    def enqueue(self, **options):
+        response = post_json(self.client, '/api/analysis/', {**self.PAYLOAD, 'async': True, **options})
+        self.assertEqual(response.status_code, 202)
+        return response.json()
+
+    def test_job_runs_and_is_polled_to_completion(self):
+        job = self.enqueue()
+        jobs.run_job(job['job_id'])
+        polled = self.client.get(job['status_url']).json()
+        self.assertEqual(polled['status'], AnalysisJob.STATUS_DONE)
+        self.assertTrue(polled['result']['is_gemini'])
+
+    def test_identical_requests_share_a_live_job(self):
+        self.assertEqual(self.enqueue()['job_id'], self.enqueue()['job_id'])
+        self.assertEqual(self.scheduled.call_count, 1)
+
+    def test_abandoned_job_is_failed_and_requeued(self):
+        first = self.enqueue()
+        AnalysisJob.objects.filter(pk=first['job_id']).update(updated_at=timezone.now() - timedelta(hours=1))
+        second = self.enqueue()
+        self.assertNotEqual(first['job_id'], second['job_id'])
+        self.assertEqual(AnalysisJob.objects.get(pk=first['job_id']).status, AnalysisJob.STATUS_FAILED)
+
+    def test_done_job_is_reused_until_its_ttl_or_forced(self):
+        first = self.enqueue()
+        jobs.run_job(first['job_id'])
+        self.assertEqual(self.enqueue()['job_id'], first['job_id'])
+        self.assertNotEqual(self.enqueue(force=True)['job_id'], first['job_id'])
+
+    @override_settings(ANALYSIS_JOB_RESULT_TTL=0)
+    def test_expired_result_is_rerun(self):
+        first = self.enqueue()
+        jobs.run_job(first['job_id'])
+        self.assertNotEqual(self.enqueue()['job_id'], first['job_id'])
+
+
+class MigrationTests(TestCase):
+    def test_migrations_match_the_models(self):
+        # e.g. unique_live_analysis_job, created by 0011 rather than a follow-up migration
+        call_command('makemigrations', 'artisan', check=True, dry_run=True, verbosity=0)
+
+
+class ProjectListTests(TestCase):
+    def setUp(self):
+        self.projects = [make_project(name=f"Project {i}") for i in range(5)]
+
+    def test_keyset_pages_cover_every_project_once(self):
+        seen, cursor = [], ''
+        while True:
+            data = self.client.get('/api/projects/', {'limit': 2, 'cursor': cursor}).json()
+            seen += [p['id'] for p in data['results']]
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(seen, sorted((p.pk for p in self.projects), reverse=True))
+
+    def test_bad_cursor_is_rejected(self):
+        self.assertEqual(self.client.get('/api/projects/', {'cursor': 'abc'}).status_code, 400)
+
+    def test_fields_limits_the_payload(self):
+        data = self.client.get('/api/projects/', {'fields': 'name'}).json()
+        self.assertEqual({tuple(sorted(p)) for p in data['results']}, {('id', 'name')})
+
+    def test_unknown_field_is_rejected(self):
+        self.assertEqual(self.client.get('/api/projects/', {'fields': 'secret'}).status_code, 400)
+
+
+class ConditionalGetTests(TestCase):
+    def test_matching_etag_gets_304(self):
+        project = make_project()
+        url = f'/api/projects/{project.pk}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_edit_changes_the_etag(self):
+        project = make_project()
+        url = f'/api/projects/{project.pk}/'
+        etag = self.client.get(url)['ETag']
+        self.client.patch(url, json.dumps({'name': 'Renamed'}), content_type='application/json')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_etag_changes_on_delete(self):
+        make_project()
+        doomed = make_project(name='Doomed')
+        etag = self.client.get('/api/projects/')['ETag']
+        self.assertEqual(self.client.get('/api/projects/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        doomed.delete()
+        self.assertEqual(self.client.get('/api/projects/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_each_page_has_its_own_etag(self):
+        make_project()
+        self.assertNotEqual(self.client.get('/api/projects/')['ETag'], self.client.get('/api/projects/', {'limit': 1})['ETag'])
+
+
+@override_settings(STATISTICS_REFRESH_SECONDS=0, STATISTICS_LONG_POLL_SECONDS=0)
+class StatisticsFeedTests(TestCase):
+    def setUp(self):
+        statistics.hub.clear()
+        self.project = make_project()
+
+    def poll(self, since, url='/api/statistics/'):
+        return self.client.get(url, {'project_id': self.project.pk, 'since': since})
+
+    def record_revenue(self, value):
+        point = {'metric': 'sales.revenue', 'date': date.today().isoformat(), 'value': value}
+        post_json(self.client, f'/api/projects/{self.project.pk}/metrics/', {'points': [point]})
+
+    def test_plain_get_returns_the_stats(self):
+        self.assertIn('sales', self.client.get('/api/statistics/', {'project_id': self.project.pk}).json())
+
+    def test_first_poll_gets_the_snapshot(self):
+        data = self.poll('').json()
+        self.assertIn('stats', data)
+        self.assertEqual(data['retry_after'], 0)  # STATISTICS_REFRESH_SECONDS
+
+    def test_poll_without_changes_is_empty(self):
+        version = self.poll('').json()['version']
+        self.assertEqual(self.poll(version).json(), {'version': version, 'changes': [], 'retry_after': 0})
+
+    def test_poll_returns_only_the_changes(self):
+        version = self.poll('').json()['version']
+        self.record_revenue(1200)
+        data = self.poll(version).json()
+        self.assertNotEqual(data['version'], version)
+        self.assertIn([['sales', 'revenue', 5], 1200], data['changes'])
+
+    def test_versions_agree_across_processes(self):
+        version = self.poll('').json()['version']
+        statistics.hub.clear()  # as if the next poll reached another worker
+        self.assertEqual(self.poll(version).json()['changes'], [])
+        self.record_revenue(1200)
+        statistics.hub.clear()
+        self.assertIn('stats', self.poll(version).json())
+
+    def test_any_recent_version_gets_a_delta(self):
+        first = self.poll('').json()['version']
+        self.record_revenue(1200)
+        self.poll(first)
+        self.record_revenue(1300)
+        self.assertIn([['sales', 'revenue', 5], 1300], self.poll(first).json()['changes'])
+
+    def test_history_and_feeds_are_bounded(self):
+        with mock.patch.object(statistics, 'HISTORY_LENGTH', 2), mock.patch.object(statistics, 'MAX_FEEDS', 1):
+            first = self.poll('').json()['version']
+            for value in (1, 2):
+                self.record_revenue(value)
+                self.poll(first)
+            self.assertIn('stats', self.poll(first).json())
+            self.client.get('/api/statistics/')
+            self.assertEqual(list(statistics.hub._feeds), [None])
+
+    def test_asgi_long_poll(self):
+        version = self.poll('').json()['version']
+        data = self.poll(version, '/api/async/statistics/').json()
+        self.assertEqual(data, {'version': version, 'changes': [], 'retry_after': 0})
+
+    def test_bad_version_is_rejected(self):
+        self.assertEqual(self.poll('x').status_code, 400)
+        self.assertEqual(self.poll('x', '/api/async/statistics/').status_code, 400)
+
+    def test_wsgi_pages_poll_without_the_stream(self):
+        page = self.client.get('/')
+        self.assertContains(page, 'data-statistics-stream=""')
+        self.assertContains(page, 'data-statistics-poll="/api/statistics/"')
+
+
+class MetricsStoreTests(TestCase):
+    def setUp(self):
+        self.project = make_project()
+        self.url = f'/api/projects/{self.project.pk}/metrics/'
+
+    def ingest(self, *points):
+        return post_json(self.client, self.url, {'points': [
+            {'metric': metric, 'date': day, 'value': value} for metric, day, value in points
+        ]})
+
+    def test_rollups_total_sums_and_average_means(self):
+        engagement = 'marketing.platforms.Instagram.engagement'
+        self.ingest(
+            ('sales.revenue', '2025-03-03', 100), ('sales.revenue', '2025-03-20', 50),
+            (engagement, '2025-03-03', 4.0), (engagement, '2025-03-04', 6.0),
+        )
+        stats = metrics.project_statistics(self.project.pk, today=date(2025, 4, 10))
+        self.assertEqual(stats['sales']['revenue'][-2:], [150, 0])
+        self.assertEqual(stats['marketing']['platforms'][0]['engagement'], '5.0%')
+
+    def test_same_day_replaces_the_value(self):
+        self.ingest(('sales.revenue', '2025-03-03', 100))
+        self.ingest(('sales.revenue', '2025-03-03', 40))
+        series = MetricSeries.objects.get(project=self.project)
+        self.assertEqual(list(metrics.unpack(series.monthly)), [40.0, 1.0])
+
+    def test_earlier_point_rebases_the_series(self):
+        self.ingest(('sales.revenue', '2025-03-03', 100))
+        self.ingest(('sales.revenue', '2025-01-15', 10))
+        series = MetricSeries.objects.get(project=self.project)
+        self.assertEqual(series.start_date, date(2025, 1, 15))
+        self.assertEqual(list(metrics.unpack(series.monthly)), [10.0, 1.0, 0.0, 0.0, 100.0, 1.0])
+
+    def test_bad_points_are_400(self):
+        for body in ([1, 2], {'points': 'abc'}, {'points': [1]}):
+            self.assertEqual(post_json(self.client, self.url, body).status_code, 400, body)
+        for point in (('sales.unknown', '2025-03-03', 1), ('sales.revenue', '2026-02-30', 1),
+                      ('sales.revenue', 'March', 1), ('sales.revenue', '2025-03-03', 'many')):
+            self.assertEqual(self.ingest(point).status_code, 400, point)
+
+    @override_settings(METRICS_MAX_SPAN_DAYS=366)
+    def test_distant_point_cannot_stretch_the_series(self):
+        self.ingest(('sales.revenue', '2025-03-03', 100))
+        response = self.ingest(('sales.revenue', '2025-03-04', 1), ('sales.revenue', '2099-01-01', 1))
+        self.assertEqual(response.status_code, 400)
+        series = MetricSeries.objects.get(project=self.project)
+        self.assertEqual(len(metrics.unpack(series.daily)), 1)
+
+
+class BulkTests(TestCase):
+    def bulk(self, body):
+        return post_json(self.client, '/api/projects/bulk/', body)
+
+    def test_invalid_items_are_reported_and_the_rest_applied(self):
+        keep, gone = make_project(name='Keep'), make_project(name='Gone')
+        response = self.bulk({
+            'create': [{'name': 'New', 'type': PROJECT_TYPE}, {'name': 'Bad', 'type': 'nope'}, 'not an object'],
+            'update': [{'id': keep.pk, 'name': 'Kept'}, {'id': 999999, 'name': 'Missing'}],
+            'delete': [gone.pk, 'x'],
+        })
+        self.assertEqual(response.status_code, 200)
+        errors = {(e['op'], e['index']) for e in response.json()['errors']}
+        self.assertEqual(errors, {('create', 1), ('create', 2), ('update', 1), ('delete', 1)})
+        self.assertTrue(Project.objects.filter(name='New').exists())
+        self.assertEqual(Project.objects.get(pk=keep.pk).name, 'Kept')
+        self.assertFalse(Project.objects.filter(pk=gone.pk).exists())
+
+    def test_rejected_update_changes_nothing(self):
+        project = make_project(name='Loom', description='Sarees')
+        response = self.bulk({'update': [{'id': project.pk, 'name': 'Partial', 'description': 'x', 'type': 'bad'}]})
+        self.assertEqual([e['index'] for e in response.json()['errors']], [0])
+        project.refresh_from_db()
+        self.assertEqual((project.name, project.description), ('Loom', 'Sarees'))
+
+    def test_repeated_ids_are_all_rejected(self):
+        project, other = make_project(name='Loom'), make_project(name='Other')
+        response = self.bulk({'update': [
+            {'id': project.pk, 'description': 'valid'},
+            {'id': other.pk, 'name': 'Renamed'},
+            {'id': project.pk, 'name': 'partial', 'type': 'bad'},
+        ]})
+        self.assertEqual([e['index'] for e in response.json()['errors']], [0, 2])
+        self.assertEqual(response.json()['updated'], [other.pk])
+        project.refresh_from_db()
+        self.assertEqual(project.name, 'Loom')
+
+    def test_answers_must_be_a_list(self):
+        response = self.bulk({'create': [
+            {'name': 'Text', 'type': PROJECT_TYPE, 'answers': 'Handwoven sarees'},
+            {'name': 'Empty', 'type': PROJECT_TYPE},
+        ]})
+        self.assertEqual(response.json()['errors'], [{'op': 'create', 'index': 0, 'error': "'answers' must be a list"}])
+        self.assertFalse(Project.objects.get(name='Empty').questions_answered)
+        response = post_json(self.client, '/api/projects/', {'name': 'Text', 'type': PROJECT_TYPE, 'answers': 'x'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Project.objects.filter(name='Text').exists())
+
+    def test_update_ids_must_be_integers(self):
+        project = make_project(pk=1, name='Loom')
+        response = self.bulk({'update': [
+            {'id': True, 'name': 'Renamed'},
+            {'id': [1], 'name': 'Renamed'},
+            {'id': {'pk': 1}, 'name': 'Renamed'},
+            {'id': '1', 'name': 'Renamed'},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['errors'], [
+            {'op': 'update', 'index': index, 'error': 'invalid id'} for index in range(4)
+        ])
+        project.refresh_from_db()
+        self.assertEqual(project.name, 'Loom')
+
+    def test_body_must_be_an_object(self):
+        response = self.bulk([1, 2])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "Expected a JSON object"})
+
+
+class LocalBackendTests(TestCase):
+    def test_same_prompt_same_reply(self):
+        backend = LocalBackend(RESPONSES=['one {prompt_length}', 'two {prompt_length}', 'three'])
+        self.assertEqual(backend.generate('hello'), LocalBackend(RESPONSES=backend.responses).generate('hello'))
+        self.assertIn(backend.generate('hello'), ['one 5', 'two 5', 'three'])
+
+    def test_stream_joins_to_the_reply(self):
+        backend = LocalBackend(CHUNK_SIZE=5)
+        chunks = list(backend.stream('hello'))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(''.join(chunks), backend.generate('hello'))
+
+    def test_error_rate(self):
+        with self.assertRaises(LLMError):
+            LocalBackend(ERROR_RATE=1).generate('hello')
+        with self.assertRaises(LLMError):
+            asyncio.run(LocalBackend(ERROR_RATE=1).agenerate('hello'))
+
+    def test_latency_past_the_deadline_times_out(self):
+        backend = LocalBackend(LATENCY={'distribution': 'fixed', 'value': 5})
+        with self.assertRaises(TimeoutError):
+            backend.generate('hello', timeout=0.01)
+
+    def test_seeded_latency_is_repeatable(self):
+        spec = {'distribution': 'lognormal', 'median': 0.8, 'sigma': 0.5}
+        first, second = LocalBackend(LATENCY=spec, SEED=3), LocalBackend(LATENCY=spec, SEED=3)
+        self.assertEqual([first.sample_latency() for _ in range(5)], [second.sample_latency() for _ in range(5)])
+
+    @override_settings(LLM_BACKEND=LOCAL_LLM)
+    def test_settings_select_the_backend(self):
+        self.assertIsInstance(llm.get_backend(), LocalBackend)
+        self.assertTrue(llm.llm_available())
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        instrumentation.registry.clear()
+
+    def scrape(self):
+        response = self.client.get('/metrics/')
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        return response.content.decode()
+
+    def test_requests_are_recorded_per_view(self):
+        make_project()
+        self.client.get('/api/projects/')
+        body = self.scrape()
+        self.assertIn('artisan_request_duration_seconds_count{view="api_projects",method="GET"} 1', body)
+        self.assertIn('artisan_request_db_queries_count{view="api_projects"} 1', body)
+        self.assertIn('artisan_llm_breaker_open 0', body)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = instrumentation.Histogram((1, 5))
+        for value in (0.5, 3, 3, 10):
+            histogram.observe(value)
+        self.assertEqual(histogram.snapshot(), ([1, 2, 1], 16.5))
+        instrumentation.registry.observe('artisan_request_db_queries', 3, 'v')
+        self.assertIn('artisan_request_db_queries_bucket{view="v",le="5"} 1', instrumentation.registry.render())
+
+    @override_settings(INSTRUMENTATION={'SLOW_REQUEST_MS': 0})
+    def test_slow_requests_are_logged(self):
+        with self.assertLogs('artisan.middleware', 'WARNING') as logs:
+            self.client.get('/api/projects/')
+        self.assertIn('api_projects', logs.output[0])
+
+    def test_render_while_new_series_appear(self):
+        def observe():
+            for i in range(200):
+                instrumentation.registry.observe('artisan_request_db_queries', 1, f'view-{i}')
+
+        writer = threading.Thread(target=observe)
+        writer.start()
+        try:
+            while writer.is_alive():
+                instrumentation.registry.render()
+        finally:
+            writer.join()
+        body = instrumentation.registry.render()
+        for line in body.splitlines():
+            if not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                float(value)
+                self.assertRegex(name, r'^[a-z_]+(\{.*\})?$')
+        self.assertIn('artisan_request_db_queries_count{view="view-199"} 1', body)
+
+
+class RetrievalTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(retrieval, 'index', retrieval.ProjectIndex())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_chat_about_a_project_gets_its_relevant_chunks(self):
+        project = make_project(answers=('Handwoven sarees from Varanasi', 'Jaipur boutiques', 'Instagram ads'))
+        make_project(name='Other', answers=('Varanasi pottery',))
+        text, used = retrieval.get_chat_context('Which boutiques stock us?', project.pk, k=1)
+        self.assertEqual(used, 1)
+        self.assertTrue(text.startswith('Project: Loom'))
+        self.assertIn('Jaipur boutiques', text)
+        self.assertNotIn('pottery', text)
+
+    def test_message_without_terms_falls_back_to_leading_chunks(self):
+        project = make_project()
+        text, used = retrieval.get_chat_context('what is it?', project.pk, k=1)
+        self.assertEqual(used, 1)
+        self.assertIn('Answer 1: Handwoven sarees', text)
+
+    def test_search_across_projects(self):
+        make_project(name='Loom')
+        make_project(name='Clay', answers=('Terracotta pots', 'Farmers markets'))
+        text, _ = retrieval.get_chat_context('terracotta')
+        self.assertIn('Project: Clay', text)
+        self.assertNotIn('Project: Loom', text)
+
+    def test_edits_are_reindexed(self):
+        project = make_project()
+        retrieval.get_chat_context('sarees', project.pk)
+        project.answers = ['Block printed quilts']
+        project.save()
+        text, _ = retrieval.get_chat_context('quilts', project.pk)
+        self.assertIn('Block printed quilts', text)
+        self.assertNotIn('sarees', text)
+
+    def test_unknown_project(self):
+        self.assertEqual(retrieval.get_chat_context('hi', 999999), ("No project found with the given ID.", 0))
+        self.assertEqual(retrieval.get_chat_context('hi', 'abc'), ("No project found with the given ID.", 0))
+
+
+class ProjectContextTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.project = make_project()
+
+    def test_rendered_once_per_version(self):
+        with mock.patch.object(context, 'render_project_context', wraps=context.render_project_context) as render:
+            first = context.get_project_context(self.project.pk)
+            second = context.get_project_context(self.project.pk)
+        self.assertEqual(first, second)
+        self.assertIn('  2. Jaipur boutiques', first)
+        render.assert_called_once()
+
+    def test_project_edit_is_picked_up(self):
+        context.get_project_context(self.project.pk)
+        self.project.answers = ['Block printed quilts']
+        self.project.save()
+        self.assertIn('Block printed quilts', context.get_project_context(self.project.pk))
+
+    def test_new_analysis_is_picked_up(self):
+        context.get_project_context(self.project.pk)
+        analyses.save_analyses(self.project, {0: {'title': 'Market', 'analysis': 'Demand peaks at Diwali'}})
+        self.assertIn('Demand peaks at Diwali', context.get_project_context(self.project.pk))
+
+    def test_missing_project(self):
+        self.assertIsNone(context.get_project_context(999999))
+
+
+@override_settings(LLM_BACKEND=LOCAL_LLM, CHAT_SESSIONS={'RECENT_TURNS': 1, 'SUMMARIZE_TURNS': 1})
+class ChatSessionTests(LLMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = make_project()
+
+    def ask(self, message, session_id=None, project_id=None):
+        return post_json(self.client, '/api/chat/', {
+            'message': message, 'session_id': session_id, 'project_id': project_id or self.project.pk,
+        })
+
+    def test_turns_are_kept_and_sent_with_the_next_prompt(self):
+        session_id = self.ask('Where do sarees sell?').json()['session_id']
+        self.ask('And online?', session_id)
+        session = ChatSession.objects.get(pk=session_id)
+        self.assertEqual([m.content for m in session.messages.all()][::2], ['Where do sarees sell?', 'And online?'])
+        self.assertIn('User: Where do sarees sell?', chat.history_prompt(session))
+
+    def test_old_turns_are_folded_into_the_summary(self):
+        with mock.patch('artisan.chat.transaction.on_commit') as on_commit:
+            session_id = self.ask('First question').json()['session_id']
+            self.ask('Second question', session_id)
+        on_commit.assert_called_once()
+        self.assertTrue(chat.fold_into_summary(session_id))
+        session = ChatSession.objects.get(pk=session_id)
+        self.assertEqual(session.summarized_count, 2)
+        self.assertTrue(session.summary)
+        history = chat.history_prompt(session)
+        self.assertIn('Conversation summary:', history)
+        self.assertIn('Second question', history)
+        self.assertNotIn('First question', history)
+        self.assertFalse(chat.fold_into_summary(session_id))
+
+    def test_session_of_another_project_is_refused(self):
+        session_id = self.ask('Hello').json()['session_id']
+        other = make_project(name='Other')
+        self.assertEqual(self.ask('Hello', session_id, other.pk).status_code, 400)
+
+    def test_unfolded_turns_in_the_prompt_are_capped(self):
+        # Folding never ran (LLM down): only the newest HISTORY_TURNS turns are sent
+        with mock.patch('artisan.chat.transaction.on_commit'):
+            session_id = self.ask('Question 0').json()['session_id']
+            for i in range(1, 5):
+                self.ask(f'Question {i}', session_id)
+        history = chat.history_prompt(ChatSession.objects.get(pk=session_id))
+        self.assertIn('Question 4', history)
+        self.assertIn('Question 3', history)
+        self.assertNotIn('Question 2', history)
+
+    def test_unknown_project_is_404(self):
+        response = self.ask('Hello', project_id=999999)
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(ChatSession.objects.exists())
+        response = post_json(self.client, '/api/async/chat/', {'message': 'Hello', 'project_id': 999999})
+        self.assertEqual(response.status_code, 404)
+
+    def test_unknown_session_is_404(self):
+        self.assertEqual(self.ask('Hello', '00000000-0000-0000-0000-000000000000').status_code, 404)
+        self.assertEqual(self.ask('Hello', 'not-a-uuid').status_code, 404)
+
+    def test_session_can_be_deleted(self):
+        session_id = self.ask('Hello').json()['session_id']
+        self.assertEqual(self.client.delete(f'/api/chat/sessions/{session_id}/').status_code, 200)
+        self.assertEqual(self.client.get(f'/api/chat/sessions/{session_id}/').status_code, 404)
+
+
+class SingleFlightTests(TestCase):
+    def run_concurrently(self, fn, callers=4):
+        flight, results, errors = llm.SingleFlight(), [], []
+        started = threading.Barrier(callers)
+
+        def call():
+            started.wait()
+            try:
+                results.append(flight.do('key', fn))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def slow(self, outcome):
+        calls = []
+
+        def fn():
+            calls.append(1)
+            time.sleep(0.2)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        return fn, calls
+
+    def test_concurrent_callers_share_one_call(self):
+        fn, calls = self.slow('reply')
+        results, errors = self.run_concurrently(fn)
+        self.assertEqual((results, errors, len(calls)), (['reply'] * 4, [], 1))
+
+    def test_failure_is_shared(self):
+        fn, calls = self.slow(LLMError('down'))
+        results, errors = self.run_concurrently(fn)
+        self.assertEqual((results, len(errors), len(calls)), ([], 4, 1))
+
+    def test_later_calls_run_again(self):
+        flight = llm.SingleFlight()
+        self.assertEqual([flight.do('key', lambda: 1), flight.do('key', lambda: 2)], [1, 2])
+
+    def test_async_callers_share_one_call(self):
+        flight, calls = llm.AsyncSingleFlight(), []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'reply'
+
+        async def main():
+            return await asyncio.gather(*(flight.do('key', fn) for _ in range(3)))
+
+        self.assertEqual(asyncio.run(main()), ['reply'] * 3)
+        self.assertEqual(len(calls), 1)
+
+    def test_async_follower_takes_over_from_a_cancelled_leader(self):
+        flight, calls = llm.AsyncSingleFlight(), []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'reply'
+
+        async def main():
+            leader = asyncio.create_task(flight.do('key', fn))
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(flight.do('key', fn))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await follower
+
+        self.assertEqual(asyncio.run(main()), 'reply')
+        self.assertEqual(len(calls), 2)
+
+
+@override_settings(LLM_RESILIENCE={'BREAKER_FAILURES': 2, 'BREAKER_SLOW_SECONDS': 1, 'BREAKER_RESET_SECONDS': 30})
+class CircuitBreakerTests(TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker()
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record(0.1, LLMError('down'))
+        self.breaker.record(0.1)
+        self.breaker.record(0.1, LLMError('down'))
+        self.assertFalse(self.breaker.is_open())
+        self.breaker.record(5)  # slow replies count as failures
+        self.assertTrue(self.breaker.is_open())
+        self.assertEqual(self.breaker.last_failure, 'slow reply (5.0s)')
+        with self.assertRaises(CircuitOpen):
+            self.breaker.allow()
+
+    def test_only_the_trial_moves_an_open_breaker(self):
+        for _ in range(2):
+            self.breaker.record(0.1, LLMError('down'))
+        self.breaker.opened_at -= 30
+        self.assertTrue(self.breaker.allow())
+        with self.assertRaises(CircuitOpen):
+            self.breaker.allow()
+        self.breaker.record(0.1)  # a call that started before the breaker opened
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.breaker.record(0.1, trial=True)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertFalse(self.breaker.allow())
+
+    def test_failed_trial_reopens(self):
+        for _ in range(2):
+            self.breaker.record(0.1, LLMError('down'))
+        self.breaker.opened_at -= 30
+        self.breaker.record(0.1, LLMError('still down'), trial=self.breaker.allow())
+        self.assertTrue(self.breaker.is_open())
+
+    def test_abandoned_trial_frees_the_slot(self):
+        for _ in range(2):
+            self.breaker.record(0.1, LLMError('down'))
+        self.breaker.opened_at -= 30
+        self.breaker.release(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+
+@override_settings(LLM_BACKEND=LOCAL_LLM)
+class FallbackTests(LLMTestCase):
+    def open_breaker(self):
+        for _ in range(5):
+            breaker.record(0.1, LLMError('down'))
+
+    def test_open_breaker_answers_without_calling_the_model(self):
+        self.open_breaker()
+        with mock.patch.object(LocalBackend, 'generate') as generate:
+            chat_reply = post_json(self.client, '/api/chat/', {'message': 'Hello'}).json()
+            content = post_json(self.client, '/api/generate-content/', {'prompt': 'A post'})
+        generate.assert_not_called()
+        self.assertTrue(chat_reply['degraded'])
+        self.assertEqual(content.status_code, 503)
+        self.assertGreater(int(content['Retry-After']), 0)
+
+    @override_settings(
+        LLM_BACKEND={**LOCAL_LLM, 'OPTIONS': {'LATENCY': {'distribution': 'fixed', 'value': 5}}},
+        LLM_RESILIENCE={'DEADLINES': {'chat': 0.01}},
+    )
+    def test_missed_deadline_is_degraded(self):
+        reply = post_json(self.client, '/api/chat/', {'message': 'Hello'}).json()
+        self.assertTrue(reply['degraded'])
+        self.assertEqual(breaker.consecutive_failures, 1)
+
+
+# Batch workers are threads; with nothing cached they never touch the test database
+@override_settings(LLM_BACKEND=LOCAL_LLM, LLM_CACHE={'TTL': {'analysis': 0}})
+class BatchAnalysisTests(LLMTestCase):
+    ANSWERS = ['Handwoven sarees', 'Silk and cotton', 'Boutiques']
+
+    def batch(self, body, url='/api/analysis/batch/'):
+        return post_json(self.client, url, body)
+
+    def test_every_answer_is_analyzed_in_order(self):
+        for url in ('/api/analysis/batch/', '/api/async/analysis/batch/'):
+            results = self.batch({'answers': self.ANSWERS}, url).json()['analyses']
+            self.assertEqual(len(results), 3, url)
+            self.assertTrue(all(a['is_gemini'] for a in results), url)
+            self.assertEqual(results[2]['chartType'], views.build_default_analysis(2, 'Boutiques')['chartType'])
+
+    def test_project_results_are_replaced_in_one_write(self):
+        project = make_project(answers=self.ANSWERS[:2])
+        analyses.save_analyses(project, {5: {'title': 'Stale'}})
+        response = self.batch({'project_id': project.pk})
+        self.assertEqual(response.json()['project_id'], project.pk)
+        current = ProjectAnalysis.objects.filter(project=project, is_current=True)
+        self.assertEqual(sorted(current.values_list('question_index', flat=True)), [0, 1])
+
+    @override_settings(LLM_BACKEND=FAILING_LLM)
+    def test_failed_calls_fall_back(self):
+        results = self.batch({'answers': self.ANSWERS}).json()['analyses']
+        self.assertFalse(any(a['is_gemini'] for a in results))
+
+    def test_bad_requests(self):
+        too_many = ['x'] * (views.MAX_BATCH_ANSWERS + 1)
+        for body in ({}, {'answers': []}, {'answers': too_many}, {'answers': ['ok', 3]}):
+            self.assertEqual(self.batch(body).status_code, 400, body)
+        self.assertEqual(self.batch({'project_id': 999999}).status_code, 404)
+
+
+@override_settings(LLM_BACKEND=LOCAL_LLM, LLM_CACHE={'TTL': {'analysis': 0}})
+class ReanalysisTests(LLMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = make_project(answers=('Handwoven sarees', 'Silk and cotton', 'Boutiques'))
+        reanalysis.reanalyze_project(self.project.pk)
+
+    def edit(self, index, answer):
+        self.project.answers[index] = answer
+        self.project.save()
+
+    def test_unchanged_answers_cost_nothing(self):
+        result = reanalysis.reanalyze_project(self.project.pk)
+        self.assertEqual(result, {"regenerated": [], "kept": 3, "superseded": False})
+
+    def test_only_changed_answers_and_the_ones_after_are_regenerated(self):
+        self.edit(2, 'Online marketplaces')
+        self.assertEqual(reanalysis.reanalyze_project(self.project.pk)['regenerated'], [2])
+        self.edit(1, 'Linen')
+        self.assertEqual(reanalysis.reanalyze_project(self.project.pk)['regenerated'], [1, 2])
+        self.assertEqual(reanalysis.reanalyze_project(self.project.pk, force=True)['regenerated'], [0, 1, 2])
+
+    def test_removed_answers_lose_their_analysis(self):
+        self.project.answers = self.project.answers[:1]
+        self.project.save()
+        reanalysis.reanalyze_project(self.project.pk)
+        current = ProjectAnalysis.objects.filter(project=self.project, is_current=True)
+        self.assertEqual(list(current.values_list('question_index', flat=True)), [0])
+
+    @override_settings(LLM_BACKEND=FAILING_LLM)
+    def test_fallback_never_replaces_an_analysis(self):
+        self.edit(2, 'Online marketplaces')
+        self.assertEqual(reanalysis.reanalyze_project(self.project.pk)['regenerated'], [])
+        self.assertTrue(ProjectAnalysis.objects.get(project=self.project, question_index=2, is_current=True).is_gemini)
+
+    def test_background_pass_is_scheduled(self):
+        self.edit(2, 'Online marketplaces')
+        with mock.patch('artisan.reanalysis.transaction.on_commit') as on_commit:
+            response = post_json(self.client, f'/api/projects/{self.project.pk}/reanalyze/', {'background': True})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['stale'], [2])
+        on_commit.assert_called_once()
+
+    def test_non_object_body_is_400(self):
+        for body in (['Online marketplaces'], 'Online marketplaces', 3):
+            for method in (self.client.put, self.client.patch):
+                response = method(f'/api/projects/{self.project.pk}/', json.dumps(body), content_type='application/json')
+                self.assertEqual(response.status_code, 400, body)
+                self.assertEqual(response.json(), {"error": "Expected a JSON object"})
+
+
+class TransferTests(TestCase):
+    def export(self, **params):
+        response = self.client.get('/api/projects/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def import_(self, body, **extra):
+        return self.client.post('/api/projects/import/', body, content_type='application/x-ndjson', **extra)
+
+    def test_export_then_import_round_trips(self):
+        project = make_project(description='Sarees')
+        Project.objects.filter(pk=project.pk).update(created_date=date(2024, 1, 2))
+        analyses.save_analyses(project, {1: {'title': 'Products', 'analysis': 'Silk sells'}})
+        body = self.export()
+        self.assertEqual(gzip.decompress(self.export(compress='gzip')), body)
+
+        result = self.import_(body).json()
+        self.assertEqual((result['created'], result['failed']), (1, 0))
+        copy = Project.objects.exclude(pk=project.pk).get()
+        self.assertEqual((copy.name, copy.description, copy.answers), ('Loom', 'Sarees', project.answers))
+        self.assertEqual(copy.created_date, date(2024, 1, 2))
+        self.assertEqual([(a['question_index'], a['title']) for a in copy.analysis_content], [(1, 'Products')])
+
+    def test_gzip_body(self):
+        body = gzip.compress(b'{"name": "Loom", "type": "%s"}\n' % PROJECT_TYPE.encode())
+        response = self.import_(body, HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual(response.json()['created'], 1)
+
+    def test_bad_lines_are_reported_and_skipped(self):
+        body = '\n'.join([
+            json.dumps({'name': 'Good', 'type': PROJECT_TYPE}),
+            '{not json',
+            '',
+            json.dumps({'name': 'Bad type', 'type': 'nope'}),
+            '[1]',
+        ])
+        result = self.import_(body).json()
+        self.assertEqual((result['created'], result['failed']), (1, 3))
+        self.assertEqual([e['line'] for e in result['errors']], [2, 4, 5])
+
+    @override_settings(PROJECT_TRANSFER={'IMPORT_BATCH_SIZE': 10})
+    def test_broken_body_keeps_what_was_read(self):
+        lines = b''.join(
+            json.dumps({'name': f'Project {i}', 'type': PROJECT_TYPE, 'description': str(i) * 40}).encode() + b'\n'
+            for i in range(200)
+        )
+        compressed = gzip.compress(lines)
+        response = self.import_(compressed[:len(compressed) // 2], HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 400)
+        result = response.json()
+        self.assertGreater(result['created'], 0)
+        self.assertEqual(result['stopped_at_line'], result['created'] + 1)
+        self.assertEqual(Project.objects.count(), result['created'])
+
+
+class ProjectSearchTests(TestCase):
+    def setUp(self):
+        self.loom = make_project(name='Loom', description='Handloom cooperative', questions_answered=True)
+        self.clay = make_project(
+            name='Clay', type=Project.PROJECT_TYPE_CHOICES[1][0], answers=('Terracotta pots', 'Farmers markets'),
+        )
+        Project.objects.filter(pk=self.clay.pk).update(created_date=date(2024, 1, 2))
+
+    def ids(self, **params):
+        response = self.client.get('/api/projects/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [p['id'] for p in response.json()['results']]
+
+    def test_filters(self):
+        self.assertEqual(self.ids(type=self.clay.type), [self.clay.pk])
+        self.assertEqual(self.ids(questions_answered='true'), [self.loom.pk])
+        self.assertEqual(self.ids(created_before='2024-12-31'), [self.clay.pk])
+        self.assertEqual(self.ids(created_after='2024-01-02', created_before='2024-01-02'), [self.clay.pk])
+
+    def test_search_matches_every_word_by_prefix(self):
+        self.assertEqual(self.ids(q='terra'), [self.clay.pk])
+        self.assertEqual(self.ids(q='handloom coop'), [self.loom.pk])
+        self.assertEqual(self.ids(q='handloom pots'), [])
+        self.assertEqual(self.ids(q='" OR *'), [])
+
+    def test_edits_are_searchable(self):
+        self.loom.answers = ['Block printed quilts']
+        self.loom.save()
+        self.assertEqual(self.ids(q='quilts'), [self.loom.pk])
+
+    def test_fallback_without_an_index(self):
+        with mock.patch.object(search, 'sqlite_has_fts', return_value=False):
+            self.assertEqual(self.ids(q='Terracotta markets'), [self.clay.pk])
+
+    def test_bad_filters_are_400(self):
+        for params in ({'type': 'nope'}, {'questions_answered': 'maybe'}, {'created_after': '2024-13-01'}):
+            self.assertEqual(self.client.get('/api/projects/', params).status_code, 400, params)
+
+    def test_fts5_query_quotes_every_term(self):
+        self.assertEqual(search.fts5_query('sar" OR -x'), '"sar"* "OR"* "x"*')
+
+    def test_tsquery_matches_prefixes_like_fts5(self):
+        self.assertEqual(search.tsquery("terra | o'neil !x"), "'terra':* & 'o':* & 'neil':* & 'x':*")
+
+
+class AnalysisVersionTests(TestCase):
+    def setUp(self):
+        self.project = make_project()
+        self.url = f'/api/projects/{self.project.pk}/analyses/0/'
+        analyses.save_analyses(self.project, {0: {'title': 'Market', 'analysis': 'First take'}})
+
+    def put(self, data):
+        return self.client.put(self.url, json.dumps(data), content_type='application/json')
+
+    def test_edit_adds_a_version_and_keeps_the_history(self):
+        data = self.put({'title': 'Market', 'analysis': 'Second take', 'is_gemini': True}).json()
+        self.assertEqual(data['current']['version'], 2)
+        self.assertFalse(data['current']['is_gemini'])
+        self.assertEqual([(v['version'], v['is_current']) for v in data['history']], [(2, True), (1, False)])
+        self.assertEqual(self.client.get(f'/api/projects/{self.project.pk}/').json()['analysis_content'][0]['analysis'], 'Second take')
+
+    def test_unchanged_content_is_not_stored_again(self):
+        self.assertEqual(analyses.save_analyses(self.project, {0: {'title': 'Market', 'analysis': 'First take'}}), [])
+        self.assertEqual(len(self.client.get(self.url).json()['history']), 1)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.get(f'/api/projects/{self.project.pk}/analyses/3/').status_code, 404)
+        self.assertEqual(self.put([1]).status_code, 400)
+        self.assertEqual(self.put({}).status_code, 400)
+
+    def test_entries_from_content(self):
+        self.assertEqual(analyses.entries_from_content([{'title': 'A'}, None, {'title': 'C'}]), {0: {'title': 'A'}, 2: {'title': 'C'}})
+        self.assertEqual(analyses.entries_from_content('{"title": "A", "question_index": 4}'), {4: {'title': 'A', 'question_index': 4}})
+        for bad in ('not json', 3, [1], [{'question_index': -1}], [{'question_index': True}]):
+            with self.assertRaises(ValueError, msg=bad):
+                analyses.entries_from_content(bad)
+
+
+class PatchTests(TestCase):
+    def setUp(self):
+        self.project = make_project(description='Sarees', charts={'sales': [1, 2]})
+        self.url = f'/api/projects/{self.project.pk}/'
+
+    def patch(self, body, content_type=patching.JSON_PATCH):
+        return self.client.patch(self.url, json.dumps(body), content_type=content_type)
+
+    def test_json_patch_edits_one_answer(self):
+        response = self.patch([
+            {'op': 'replace', 'path': '/answers/1', 'value': 'Delhi boutiques'},
+            {'op': 'add', 'path': '/charts/visits', 'value': [3]},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.answers, ['Handwoven sarees', 'Delhi boutiques'])
+        self.assertEqual(self.project.charts, {'sales': [1, 2], 'visits': [3]})
+
+    def test_native_update_keeps_a_concurrent_edit(self):
+        stale = patching.project_document(self.project)
+        Project.objects.filter(pk=self.project.pk).update(answers=['Handwoven sarees', 'Online'])
+        native = patching.native_update(stale, [{'op': 'replace', 'path': '/answers/0', 'value': 'Silk sarees'}])
+        Project.objects.filter(pk=self.project.pk).update(**native)
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.answers, ['Silk sarees', 'Online'])
+
+    def test_failed_test_is_409_and_changes_nothing(self):
+        response = self.patch([
+            {'op': 'replace', 'path': '/name', 'value': 'Renamed'},
+            {'op': 'test', 'path': '/answers/0', 'value': 'Pottery'},
+        ])
+        self.assertEqual(response.status_code, 409)
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.name, 'Loom')
+
+    def test_malformed_patches_are_400(self):
+        for body in (
+            {'op': 'add'},
+            [{'op': 'remove', 'path': '/name'}],
+            [{'op': 'replace', 'path': '/answers/5', 'value': 1}],
+            [{'op': 'jump', 'path': '/name'}],
+            [{'op': 'move', 'from': '/charts', 'path': '/charts/sales'}],
+        ):
+            self.assertEqual(self.patch(body).status_code, 400, body)
+
+    def test_merge_patch(self):
+        response = self.patch({'description': None, 'charts': {'sales': None, 'visits': [3]}}, patching.MERGE_PATCH)
+        self.assertEqual(response.status_code, 200)
+        self.project.refresh_from_db()
+        self.assertIsNone(self.project.description)
+        self.assertEqual(self.project.charts, {'visits': [3]})
+        self.assertEqual(self.patch({'name': None}, patching.MERGE_PATCH).status_code, 400)
+        self.assertEqual(self.patch({'secret': 1}, patching.MERGE_PATCH).status_code, 400)
+
+    def test_array_operations(self):
+        document = patching.apply_json_patch(patching.project_document(self.project), [
+            {'op': 'add', 'path': '/answers/-', 'value': 'Instagram'},
+            {'op': 'move', 'from': '/answers/0', 'path': '/answers/2'},
+            {'op': 'copy', 'from': '/answers/0', 'path': '/answers/0'},
+        ])
+        self.assertEqual(document['answers'], ['Jaipur boutiques', 'Jaipur boutiques', 'Instagram', 'Handwoven sarees'])
+        with self.assertRaises(patching.PatchError):
+            patching.apply_json_patch(patching.project_document(self.project), [{'op': 'remove', 'path': '/answers/01'}])
+
+
+class ChartEngineTests(TestCase):
+    SPIKY = [0.0] * 100
+    SPIKY[37], SPIKY[80] = 50.0, -20.0
+
+    def setUp(self):
+        cache.clear()
+        self.project = make_project()
+        self.url = f'/api/projects/{self.project.pk}/charts/series/'
+
+    def ingest(self, start, values, metric='sales.revenue'):
+        post_json(self.client, f'/api/projects/{self.project.pk}/metrics/', {'points': [
+            {'metric': metric, 'date': (start + timedelta(days=i)).isoformat(), 'value': value}
+            for i, value in enumerate(values)
+        ]})
+
+    def test_lttb_keeps_the_ends_and_the_extremes(self):
+        with mock.patch.object(charts, 'np', None):
+            keep = charts.lttb_indexes(range(100), self.SPIKY, 10)
+        self.assertEqual(len(keep), 10)
+        self.assertEqual((keep[0], keep[-1]), (0, 99))
+        self.assertTrue({37, 80} <= set(keep))
+        self.assertEqual(charts.lttb_indexes(range(5), [1, 2, 3, 4, 5], 10), [0, 1, 2, 3, 4])
+
+    @skipIf(charts.np is None, "NumPy is not installed")
+    def test_numpy_and_python_agree(self):
+        fast = charts.lttb_indexes(range(100), self.SPIKY, 10)
+        with mock.patch.object(charts, 'np', None):
+            self.assertEqual(charts.lttb_indexes(range(100), self.SPIKY, 10), fast)
+
+    def test_series_is_downsampled_to_the_width(self):
+        self.ingest(date(2025, 1, 1), [float(i % 7) for i in range(60)])
+        data = self.client.get(self.url, {'metric': 'sales.revenue', 'width': 10}).json()
+        self.assertEqual((data['points'], data['downsampled']), (60, True))
+        labels = data['chartData']['labels']
+        self.assertEqual((len(labels), labels[0], labels[-1]), (10, '2025-01-01', '2025-03-01'))
+        months = self.client.get(self.url, {'metric': 'sales.revenue', 'bucket': 'month'}).json()
+        self.assertEqual(months['chartData']['labels'], ['2025-01-01', '2025-02-01', '2025-03-01'])
+
+    def test_new_points_replace_the_cached_chart(self):
+        self.ingest(date(2025, 1, 1), [1.0, 2.0])
+        self.assertEqual(self.client.get(self.url, {'metric': 'sales.revenue'}).json()['points'], 2)
+        self.ingest(date(2025, 1, 3), [3.0])
+        self.assertEqual(self.client.get(self.url, {'metric': 'sales.revenue'}).json()['points'], 3)
+
+    def test_stored_charts_are_downsampled(self):
+        Project.objects.filter(pk=self.project.pk).update(charts={'trend': {'labels': list(range(100)), 'data': self.SPIKY}})
+        data = self.client.get(f'/api/projects/{self.project.pk}/charts/', {'width': 10}).json()
+        self.assertEqual(len(data['charts']['trend']['data']), 10)
+        self.assertIn(50.0, data['charts']['trend']['data'])
+
+    def test_a_write_from_another_worker_is_seen(self):
+        url = f'/api/projects/{self.project.pk}/charts/'
+        self.client.get(url)
+        # A queryset update sends no signal here, as a write in another process wouldn't
+        Project.objects.filter(pk=self.project.pk).update(charts={'visits': [3]}, updated_at=timezone.now())
+        self.assertEqual(self.client.get(url).json()['charts'], {'visits': [3]})
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.get(self.url, {'metric': 'sales.revenue'}).status_code, 404)
+        for params in ({'metric': 'nope'}, {'metric': 'sales.revenue', 'bucket': 'year'},
+                       {'metric': 'sales.revenue', 'width': 2}, {'metric': 'sales.revenue', 'start': 'March'}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400, params)
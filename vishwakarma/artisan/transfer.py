@@ -0,0 +1,145 @@
+"""
+Streaming NDJSON export and import of projects.
+
+Export walks the table with ``iterator(chunk_size=EXPORT_CHUNK_SIZE)`` (a
+server-side cursor on PostgreSQL) and yields one JSON line per project,
+optionally gzip-compressed on the fly. Import reads the request body line by
+line, gunzipping it when it is sent compressed, and inserts IMPORT_BATCH_SIZE
+projects per bulk_create. Neither side holds more than one chunk or batch,
+so backups and moves between databases run in constant memory.
+
+Imported projects get new ids; everything else, including ``created_date``,
+is kept.
+"""
+import gzip
+import json
+import zlib
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .analyses import create_initial, with_analyses
+from .models import Project
+
+DEFAULT_TRANSFER_SETTINGS = {
+    'EXPORT_CHUNK_SIZE': 500,
+    'IMPORT_BATCH_SIZE': 500,
+    # Errors reported back from one import; the rest are only counted.
+    'MAX_REPORTED_ERRORS': 100,
+}
+
+RECORD_FIELDS = (
+    "id", "name", "type", "description", "created_date", "updated_at",
+    "questions_answered", "is_first_iteration", "answers", "charts", "analysis_content",
+)
+
+
+def transfer_settings() -> dict:
+    return {**DEFAULT_TRANSFER_SETTINGS, **getattr(settings, 'PROJECT_TRANSFER', {})}
+
+
+def export_lines(queryset=None):
+    """One NDJSON line (bytes) per project."""
+    queryset = with_analyses(Project.objects.order_by('id') if queryset is None else queryset)
+    for project in queryset.iterator(chunk_size=transfer_settings()['EXPORT_CHUNK_SIZE']):
+        record = {field: getattr(project, field) for field in RECORD_FIELDS}
+        yield json.dumps(record, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8') + b"\n"
+
+
+def gzip_chunks(chunks, min_size=64 * 1024):
+    """Compress a byte stream on the fly, emitting roughly ``min_size`` bytes at a time."""
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    pending = []
+    size = 0
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            pending.append(data)
+            size += len(data)
+        if size >= min_size:
+            yield b"".join(pending)
+            pending, size = [], 0
+    pending.append(compressor.flush())
+    yield b"".join(pending)
+
+
+def read_lines(stream, compressed=False):
+    """``(line number, raw line)`` for the non-blank lines of a file-like body."""
+    if compressed:
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+    for number, line in enumerate(stream, 1):
+        if line.strip():
+            yield number, line
+
+
+# Raised by read_lines() when the body itself is unreadable (corrupt gzip, dropped upload)
+STREAM_ERRORS = (OSError, EOFError, zlib.error)
+
+
+def import_projects(lines, build) -> dict:
+    """
+    Insert a project for each NDJSON line, IMPORT_BATCH_SIZE per bulk_create.
+    ``build(record)`` returns an unsaved Project and its ``{question index:
+    analysis}`` or raises ValueError; invalid lines are skipped and reported
+    with their line number.
+
+    Batches are committed as they fill, so when the body turns unreadable
+    partway the lines before it stay imported. The result then also has
+    ``error`` and ``stopped_at_line``, the first line that could not be read.
+    """
+    config = transfer_settings()
+    created = 0
+    failed = 0
+    errors = []
+    batch = []
+    dates = []  # created_date of each batched project, before bulk_create stamps today
+
+    def flush():
+        nonlocal created
+        with transaction.atomic():
+            projects = Project.objects.bulk_create([project for project, _ in batch])
+            create_initial(batch)
+            dated = []
+            for project, created_date in zip(projects, dates):
+                if created_date is not None and project.pk is not None:
+                    project.created_date = created_date
+                    dated.append(project)
+            if dated:
+                Project.objects.bulk_update(dated, ['created_date'])
+        created += len(batch)
+        batch.clear()
+        dates.clear()
+
+    number = 0
+    interrupted = None
+    try:
+        for number, line in lines:
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("must be a JSON object")
+                project, entries = build(record)
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                failed += 1
+                error = f"Invalid JSON: {e}"
+            except ValueError as e:
+                failed += 1
+                error = str(e)
+            else:
+                batch.append((project, entries))
+                dates.append(project.created_date)
+                if len(batch) >= config['IMPORT_BATCH_SIZE']:
+                    flush()
+                continue
+            if len(errors) < config['MAX_REPORTED_ERRORS']:
+                errors.append({"line": number, "error": error})
+    except STREAM_ERRORS as e:
+        # Blank lines are skipped, so this is the earliest line that may be the bad one
+        interrupted = {"error": f"Unreadable body: {e}", "stopped_at_line": number + 1}
+    if batch:
+        flush()
+    result = {"created": created, "failed": failed, "errors": errors}
+    if interrupted:
+        result.update(interrupted)
+    return result
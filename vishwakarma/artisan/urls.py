@@ -1,15 +1,37 @@
 from django.urls import path 
-from . import views
+from . import async_views, views
 from .views import analysis_view, statistics_view, api_keys_view, chatbot_view
 
 urlpatterns = [
     path('', views.home, name='home'),
     path('api/projects/', views.api_projects, name='api_projects'),
+    path('api/projects/bulk/', views.api_projects_bulk, name='api_projects_bulk'),
+    path('api/projects/export/', views.api_projects_export, name='api_projects_export'),
+    path('api/projects/import/', views.api_projects_import, name='api_projects_import'),
     path('api/projects/<int:project_id>/', views.api_project_detail, name='api_project_detail'),
     path('api/analysis/', analysis_view, name='analysis_api'),
+    path('api/analysis/batch/', views.batch_analysis_view, name='analysis_batch'),
+    path('api/analysis/jobs/<uuid:job_id>/', views.analysis_job_view, name='analysis_job'),
     path('api/statistics/', statistics_view, name='statistics_view'),
+    path('api/projects/<int:project_id>/analyses/<int:question_index>/', views.project_analysis_view,
+         name='project_analysis'),
+    path('api/projects/<int:project_id>/reanalyze/', views.project_reanalyze_view, name='project_reanalyze'),
     path('api/projects/<int:project_id>/api-keys/', views.api_keys_view, name='api_keys'),
+    path('api/projects/<int:project_id>/metrics/', views.project_metrics_view, name='project_metrics'),
+    path('api/projects/<int:project_id>/charts/', views.project_charts_view, name='project_charts'),
+    path('api/projects/<int:project_id>/charts/series/', views.project_chart_series_view, name='project_chart_series'),
+    path('metrics/', views.prometheus_metrics_view, name='prometheus_metrics'),
     path('api/chat/', chatbot_view, name='chatbot_view'),  # NEW CHATBOT ENDPOINT
+    path('api/chat/sessions/<uuid:session_id>/', views.chat_session_view, name='chat_session'),
     path('api/test-gemini/', views.test_gemini_view, name='test_gemini'),
+    path('api/llm/status/', views.llm_status_view, name='llm_status'),
     path('api/generate-content/', views.generate_content_view, name='generate_content'),
+    # Async variants for deployments served through vishwakarma/asgi.py
+    path('api/async/analysis/', async_views.analysis_view, name='analysis_api_async'),
+    path('api/async/analysis/batch/', async_views.batch_analysis_view, name='analysis_batch_async'),
+    path('api/async/chat/', async_views.chatbot_view, name='chatbot_view_async'),
+    path('api/async/test-gemini/', async_views.test_gemini_view, name='test_gemini_async'),
+    path('api/async/generate-content/', async_views.generate_content_view, name='generate_content_async'),
+    path('api/async/statistics/', async_views.statistics_poll_view, name='statistics_poll_async'),
+    path('api/async/statistics/stream/', async_views.statistics_stream_view, name='statistics_stream_async'),
 ]
\ No newline at end of file
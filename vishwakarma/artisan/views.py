@@ -1,42 +1,302 @@
+import hashlib
 import json
+import logging
+import math
 import random
-import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse, HttpRequest
+from django.http import HttpResponse, JsonResponse, HttpRequest, StreamingHttpResponse
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Max
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
+from django.urls import reverse
+from django.utils import timezone
 from django.utils.dateparse import parse_date
-from .models import Project, ApiKeys
+from . import analyses, charts, chat, context, instrumentation, metrics, patching, reanalysis, retrieval, search, statistics, transfer
+from .context import render_project_context
+from .models import Project, ApiKeys, AnalysisJob, ChatSession
+from .signals import invalidate_projects
+from .jobs import enqueue_analysis
+from .llm import generate_text, get_backend, llm_available, stream_text
+from .resilience import LLMUnavailable, breaker, resilience_settings
 
-# --- NEW IMPORTS FOR GEMINI + LANGCHAIN ---
-import google.generativeai as genai
-from langchain.schema import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-
-# Configure Gemini
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+logger = logging.getLogger(__name__)
 
 def home(request):
-    return render(request, 'artisan/index.html')
+    # Only an ASGI worker can hold the statistics stream or a long-poll open
+    # cheaply; under WSGI the dashboard polls statistics_view, which answers at once.
+    if isinstance(request, ASGIRequest):
+        statistics_stream, statistics_poll = reverse('statistics_stream_async'), reverse('statistics_poll_async')
+    else:
+        statistics_stream, statistics_poll = '', reverse('statistics_view')
+    return render(request, 'artisan/index.html', {
+        'statistics_stream': statistics_stream,
+        'statistics_poll': statistics_poll,
+    })
 
-def project_to_dict(project: Project) -> dict:
-    return {
+def wants_stream(request: HttpRequest, data: dict) -> bool:
+    """Streaming is opt-in: ``"stream": true`` in the body or an SSE Accept header."""
+    return bool(data.get('stream')) or 'text/event-stream' in request.headers.get('Accept', '')
+
+def sse_event(data: dict, event: str = None) -> str:
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+def sse_response(chunks, text_key: str, **metadata) -> StreamingHttpResponse:
+    """
+    Relay model chunks as Server-Sent Events. Each chunk is a ``{"delta": ...}``
+    message; the final ``done`` event carries the full text under ``text_key``
+    plus ``metadata``. Failures mid-stream are reported as an ``error`` event.
+    """
+    def events():
+        parts = []
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                yield sse_event({"delta": chunk})
+        except Exception as e:
+            yield sse_event({"error": str(e)}, event="error")
+            return
+        yield sse_event({text_key: "".join(parts), **metadata}, event="done")
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # let proxies flush each event
+    return response
+
+PROJECT_FIELDS = (
+    "id", "name", "type", "description", "created_date", "updated_at",
+    "questions_answered", "answers", "charts", "analysis_content",
+)
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def project_to_dict(project: Project, fields=None) -> dict:
+    data = {
         "id": project.id,
         "name": project.name,
         "type": project.type,
+        "description": project.description,
         "created_date": project.created_date.isoformat(),
+        "updated_at": project.updated_at.isoformat(),
         "questions_answered": project.questions_answered,
         "answers": project.answers,
         "charts": project.charts,
         "analysis_content": project.analysis_content,
-    }
+    } if fields is None else {}
+    for field in fields or ():
+        value = getattr(project, field)
+        data[field] = value.isoformat() if field in ("created_date", "updated_at") else value
+    return data
+
+# --- CONDITIONAL GET ---
+# The validators below only read ids and timestamps, so a matching
+# If-None-Match / If-Modified-Since is answered with 304 before any project
+# row is loaded or serialized.
+
+def projects_etag(request: HttpRequest, *args, **kwargs):
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    # Count and max id catch creates and deletes, max updated_at catches edits;
+    # the query string is mixed in because each page/fieldset is its own representation.
+    state = Project.objects.aggregate(count=Count('id'), last_id=Max('id'), last_update=Max('updated_at'))
+    last_update = state['last_update'].timestamp() if state['last_update'] else 0
+    query = hashlib.md5(request.META.get('QUERY_STRING', '').encode('utf-8')).hexdigest()[:8]
+    return f'W/"{state["count"]}-{state["last_id"] or 0}-{last_update}-{query}"'
+
+def project_etag(request: HttpRequest, project_id: int):
+    updated_at = project_last_modified(request, project_id)
+    return f'W/"{project_id}-{updated_at.timestamp()}"' if updated_at else None
+
+def project_last_modified(request: HttpRequest, project_id: int):
+    # Memoized on the request: condition() asks for both validators.
+    if not hasattr(request, '_project_updated_at'):
+        request._project_updated_at = Project.objects.filter(pk=project_id).values_list('updated_at', flat=True).first()
+    return request._project_updated_at
+
+def parse_fields(request: HttpRequest):
+    """``?fields=id,name`` -> ['id', 'name'] (id is always included); None when absent."""
+    raw = request.GET.get('fields')
+    if not raw:
+        return None
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in PROJECT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return ["id"] + [f for f in fields if f != "id"]
+
+def filter_projects(queryset, params):
+    """
+    Apply the list filters: ``type``, ``questions_answered`` (true/false),
+    ``created_after`` / ``created_before`` (inclusive YYYY-MM-DD) and ``q``
+    (full-text search over name, description and answers). ValueError on bad input.
+    """
+    if params.get('type'):
+        if params['type'] not in dict(Project.PROJECT_TYPE_CHOICES):
+            raise ValueError("'type' must be one of the allowed choices")
+        queryset = queryset.filter(type=params['type'])
+    if params.get('questions_answered'):
+        flag = params['questions_answered'].lower()
+        if flag not in ('true', 'false'):
+            raise ValueError("'questions_answered' must be true or false")
+        queryset = queryset.filter(questions_answered=flag == 'true')
+    for param, lookup in (('created_after', 'created_date__gte'), ('created_before', 'created_date__lte')):
+        if params.get(param):
+            try:
+                day = parse_date(params[param])
+            except ValueError:
+                day = None
+            if day is None:
+                raise ValueError(f"'{param}' must be YYYY-MM-DD")
+            queryset = queryset.filter(**{lookup: day})
+    if params.get('q', '').strip():
+        queryset = search.search_projects(queryset, params['q'])
+    return queryset
+
+def new_project_from_payload(payload: dict) -> Project:
+    """Validate a create payload and return the unsaved Project; ValueError on bad input."""
+    name = (payload.get('name') or '').strip()
+    project_type = payload.get('type')
+    answers = payload.get('answers')
+    charts = payload.get('charts') or {}
+
+    if not name:
+        raise ValueError("'name' is required")
+    if project_type not in dict(Project.PROJECT_TYPE_CHOICES):
+        raise ValueError("'type' must be one of the allowed choices")
+    if answers is None:
+        answers = []
+    elif not isinstance(answers, list):
+        raise ValueError("'answers' must be a list")
+
+    return Project(
+        name=name,
+        type=project_type,
+        description=payload.get('description'),
+        questions_answered=bool(answers),
+        answers=answers,
+        charts=charts if isinstance(charts, dict) else {},
+    )
+
+def project_from_record(record: dict) -> Project:
+    """An unsaved Project and its analyses from an exported record; ValueError on bad input."""
+    project = new_project_from_payload(record)
+    entries = payload_analyses(record) or {}
+    if record.get('questions_answered') is not None:
+        project.questions_answered = bool(record['questions_answered'])
+    if record.get('is_first_iteration') is not None:
+        project.is_first_iteration = bool(record['is_first_iteration'])
+    if record.get('created_date'):
+        project.created_date = parse_date(str(record['created_date']))
+        if project.created_date is None:
+            raise ValueError("'created_date' must be YYYY-MM-DD")
+    return project, entries
+
+def apply_project_changes(project: Project, payload: dict) -> list:
+    """
+    Apply a PUT/PATCH payload to ``project`` in memory. Returns the names of
+    the fields that were set; raises ValueError on bad input, in which case
+    ``project`` is left untouched.
+    """
+    name = payload.get('name')
+    project_type = payload.get('type')
+    description = payload.get('description')
+    answers = payload.get('answers')
+    charts = payload.get('charts')
+    questions_answered = payload.get('questions_answered')
+    created_date = payload.get('created_date')
+    values = {}
+
+    # Validate everything first so a bad field can't leave the others applied
+    if name is not None:
+        values['name'] = str(name).strip()
+    if project_type is not None:
+        if project_type not in dict(Project.PROJECT_TYPE_CHOICES):
+            raise ValueError("'type' must be one of the allowed choices")
+        values['type'] = project_type
+    if description is not None:
+        values['description'] = str(description)
+    if answers is not None:
+        if not isinstance(answers, list):
+            raise ValueError("'answers' must be a list")
+        values['answers'] = list(answers)
+        values['questions_answered'] = bool(values['answers'])
+    if charts is not None:
+        try:
+            values['charts'] = dict(charts)
+        except Exception:
+            raise ValueError("'charts' must be an object")
+    if questions_answered is not None:
+        values['questions_answered'] = bool(questions_answered)
+    if created_date is not None:
+        try:
+            dt = parse_date(str(created_date))
+        except ValueError:
+            dt = None
+        if dt is None:
+            raise ValueError("'created_date' must be YYYY-MM-DD")
+        values['created_date'] = dt
+
+    for field, value in values.items():
+        setattr(project, field, value)
+    return list(values)
+
+def payload_analyses(payload: dict):
+    """
+    ``{question index: analysis}`` from the payload's ``analysis_content``,
+    or None when it has none; ValueError on bad input. Analyses are stored
+    in their own table (artisan/analyses.py), not by apply_project_changes.
+    """
+    if payload.get('analysis_content') is None:
+        return None
+    return analyses.entries_from_content(payload['analysis_content'])
 
 @csrf_exempt
+@condition(etag_func=projects_etag)
 def api_projects(request: HttpRequest):
     if request.method == 'GET':
-        projects = [project_to_dict(p) for p in Project.objects.all()]
-        return JsonResponse({"results": projects}, status=200)
+        try:
+            fields = parse_fields(request)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        try:
+            queryset = filter_projects(Project.objects.all(), request.GET)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        if fields is not None:
+            # Skip loading the large JSON columns the client did not ask for
+            queryset = queryset.only(*[f for f in fields if f != 'analysis_content'])
+        if fields is None or 'analysis_content' in fields:
+            queryset = analyses.with_analyses(queryset)
+
+        cursor = request.GET.get('cursor')
+        limit = request.GET.get('limit')
+        if cursor is None and limit is None:
+            projects = [project_to_dict(p, fields) for p in queryset]
+            return JsonResponse({"results": projects}, status=200)
+
+        # Keyset pagination over the default -id ordering: the cursor is the
+        # last id of the previous page, so every page is a single index range scan.
+        try:
+            limit = min(max(int(limit or DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+            if cursor:
+                queryset = queryset.filter(id__lt=int(cursor))
+        except ValueError:
+            return JsonResponse({"error": "'cursor' and 'limit' must be integers"}, status=400)
+
+        page = list(queryset.order_by('-id')[:limit + 1])
+        has_more = len(page) > limit
+        page = page[:limit]
+        return JsonResponse({
+            "results": [project_to_dict(p, fields) for p in page],
+            "next_cursor": str(page[-1].id) if has_more else None,
+        }, status=200)
 
     if request.method == 'POST':
         try:
@@ -44,31 +304,61 @@ def api_projects(request: HttpRequest):
         except json.JSONDecodeError:
             return JsonResponse({"error": "Invalid JSON"}, status=400)
 
-        name = (payload.get('name') or '').strip()
-        project_type = payload.get('type')
-        answers = payload.get('answers') or []
-        charts = payload.get('charts') or {}
-        analysis_content = payload.get('analysis_content') or {}
-
-
-        if not name:
-            return JsonResponse({"error": "'name' is required"}, status=400)
-        if project_type not in dict(Project.PROJECT_TYPE_CHOICES):
-            return JsonResponse({"error": "'type' must be one of the allowed choices"}, status=400)
-
-        project = Project.objects.create(
-            name=name,
-            type=project_type,
-            questions_answered=bool(answers),
-            answers=answers,
-            charts=charts if isinstance(charts, dict) else {},
-            analysis_content=analysis_content,
-        )
+        try:
+            project = new_project_from_payload(payload)
+            entries = payload_analyses(payload) or {}
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        with transaction.atomic():
+            project.save()
+            analyses.create_initial([(project, entries)])
         return JsonResponse(project_to_dict(project), status=201)
 
     return JsonResponse({"error": "Method not allowed"}, status=405)
 
+def api_projects_export(request: HttpRequest):
+    """
+    Every project as NDJSON, streamed straight from a database cursor.
+    ``?compress=gzip`` sends a .ndjson.gz file instead.
+    """
+    if request.method != 'GET':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    compress = request.GET.get('compress')
+    if compress not in (None, '', 'gzip'):
+        return JsonResponse({"error": "'compress' must be 'gzip'"}, status=400)
+
+    filename = f"projects-{timezone.now():%Y%m%d}.ndjson"
+    lines = transfer.export_lines()
+    if compress:
+        response = StreamingHttpResponse(transfer.gzip_chunks(lines), content_type='application/gzip')
+        filename += '.gz'
+    else:
+        response = StreamingHttpResponse(lines, content_type='application/x-ndjson')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@csrf_exempt
+def api_projects_import(request: HttpRequest):
+    """
+    Create projects from an NDJSON body (one exported record per line), read
+    line by line. Gzip bodies are accepted with ``Content-Encoding: gzip`` or
+    ``Content-Type: application/gzip``. A body that becomes unreadable
+    partway gets a 400 that still reports what was created before it and
+    the line where reading stopped.
+    """
+    if request.method != 'POST':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    compressed = (
+        request.headers.get('Content-Encoding', '').lower() == 'gzip'
+        or request.content_type == 'application/gzip'
+    )
+    result = transfer.import_projects(transfer.read_lines(request, compressed), project_from_record)
+    return JsonResponse(result, status=400 if 'error' in result else 200)
+
+REANALYZE_PARAMS = {'': None, 'false': False, '0': False, 'true': True, '1': True, 'background': 'background'}
+
 @csrf_exempt
+@condition(etag_func=project_etag, last_modified_func=project_last_modified)
 def api_project_detail(request: HttpRequest, project_id: int):
     project = get_object_or_404(Project, pk=project_id)
     if request.method == 'DELETE':
@@ -76,7 +366,7 @@ def api_project_detail(request: HttpRequest, project_id: int):
             project.delete()
             return JsonResponse({"success": True}, status=200)
         except Exception as e:
-            print("DELETE error:", str(e))  # This will print the error to your console
+            logger.exception("Deleting project %s failed", project_id)
             return JsonResponse({"error": str(e)}, status=400)
 
     if request.method == 'GET':
@@ -88,288 +378,655 @@ def api_project_detail(request: HttpRequest, project_id: int):
         except json.JSONDecodeError:
             return JsonResponse({"error": "Invalid JSON"}, status=400)
 
-        name = payload.get('name')
-        project_type = payload.get('type')
-        answers = payload.get('answers')
-        charts = payload.get('charts')
-        questions_answered = payload.get('questions_answered')
-        created_date = payload.get('created_date')
-        analysis_content = payload.get('analysis_content')
-
-        if name is not None:
-            project.name = str(name).strip()
-        if project_type is not None:
-            if project_type not in dict(Project.PROJECT_TYPE_CHOICES):
-                return JsonResponse({"error": "'type' must be one of the allowed choices"}, status=400)
-            project.type = project_type
-        if answers is not None:
-            project.answers = list(answers)
-            project.questions_answered = bool(project.answers)
-        if charts is not None:
-            try:
-                charts_obj = dict(charts)
-            except Exception:
-                return JsonResponse({"error": "'charts' must be an object"}, status=400)
-            project.charts = charts_obj
-        if questions_answered is not None:
-            project.questions_answered = bool(questions_answered)
-        if created_date is not None:
-            dt = parse_date(created_date)
-            if dt is None:
-                return JsonResponse({"error": "'created_date' must be YYYY-MM-DD"}, status=400)
-            project.created_date = dt
-        if analysis_content is not None:
-             if isinstance(analysis_content, (dict, list)):
-              project.analysis_content = analysis_content
-    else:
+        patch_format = request.content_type in (patching.JSON_PATCH, patching.MERGE_PATCH)
+        if not patch_format and not isinstance(payload, dict):
+            return JsonResponse({"error": "Expected a JSON object"}, status=400)
+        # Patch documents have no room for options, so they take it from the query string
+        reanalyze = REANALYZE_PARAMS.get(request.GET.get('reanalyze', ''), '?') if patch_format else payload.get('reanalyze')
+        if reanalyze not in (None, False, True, 'background'):
+            return JsonResponse({"error": "'reanalyze' must be true, false or \"background\""}, status=400)
         try:
-            project.analysis_content = json.loads(analysis_content)
-        except Exception:
-            return JsonResponse({"error": "'analysis_content' must be valid JSON"}, status=400)
-
+            document = patching.project_document(project) if patch_format else None
+            if request.content_type == patching.JSON_PATCH:
+                operations = payload
+                payload = patching.changed_members(document, patching.apply_json_patch(document, operations))
+            elif request.content_type == patching.MERGE_PATCH:
+                operations = None
+                payload = patching.changed_members(document, patching.merge_patch_document(document, payload))
+            entries = payload_analyses(payload)
+            changed = apply_project_changes(project, payload)
+            if 'description' in payload and payload['description'] is None and patch_format:
+                project.description = None
+                changed.append('description')
+        except patching.PatchConflict as e:
+            return JsonResponse({"error": str(e)}, status=409)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
 
-        project.save()
+        native = None
+        if request.content_type == patching.JSON_PATCH and set(payload) <= set(patching.NATIVE_FIELDS):
+            native = patching.native_update(document, operations)
+        if native:
+            # Edit the JSON in place so concurrent patches to other answers survive
+            project.updated_at = timezone.now()
+            others = {field: getattr(project, field) for field in changed if field not in native}
+            Project.objects.filter(pk=project.pk).update(**native, **others, updated_at=project.updated_at)
+            project.refresh_from_db(fields=list(native))
+            transaction.on_commit(lambda: invalidate_projects([project.pk]))
+        elif changed:
+            project.save(update_fields=changed + ['updated_at'])
+        if entries is not None:
+            # Only questions whose analysis differs get a new version
+            analyses.save_analyses(project, entries, keep=entries)
+            project.refresh_from_db(fields=['updated_at'])
+        # Only the questions whose answers (or earlier answers) changed are regenerated
+        if reanalyze and 'answers' in changed:
+            if reanalyze == 'background':
+                reanalysis.schedule_reanalysis(project.pk)
+            else:
+                reanalysis.reanalyze_project(project.pk)
+                project.refresh_from_db()
         return JsonResponse(project_to_dict(project), status=200)
 
-    if request.method == 'DELETE':
+    return JsonResponse({"error": "Method not allowed"}, status=405)
+
+@csrf_exempt
+def project_reanalyze_view(request: HttpRequest, project_id: int):
+    """
+    Regenerate the analyses whose answers changed since they were made:
+    ``{"force": false, "background": false}``. In the background the call
+    returns 202 with the questions that will be regenerated.
+    """
+    if request.method != 'POST':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    try:
+        data = json.loads(request.body.decode('utf-8')) if request.body else {}
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    force = bool(data.get('force', False))
+    project = get_object_or_404(Project, pk=project_id)
+
+    if data.get('background'):
+        stale = reanalysis.stale_questions(project, force)
+        if stale:
+            reanalysis.schedule_reanalysis(project.pk, force)
+        return JsonResponse({"project_id": project.pk, "stale": stale, "scheduled": bool(stale)}, status=202)
+
+    result = reanalysis.reanalyze_project(project.pk, force)
+    project.refresh_from_db()
+    return JsonResponse({"project_id": project.pk, **result, "analysis_content": project.analysis_content})
+
+@csrf_exempt
+def project_analysis_view(request: HttpRequest, project_id: int, question_index: int):
+    """
+    GET: the current analysis of one question and its earlier versions.
+    PUT: store an edited analysis as a new version.
+    """
+    project = get_object_or_404(Project, pk=project_id)
+    if request.method == 'PUT':
         try:
-            project.delete()
-            return JsonResponse({"success": True}, status=200)
-        except Exception as e:
-            print("DELETE error:", str(e))  # This will print the error to your console
-            return JsonResponse({"error": str(e)}, status=400)
+            data = json.loads(request.body.decode('utf-8')) if request.body else None
+        except json.JSONDecodeError:
+            return JsonResponse({"error": "Invalid JSON"}, status=400)
+        if not isinstance(data, dict) or not data:
+            return JsonResponse({"error": "The analysis must be a non-empty object"}, status=400)
+        analyses.save_analyses(project, {question_index: {k: v for k, v in data.items() if k != 'is_gemini'}})
+    elif request.method != 'GET':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
 
-    return JsonResponse({"error": "Method not allowed"}, status=405)
+    versions = analyses.history(project, question_index)
+    if not versions:
+        return JsonResponse({"error": "No analysis for this question"}, status=404)
+    current = next((row for row in versions if row.is_current), None)
+    return JsonResponse({
+        "project_id": project.pk,
+        "question_index": question_index,
+        "current": analyses.row_to_dict(current) if current else None,
+        "history": [analyses.row_to_dict(row) for row in versions],
+    })
+
+MAX_BULK_OPERATIONS = 5000
+
+def is_project_id(value) -> bool:
+    # bool is an int subclass, but true must not address project 1
+    return isinstance(value, int) and not isinstance(value, bool)
 
 @csrf_exempt
-def analysis_view(request):
-    if request.method == 'POST':
-        data = json.loads(request.body)
-        question_index = data.get('question_index')
-        answer = data.get('answer')
-        previous_answers = data.get('previous_answers', [])
-
-        def random_chart_data(labels):
-            if len(labels) > 1:
-                values = [random.randint(10, 60) for _ in labels]
-                if sum(values) > 0:
-                    total = sum(values)
-                    values = [int(v * 100 / total) for v in values]
-            else:
-                values = [random.randint(10, 100)]
-            return values
-
-        # --- HARDCODED FALLBACKS ---
-        if question_index == 0:
-            labels = ['Segment A', 'Segment B', 'Segment C']
-            default_analysis = {
-                "title": "Target Market Analysis",
-                "content": f"Custom analysis for answer: {answer}",
-                "chartType": "pie",
-                "chartData": {
-                    "labels": labels,
-                    "data": random_chart_data(labels),
-                    "colors": ['#1FB8CD', '#FFC185', '#B4413C']
-                },
-                "reply": "Based on your target market, focus on Segment A for highest growth potential."
-            }
-        elif question_index == 1:
-            labels = ['Premium', 'Mid-range', 'Budget']
-            default_analysis = {
-                "title": "Product Portfolio Analysis",
-                "content": f"Custom analysis for products: {answer}",
-                "chartType": "bar",
-                "chartData": {
-                    "labels": labels,
-                    "data": random_chart_data(labels),
-                    "colors": ['#1FB8CD', '#FFC185', '#B4413C']
-                },
-                "reply": "Consider expanding your premium product line to boost revenue."
-            }
-        elif question_index == 2:
-            labels = ['Online', 'Retail', 'Wholesale']
-            default_analysis = {
-                "title": "Sales Channel Analysis",
-                "content": f"Custom analysis for channels: {answer}",
-                "chartType": "bar",
-                "chartData": {
-                    "labels": labels,
-                    "data": random_chart_data(labels),
-                    "colors": ['#1FB8CD', '#FFC185', '#B4413C']
-                },
-                "reply": "Online channels show strong growth; invest in digital marketing."
-            }
-        elif question_index == 3:
-            labels = ['North', 'South', 'West', 'East']
-            default_analysis = {
-                "title": "Regional Performance Analysis",
-                "content": f"Custom analysis for regions: {answer}",
-                "chartType": "pie",
-                "chartData": {
-                    "labels": labels,
-                    "data": random_chart_data(labels),
-                    "colors": ['#1FB8CD', '#FFC185', '#B4413C', '#8BC34A']
-                },
-                "reply": "Focus on regions with highest sales for expansion."
-            }
+def api_projects_bulk(request: HttpRequest):
+    """
+    Apply many project changes in one transaction:
+    ``{"create": [{...}], "update": [{"id": 1, ...}], "delete": [2, 3]}``.
+
+    Invalid items are skipped and reported in ``errors`` with their operation
+    and index, as are update items sharing an id; everything valid is written
+    with bulk_create, bulk_update and a single queryset delete.
+    """
+    if request.method != 'POST':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    try:
+        payload = json.loads(request.body.decode('utf-8')) if request.body else {}
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({"error": "Expected a JSON object"}, status=400)
+
+    creates = payload.get('create') or []
+    updates = payload.get('update') or []
+    deletes = payload.get('delete') or []
+    if not all(isinstance(ops, list) for ops in (creates, updates, deletes)):
+        return JsonResponse({"error": "'create', 'update' and 'delete' must be arrays"}, status=400)
+    if len(creates) + len(updates) + len(deletes) > MAX_BULK_OPERATIONS:
+        return JsonResponse({"error": f"At most {MAX_BULK_OPERATIONS} operations per request"}, status=400)
+
+    errors = []
+
+    new_projects = []
+    for index, item in enumerate(creates):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError("must be an object")
+            new_projects.append((new_project_from_payload(item), payload_analyses(item) or {}))
+        except ValueError as e:
+            errors.append({"op": "create", "index": index, "error": str(e)})
+
+    update_ids = [item.get('id') for item in updates if isinstance(item, dict)]
+    update_ids = [pk for pk in update_ids if is_project_id(pk)]
+    existing = Project.objects.in_bulk(update_ids)
+    # Two items for one project would both edit the same instance; refuse them all
+    repeated = {pk for pk in existing if update_ids.count(pk) > 1}
+    changed_projects = {}
+    changed_analyses = {}
+    changed_fields = {'updated_at'}
+    for index, item in enumerate(updates):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError("must be an object")
+            if not is_project_id(item.get('id')):
+                raise ValueError("invalid id")
+            project = existing.get(item['id'])
+            if project is None:
+                raise ValueError("project not found")
+            if project.pk in repeated:
+                raise ValueError("the same id appears more than once in 'update'")
+            entries = payload_analyses(item)
+            changed_fields.update(apply_project_changes(project, item))
+            changed_projects[project.pk] = project
+            if entries is not None:
+                changed_analyses[project.pk] = entries
+        except ValueError as e:
+            errors.append({"op": "update", "index": index, "error": str(e)})
+
+    delete_ids = []
+    for index, pk in enumerate(deletes):
+        if is_project_id(pk):
+            delete_ids.append(pk)
         else:
-            labels = ['A', 'B', 'C']
-            default_analysis = {
-                "title": "Generic Analysis",
-                "content": "No specific analysis available.",
-                "chartType": "bar",
-                "chartData": {
-                    "labels": labels,
-                    "data": random_chart_data(labels),
-                    "colors": ['#1FB8CD', '#FFC185', '#B4413C']
-                },
-                "reply": "Let me know if you need more insights on this topic."
-            }
-
-        # --- PROMPT TEMPLATES ---
-        prompt_templates = {
-            0: (
-                "You are a business analyst. Given the target market answer: '{answer}', "
-                "and previous answers: {previous_answers}, "
-                "provide a concise market analysis, a chart title, and a business insight reply. "
-                "Format your response as JSON with keys: title, content, reply."
-            ),
-            1: (
-                "You are a business analyst. Given the product portfolio answer: '{answer}', "
-                "and previous answers: {previous_answers}, "
-                "provide a concise product analysis, a chart title, and a business insight reply. "
-                "Format your response as JSON with keys: title, content, reply."
-            ),
-            2: (
-                "You are a business analyst. Given the sales channel answer: '{answer}', "
-                "and previous answers: {previous_answers}, "
-                "provide a concise channel analysis, a chart title, and a business insight reply. "
-                "Format your response as JSON with keys: title, content, reply."
-            ),
-            3: (
-                "You are a business analyst. Given the regional performance answer: '{answer}', "
-                "and previous answers: {previous_answers}, "
-                "provide a concise regional analysis, a chart title, and a business insight reply. "
-                "Format your response as JSON with keys: title, content, reply."
-            ),
+            errors.append({"op": "delete", "index": index, "error": "must be a project id"})
+
+    with transaction.atomic():
+        created = Project.objects.bulk_create([project for project, _ in new_projects], batch_size=500)
+        analyses.create_initial(new_projects)
+        if changed_projects:
+            # bulk_update bypasses auto_now and post_save
+            now = timezone.now()
+            for project in changed_projects.values():
+                project.updated_at = now
+            Project.objects.bulk_update(changed_projects.values(), sorted(changed_fields), batch_size=500)
+        for pk, entries in changed_analyses.items():
+            analyses.save_analyses(changed_projects[pk], entries, keep=entries)
+        deleted_ids = list(Project.objects.filter(pk__in=delete_ids).values_list('pk', flat=True))
+        Project.objects.filter(pk__in=deleted_ids).delete()
+        transaction.on_commit(lambda: invalidate_projects(changed_projects))
+
+    return JsonResponse({
+        "created": [p.pk for p in created],
+        "updated": list(changed_projects),
+        "deleted": deleted_ids,
+        "errors": errors,
+    }, status=200)
+
+def random_chart_data(labels):
+    if len(labels) > 1:
+        values = [random.randint(10, 60) for _ in labels]
+        if sum(values) > 0:
+            total = sum(values)
+            values = [int(v * 100 / total) for v in values]
+    else:
+        values = [random.randint(10, 100)]
+    return values
+
+def build_default_analysis(question_index, answer):
+    """Hardcoded analysis used when Gemini is unavailable or fails."""
+    if question_index == 0:
+        labels = ['Segment A', 'Segment B', 'Segment C']
+        return {
+            "title": "Target Market Analysis",
+            "content": f"Custom analysis for answer: {answer}",
+            "chartType": "pie",
+            "chartData": {
+                "labels": labels,
+                "data": random_chart_data(labels),
+                "colors": ['#1FB8CD', '#FFC185', '#B4413C']
+            },
+            "reply": "Based on your target market, focus on Segment A for highest growth potential."
+        }
+    if question_index == 1:
+        labels = ['Premium', 'Mid-range', 'Budget']
+        return {
+            "title": "Product Portfolio Analysis",
+            "content": f"Custom analysis for products: {answer}",
+            "chartType": "bar",
+            "chartData": {
+                "labels": labels,
+                "data": random_chart_data(labels),
+                "colors": ['#1FB8CD', '#FFC185', '#B4413C']
+            },
+            "reply": "Consider expanding your premium product line to boost revenue."
+        }
+    if question_index == 2:
+        labels = ['Online', 'Retail', 'Wholesale']
+        return {
+            "title": "Sales Channel Analysis",
+            "content": f"Custom analysis for channels: {answer}",
+            "chartType": "bar",
+            "chartData": {
+                "labels": labels,
+                "data": random_chart_data(labels),
+                "colors": ['#1FB8CD', '#FFC185', '#B4413C']
+            },
+            "reply": "Online channels show strong growth; invest in digital marketing."
+        }
+    if question_index == 3:
+        labels = ['North', 'South', 'West', 'East']
+        return {
+            "title": "Regional Performance Analysis",
+            "content": f"Custom analysis for regions: {answer}",
+            "chartType": "pie",
+            "chartData": {
+                "labels": labels,
+                "data": random_chart_data(labels),
+                "colors": ['#1FB8CD', '#FFC185', '#B4413C', '#8BC34A']
+            },
+            "reply": "Focus on regions with highest sales for expansion."
+        }
+    labels = ['A', 'B', 'C']
+    return {
+        "title": "Generic Analysis",
+        "content": "No specific analysis available.",
+        "chartType": "bar",
+        "chartData": {
+            "labels": labels,
+            "data": random_chart_data(labels),
+            "colors": ['#1FB8CD', '#FFC185', '#B4413C']
+        },
+        "reply": "Let me know if you need more insights on this topic."
+    }
+
+# --- PROMPT TEMPLATES ---
+ANALYSIS_PROMPT_TEMPLATES = {
+    0: (
+        "You are a business analyst. Given the target market answer: '{answer}', "
+        "and previous answers: {previous_answers}, "
+        "provide a concise market analysis, a chart title, and a business insight reply. "
+        "Format your response as JSON with keys: title, content, reply."
+    ),
+    1: (
+        "You are a business analyst. Given the product portfolio answer: '{answer}', "
+        "and previous answers: {previous_answers}, "
+        "provide a concise product analysis, a chart title, and a business insight reply. "
+        "Format your response as JSON with keys: title, content, reply."
+    ),
+    2: (
+        "You are a business analyst. Given the sales channel answer: '{answer}', "
+        "and previous answers: {previous_answers}, "
+        "provide a concise channel analysis, a chart title, and a business insight reply. "
+        "Format your response as JSON with keys: title, content, reply."
+    ),
+    3: (
+        "You are a business analyst. Given the regional performance answer: '{answer}', "
+        "and previous answers: {previous_answers}, "
+        "provide a concise regional analysis, a chart title, and a business insight reply. "
+        "Format your response as JSON with keys: title, content, reply."
+    ),
+}
+GENERIC_ANALYSIS_PROMPT = (
+    "You are a business analyst. Given the answer: '{answer}', "
+    "and previous answers: {previous_answers}, "
+    "provide a concise analysis, a chart title, and a business insight reply. "
+    "Format your response as JSON with keys: title, content, reply."
+)
+
+def build_analysis_prompt(question_index, answer, previous_answers):
+    prompt_template = ANALYSIS_PROMPT_TEMPLATES.get(question_index, GENERIC_ANALYSIS_PROMPT)
+    return prompt_template.format(answer=answer, previous_answers=previous_answers)
+
+def fallback_analysis(default_analysis):
+    # Combine content and reply for fallback
+    analysis_text = f"{default_analysis['content']}\n\n{default_analysis['reply']}"
+    return {
+        "title": default_analysis["title"],
+        "analysis": analysis_text,
+        "chartType": default_analysis["chartType"],
+        "chartData": default_analysis["chartData"]
+    }
+
+def analysis_from_response(response_text, question_index, default_analysis):
+    """Turn Gemini's reply into the analysis payload, tolerating non-JSON output."""
+    try:
+        cleaned_text = clean_gemini_json(response_text)
+        gemini_json = json.loads(cleaned_text)
+    except Exception:
+        # Gemini responded, but not valid JSON
+        gemini_json = {
+            "title": f"AI Analysis for Q{question_index}",
+            "content": response_text,
+            "reply": "See above for AI-generated insights."
         }
-        generic_prompt = (
-            "You are a business analyst. Given the answer: '{answer}', "
-            "and previous answers: {previous_answers}, "
-            "provide a concise analysis, a chart title, and a business insight reply. "
-            "Format your response as JSON with keys: title, content, reply."
-        )
 
-        # --- GEMINI GENERATION ---
-        analysis = default_analysis  # fallback by default
-        is_gemini = False  # Track if Gemini was used
+    # Combine content and reply into one analysis string
+    analysis_text = f"{gemini_json.get('content', '')}\n\n{gemini_json.get('reply', '')}"
+    return {
+        "title": gemini_json.get("title", default_analysis["title"]),
+        "analysis": analysis_text,
+        "chartType": default_analysis["chartType"],
+        "chartData": default_analysis["chartData"]
+    }
+
+def analysis_inputs(data):
+    """The answers an analysis request was built from, or None when they don't line up."""
+    previous_answers = data.get('previous_answers', [])
+    if isinstance(previous_answers, list) and data.get('question_index') == len(previous_answers):
+        return previous_answers + [data.get('answer')]
+    return None
+
+def save_project_analysis(project_id, question_index, analysis, answers=None):
+    """
+    Store ``analysis`` as the current version for one question of the project,
+    if both exist. ``answers`` (up to this question) let a generated analysis
+    record what it was made from.
+    """
+    if not isinstance(question_index, int) or isinstance(question_index, bool) or question_index < 0:
+        return
+    project = Project.objects.filter(pk=project_id).first()
+    if project is not None:
+        analyses.save_analyses(project, {question_index: analysis}, answers)
+
+def analysis_attempt(question_index, answer, previous_answers):
+    """
+    ``(default analysis, prompt)`` for one questionnaire answer. The prompt is
+    None when the LLM is not configured and the default should be served.
+    """
+    default_analysis = build_default_analysis(question_index, answer)
+    prompt = build_analysis_prompt(question_index, answer, previous_answers) if llm_available() else None
+    return default_analysis, prompt
 
+def finish_analysis(question_index, default_analysis, response_text=None):
+    """
+    The analysis payload for the model's reply, or the hardcoded fallback
+    when there is no reply (LLM unavailable or failed) or it can't be used.
+    """
+    if response_text is not None:
         try:
-            if GEMINI_API_KEY:
-                import google.generativeai as genai
-                genai.configure(api_key=GEMINI_API_KEY)
-                model = genai.GenerativeModel('gemini-1.5-flash')
-
-                prompt_template = prompt_templates.get(question_index, generic_prompt)
-                prompt = prompt_template.format(answer=answer, previous_answers=previous_answers)
-
-                response = model.generate_content(prompt)
-                gemini_json = None
-                try:
-                    cleaned_text = clean_gemini_json(response.text)
-                    gemini_json = json.loads(cleaned_text)
-                    is_gemini = True  # Gemini succeeded
-                except Exception:
-                    gemini_json = {
-                        "title": f"AI Analysis for Q{question_index}",
-                        "content": response.text,
-                        "reply": "See above for AI-generated insights."
-                    }
-                    is_gemini = True  # Gemini responded, but not valid JSON
-
-                # Combine content and reply into one analysis string
-                analysis_text = f"{gemini_json.get('content', '')}\n\n{gemini_json.get('reply', '')}"
-                analysis = {
-                    "title": gemini_json.get("title", default_analysis["title"]),
-                    "analysis": analysis_text,
-                    "chartType": default_analysis["chartType"],
-                    "chartData": default_analysis["chartData"]
-                }
-            else:
-                # Combine content and reply for fallback
-                analysis_text = f"{default_analysis['content']}\n\n{default_analysis['reply']}"
-                analysis = {
-                    "title": default_analysis["title"],
-                    "analysis": analysis_text,
-                    "chartType": default_analysis["chartType"],
-                    "chartData": default_analysis["chartData"]
-                }
-        except Exception as e:
-            analysis_text = f"{default_analysis['content']}\n\n{default_analysis['reply']}"
-            analysis = {
-                "title": default_analysis["title"],
-                "analysis": analysis_text,
-                "chartType": default_analysis["chartType"],
-                "chartData": default_analysis["chartData"]
-            }
-            is_gemini = False
-
-        # Save analysis to the corresponding project if project_id is provided
-        project_id = data.get('project_id')
-        if project_id:
-            try:
-                project = Project.objects.get(pk=project_id)
-                project.analysis_content = analysis
-                project.save()
-            except Project.DoesNotExist:
-                pass
+            analysis = analysis_from_response(response_text, question_index, default_analysis)
+            analysis['is_gemini'] = True
+            return analysis
+        except Exception:
+            pass
+    analysis = fallback_analysis(default_analysis)
+    analysis['is_gemini'] = False
+    return analysis
+
+def analyze_answer(question_index, answer, previous_answers):
+    """
+    Generate the analysis for one questionnaire answer, falling back to the
+    hardcoded analysis when the LLM is unavailable or fails.
+    """
+    default_analysis, prompt = analysis_attempt(question_index, answer, previous_answers)
+    response_text = None
+    if prompt is not None:
+        try:
+            response_text = generate_text('analysis', prompt)
+        except Exception:
+            response_text = None
+    return finish_analysis(question_index, default_analysis, response_text)
+
+def run_analysis(data):
+    """Analyze one answer and save it to ``data['project_id']`` when given."""
+    analysis = analyze_answer(data.get('question_index'), data.get('answer'), data.get('previous_answers', []))
+
+    project_id = data.get('project_id')
+    if project_id:
+        save_project_analysis(project_id, data.get('question_index'), analysis, analysis_inputs(data))
+
+    return analysis
+
+MAX_BATCH_ANSWERS = 20
+
+def batch_answers(data):
+    """
+    ``(project, answers)`` for a batch analysis request: ``answers`` from the
+    body, or the project's stored answers. Raises ValueError on bad input and
+    Project.DoesNotExist for an unknown project.
+    """
+    project_id = data.get('project_id')
+    project = Project.objects.get(pk=project_id) if project_id else None
+    answers = data.get('answers', project.answers if project else None)
+    if not isinstance(answers, list) or not answers:
+        raise ValueError("'answers' must be a non-empty list (or give a project_id with answers)")
+    if len(answers) > MAX_BATCH_ANSWERS:
+        raise ValueError(f"At most {MAX_BATCH_ANSWERS} answers per batch")
+    if not all(isinstance(a, str) for a in answers):
+        raise ValueError("Every answer must be a string")
+    return project, answers
 
-        # Add is_gemini flag to response
-        analysis['is_gemini'] = is_gemini
-        return JsonResponse(analysis)
+def save_batch_analysis(project, results, answers):
+    """All analyses in one write; questions beyond ``answers`` lose theirs."""
+    analyses.save_analyses(project, dict(enumerate(results)), answers, keep=range(len(answers)))
+
+def analyze_answer_in_worker(question_index, answers):
+    try:
+        return analyze_answer(question_index, answers[question_index], answers[:question_index])
+    finally:
+        # Worker threads get their own DB connection (response cache); don't leak it
+        connection.close()
+
+def analyze_answers(answers, indexes=None) -> dict:
+    """
+    ``{question index: analysis}`` for ``answers`` at ``indexes`` (default
+    all), with the LLM calls spread over ANALYSIS_BATCH_WORKERS threads.
+    """
+    indexes = list(range(len(answers)) if indexes is None else indexes)
+    if not indexes:
+        return {}
+    workers = min(getattr(settings, 'ANALYSIS_BATCH_WORKERS', 4), len(indexes))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='analysis-batch') as pool:
+        return dict(zip(indexes, pool.map(analyze_answer_in_worker, indexes, [answers] * len(indexes))))
+
+@csrf_exempt
+def analysis_view(request):
+    if request.method == 'POST':
+        data = json.loads(request.body)
+
+        # Background mode: queue the work and let the client poll for it;
+        # "force": true reruns a payload whose earlier job already finished
+        if data.pop('async', False):
+            job = enqueue_analysis(data, force=bool(data.pop('force', False)))
+            return JsonResponse(job_to_dict(job), status=202)
+
+        return JsonResponse(run_analysis(data))
 
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
+@csrf_exempt
+def batch_analysis_view(request):
+    """
+    Analyze every answer of a questionnaire at once:
+    ``{"project_id": 1}`` (uses the stored answers) or ``{"answers": [...]}``.
+    The LLM calls fan out over ANALYSIS_BATCH_WORKERS threads, and a project's
+    analyses are stored in a single write.
+    """
+    if request.method != 'POST':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    try:
+        data = json.loads(request.body.decode('utf-8')) if request.body else {}
+        project, answers = batch_answers(data)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    except Project.DoesNotExist:
+        return JsonResponse({"error": "Project not found"}, status=404)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    results = list(analyze_answers(answers).values())
+    if project is not None:
+        save_batch_analysis(project, results, answers)
+    return JsonResponse({
+        "project_id": project.pk if project else None,
+        "analyses": results,
+    })
+
+def job_to_dict(job: AnalysisJob) -> dict:
+    return {
+        "job_id": str(job.id),
+        "status": job.status,
+        "status_url": reverse('analysis_job', args=[job.id]),
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at.isoformat(),
+        "updated_at": job.updated_at.isoformat(),
+    }
+
+def analysis_job_view(request, job_id):
+    if request.method != 'GET':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    job = get_object_or_404(AnalysisJob, pk=job_id)
+    return JsonResponse(job_to_dict(job), status=200)
+
+
+def statistics_project_id(request):
+    """Optional ``?project_id=`` scope of the statistics endpoints."""
+    project_id = request.GET.get('project_id')
+    if not project_id:
+        return None
+    return get_object_or_404(Project, pk=project_id).pk
+
+def statistics_since(request):
+    """The ``?since=<version>`` of a statistics poll; None for a plain GET, ValueError when malformed."""
+    since = request.GET.get('since')
+    if since is not None and not re.fullmatch(r'[0-9a-f]{0,64}', since):
+        raise ValueError("'since' must be a version returned by an earlier poll")
+    return since
 
 @csrf_exempt
 def statistics_view(request):
+    """
+    The project's statistics. With ``?since=<version>`` this is the poll
+    feed: ``{"version", "changes"}`` since that version, or ``{"version",
+    "stats"}`` when the caller is too far behind for a delta. It answers at
+    once; ``retry_after`` tells the dashboard when to poll again. ASGI
+    deployments long-poll async_views.statistics_poll_view instead.
+    """
     if request.method == 'GET':
-        stats = {
-            "sales": {
-                "revenue": [random.randint(100000, 200000) for _ in range(6)],
-                "months": ["Apr", "May", "Jun", "Jul", "Aug", "Sep"],
-                "products": [
-                    {"name": "Premium Collection", "sales": random.randint(50000, 80000), "growth": f"+{random.randint(5,15)}%"},
-                    {"name": "Classic Line", "sales": random.randint(30000, 60000), "growth": f"+{random.randint(5,15)}%"},
-                    {"name": "Budget Series", "sales": random.randint(15000, 35000), "growth": f"+{random.randint(5,15)}%"}
-                ]
-            },
-            "marketing": {
-                "platforms": [
-                    {"name": "Instagram", "reach": random.randint(40000, 50000), "engagement": f"{random.uniform(7,10):.1f}%", "conversion": f"{random.uniform(2,3):.1f}%"},
-                    {"name": "YouTube", "reach": random.randint(20000, 30000), "engagement": f"{random.uniform(10,14):.1f}%", "conversion": f"{random.uniform(3,5):.1f}%"},
-                    {"name": "Facebook", "reach": random.randint(30000, 40000), "engagement": f"{random.uniform(5,7):.1f}%", "conversion": f"{random.uniform(1,2):.1f}%"}
-                ],
-                "campaigns": [
-                    {"name": "Summer Collection", "roi": random.randint(250, 400), "spent": random.randint(10000, 20000), "revenue": random.randint(30000, 60000)},
-                    {"name": "Festive Special", "roi": random.randint(200, 350), "spent": random.randint(10000, 18000), "revenue": random.randint(25000, 50000)}
-                ]
-            },
-            "customerSegments": {
-                "ageGroups": [
-                    {"range": "18-25", "percentage": random.randint(20, 30), "value": random.randint(30000, 40000)},
-                    {"range": "26-35", "percentage": random.randint(40, 50), "value": random.randint(60000, 80000)},
-                    {"range": "36-50", "percentage": random.randint(25, 35), "value": random.randint(40000, 50000)}
-                ],
-                "gender": [
-                    {"type": "Female", "percentage": random.randint(60, 70), "value": random.randint(90000, 110000)},
-                    {"type": "Male", "percentage": random.randint(30, 40), "value": random.randint(40000, 60000)}
-                ]
-            }
-        }
-        return JsonResponse(stats)
+        project_id = statistics_project_id(request)
+        try:
+            since = statistics_since(request)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        if since is None:
+            return JsonResponse(statistics.hub.snapshot(project_id).stats)
+        snapshot, changes = statistics.hub.changes_since(since, project_id)
+        return JsonResponse(statistics.poll_payload(snapshot, changes, statistics.hub.refresh_seconds))
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
+@csrf_exempt
+def project_metrics_view(request, project_id):
+    """
+    Ingest metric points for statistics_view:
+    ``{"points": [{"metric": "sales.revenue", "date": "2025-09-01", "value": 1200}]}``
+    """
+    project = get_object_or_404(Project, pk=project_id)
+    if request.method != 'POST':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    try:
+        payload = json.loads(request.body.decode('utf-8')) if request.body else {}
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+
+    if not isinstance(payload, dict) or not isinstance(payload.get('points') or [], list):
+        return JsonResponse({"error": "Expected {\"points\": [...]}"}, status=400)
+
+    points = []
+    for i, point in enumerate(payload.get('points') or []):
+        if not isinstance(point, dict):
+            return JsonResponse({"error": f"points[{i}]: must be an object"}, status=400)
+        metric = point.get('metric')
+        try:
+            day = parse_date(str(point.get('date', '')))
+        except ValueError:
+            day = None
+        value = point.get('value')
+        if metric not in metrics.METRICS:
+            return JsonResponse({"error": f"points[{i}]: unknown metric '{metric}'"}, status=400)
+        if day is None:
+            return JsonResponse({"error": f"points[{i}]: 'date' must be YYYY-MM-DD"}, status=400)
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or not math.isfinite(value):
+            return JsonResponse({"error": f"points[{i}]: 'value' must be a number"}, status=400)
+        points.append((metric, day, value))
+
+    try:
+        stored = metrics.ingest(project, points)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({"success": True, "points": stored}, status=200)
+
+def project_charts_view(request, project_id):
+    """Project.charts with every series longer than ``?width=`` downsampled (LTTB) to that many points."""
+    if request.method != 'GET':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    try:
+        width = charts.chart_width(request.GET.get('width'))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    payload = charts.stored_charts(project_id, width)
+    if payload is None:
+        return JsonResponse({"error": "Project not found"}, status=404)
+    return JsonResponse({"project_id": project_id, "width": width, "charts": payload})
+
+def project_chart_series_view(request, project_id):
+    """
+    One ingested metric as ``chartData``, at most ``?width=`` points:
+    ``?metric=sales.revenue&bucket=day|week|month&start=YYYY-MM-DD&end=YYYY-MM-DD``.
+    """
+    if request.method != 'GET':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    metric = request.GET.get('metric', '')
+    bucket = request.GET.get('bucket', 'day')
+    if metric not in metrics.METRICS:
+        return JsonResponse({"error": f"Unknown metric '{metric}'"}, status=400)
+    if bucket not in charts.BUCKETS:
+        return JsonResponse({"error": f"'bucket' must be one of: {', '.join(charts.BUCKETS)}"}, status=400)
+    bounds = {}
+    for name in ('start', 'end'):
+        value = request.GET.get(name)
+        bounds[name] = parse_date(value) if value else None
+        if value and bounds[name] is None:
+            return JsonResponse({"error": f"'{name}' must be YYYY-MM-DD"}, status=400)
+    try:
+        width = charts.chart_width(request.GET.get('width'))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    payload = charts.series_chart(project_id, metric, width, bucket, bounds['start'], bounds['end'])
+    if payload is None:
+        return JsonResponse({"error": "No data recorded for this metric"}, status=404)
+    return JsonResponse({"project_id": project_id, "width": width, **payload})
+
+def prometheus_metrics_view(request):
+    """Request histograms recorded by InstrumentationMiddleware, for Prometheus to scrape."""
+    if request.method != 'GET':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    return HttpResponse(instrumentation.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @csrf_exempt
 def api_keys_view(request, project_id):
     project = get_object_or_404(Project, pk=project_id)
@@ -393,51 +1050,55 @@ def api_keys_view(request, project_id):
 # --- NEW CHATBOT VIEW WITH GEMINI ---
 def get_database_context():
     """Fetch and format all project data from database"""
-    projects = Project.objects.all()
-    context_parts = []
-    
-    for project in projects:
-        project_info = f"""
-Project: {project.name}
-Type: {project.type}
-Created: {project.created_date}
-Questions Answered: {'Yes' if project.questions_answered else 'No'}
-"""
-        
-        if project.answers:
-            project_info += "Answers:\n"
-            for i, answer in enumerate(project.answers, 1):
-                project_info += f"  {i}. {answer}\n"
-        
-        if project.analysis_content:
-            project_info += f"Analysis: {project.analysis_content}\n"
-            
-        context_parts.append(project_info)
-    
+    context_parts = [render_project_context(project) for project in Project.objects.all()]
     return "\n---\n".join(context_parts) if context_parts else "No projects found in database."
 
 def get_project_context(project_id):
-    """Fetch and format only the selected project's data from database"""
-    try:
-        project = Project.objects.get(pk=project_id)
-    except Project.DoesNotExist:
+    """Formatted data of the selected project, served from the context cache"""
+    project_info = context.get_project_context(project_id)
+    if project_info is None:
         return "No project found with the given ID."
+    return project_info
+
+CHAT_SYSTEM_PROMPT = """You are a helpful business assistant for Vishwakarma platform. 
+You have access to project data from the database. Answer user questions based on this data.
+Be conversational, helpful, and provide insights based on the project information available.
+
+Available Project Data:
+{}
 
-    project_info = f"""
-Project: {project.name}
-Type: {project.type}
-Created: {project.created_date}
-Questions Answered: {'Yes' if project.questions_answered else 'No'}
+Instructions:
+- Answer questions based only on the provided project data
+- If asked about something not in the data, politely say you don't have that information
+- Provide actionable business insights when possible
+- Keep responses concise but informative
 """
-    if project.answers:
-        project_info += "Answers:\n"
-        for i, answer in enumerate(project.answers, 1):
-            project_info += f"  {i}. {answer}\n"
 
-    if project.analysis_content:
-        project_info += f"Analysis: {project.analysis_content}\n"
+CHAT_DEGRADED_REPLY = "The assistant is temporarily unavailable. Please try again in a moment."
 
-    return project_info
+def degraded_chat_response(request, data, **metadata):
+    """Immediate canned reply while the LLM breaker is open or a call missed its deadline."""
+    metadata.update(degraded=True, retry_after=breaker.retry_after())
+    if wants_stream(request, data):
+        return sse_response(iter([CHAT_DEGRADED_REPLY]), 'reply', **metadata)
+    return JsonResponse({"reply": CHAT_DEGRADED_REPLY, **metadata})
+
+def llm_unavailable_response():
+    retry_after = breaker.retry_after()
+    response = JsonResponse({
+        "error": "Content generation is temporarily unavailable",
+        "degraded": True,
+        "retry_after": retry_after,
+    }, status=503)
+    if retry_after:
+        response['Retry-After'] = str(retry_after)
+    return response
+
+def build_chat_prompt(db_context, user_message, history=""):
+    system_prompt = CHAT_SYSTEM_PROMPT.format(db_context)
+    if history:
+        system_prompt = f"{system_prompt}\n{history}\n"
+    return f"{system_prompt}\n\nUser Question: {user_message}"
 
 @csrf_exempt
 def chatbot_view(request):
@@ -447,76 +1108,91 @@ def chatbot_view(request):
     try:
         data = json.loads(request.body)
         user_message = data.get('message', '').strip()
-        project_id = data.get('project_id')  # <-- Get project_id from request
+        project_id = data.get('project_id')  # <-- Get project_id from request; omit to ask across projects
 
         if not user_message:
             return JsonResponse({"error": "Message is required"}, status=400)
-        if not project_id:
-            return JsonResponse({"error": "Project ID is required"}, status=400)
-        if not GEMINI_API_KEY:
+        if not llm_available():
             return JsonResponse({"error": "Gemini API key not configured"}, status=500)
+        try:
+            session = chat.get_or_create_session(data.get('session_id'), project_id)
+        except (ChatSession.DoesNotExist, ValidationError):
+            return JsonResponse({"error": "Chat session not found"}, status=404)
+        except Project.DoesNotExist:
+            return JsonResponse({"error": "Project not found"}, status=404)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
 
-        # Get context for only the selected project
-        db_context = get_project_context(project_id)
-
-        # Create the prompt
-        system_prompt = """You are a helpful business assistant for Vishwakarma platform. 
-You have access to project data from the database. Answer user questions based on this data.
-Be conversational, helpful, and provide insights based on the project information available.
+        if breaker.is_open():
+            return degraded_chat_response(request, data, context_used=0, session_id=str(session.id))
 
-Available Project Data:
-{}
+        # Only the chunks relevant to the question go into the prompt, plus
+        # the session's summary and last few turns
+        db_context, context_used = retrieval.get_chat_context(user_message, project_id)
+        prompt = build_chat_prompt(db_context, user_message, chat.history_prompt(session))
 
-Instructions:
-- Answer questions based only on the provided project data
-- If asked about something not in the data, politely say you don't have that information
-- Provide actionable business insights when possible
-- Keep responses concise but informative
-""".format(db_context)
-
-        # Initialize Gemini model
-        model = genai.GenerativeModel('gemini-1.5-flash')
-
-        # Generate response
-        prompt = f"{system_prompt}\n\nUser Question: {user_message}"
-        response = model.generate_content(prompt)
+        # Generate response (repeated questions are served from the response cache)
+        if wants_stream(request, data):
+            chunks = chat.record_stream(session, user_message, stream_text('chat', prompt, project_id=project_id))
+            return sse_response(chunks, 'reply', context_used=context_used, session_id=str(session.id))
+        try:
+            reply = generate_text('chat', prompt, project_id=project_id)
+        except LLMUnavailable:
+            return degraded_chat_response(request, data, context_used=context_used, session_id=str(session.id))
+        chat.record_turn(session, user_message, reply)
 
         return JsonResponse({
-            "reply": response.text,
-            "context_used": 1  # Only one project context used
+            "reply": reply,
+            "context_used": context_used,
+            "session_id": str(session.id)
         })
         
     except Exception as e:
         return JsonResponse({"error": f"Failed to generate response: {str(e)}"}, status=500)
 
-        # Add this to your views.py temporarily for debugging:
+
+@csrf_exempt
+def chat_session_view(request, session_id):
+    """History of one chat session (GET) or forget it (DELETE)."""
+    session = get_object_or_404(ChatSession, pk=session_id)
+    if request.method == 'GET':
+        return JsonResponse(chat.session_to_dict(session))
+    if request.method == 'DELETE':
+        session.delete()
+        return JsonResponse({"success": True})
+    return JsonResponse({"error": "Method not allowed"}, status=405)
 
 @csrf_exempt 
 def test_gemini_view(request):
     """Test endpoint to verify Gemini API is working"""
     try:
-        import google.generativeai as genai
-        
-        GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
-        if not GEMINI_API_KEY:
+        backend = get_backend()
+        if not backend.is_configured():
             return JsonResponse({"error": "No Gemini API key found"}, status=500)
-            
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        response = model.generate_content("Say hello")
+
+        response_text = backend.generate("Say hello")
         
         return JsonResponse({
             "success": True,
-            "response": response.text,
-            "api_key_length": len(GEMINI_API_KEY)
+            "response": response_text,
+            "backend": type(backend).__name__,
+            "api_key_length": len(getattr(backend, 'api_key', ''))
         })
         
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
-# And add this to your urls.py:
-# path('api/test-gemini/', views.test_gemini_view, name='test_gemini'),
+def llm_status_view(request):
+    """Backend, deadlines and circuit breaker state of this worker, for monitoring."""
+    backend = get_backend()
+    return JsonResponse({
+        "backend": type(backend).__name__,
+        "model": backend.model_name,
+        "configured": backend.is_configured(),
+        "deadlines": resilience_settings()['DEADLINES'],
+        "breaker": breaker.to_dict(),
+    }, status=503 if breaker.is_open() else 200)
+
 
 def clean_gemini_json(text):
     """
@@ -534,7 +1210,19 @@ def clean_gemini_json(text):
     cleaned = re.sub(r"\*\*(.*?)\*\*", r"\1", cleaned)
     return cleaned.strip()
 
-# ...existing code...
+
+def build_content_prompt(project_context, prompt):
+    return f"""You are a creative content generator for the Vishwakarma platform.
+Project Info:
+{project_context}
+
+Instructions:
+- Generate engaging marketing content, social media posts, or product descriptions based on the user's prompt.
+- Keep the content relevant to the project.
+- Format the output as plain text.
+
+User Prompt: {prompt}
+"""
 
 @csrf_exempt
 def generate_content_view(request):
@@ -546,27 +1234,23 @@ def generate_content_view(request):
         project_id = data.get('project_id')
         if not prompt:
             return JsonResponse({"error": "Prompt is required"}, status=400)
-        if not GEMINI_API_KEY:
+        if not llm_available():
             return JsonResponse({"error": "Gemini API key not configured"}, status=500)
 
         # Optionally, fetch project context for more relevant content
         project_context = get_project_context(project_id) if project_id else ""
 
-        system_prompt = f"""You are a creative content generator for the Vishwakarma platform.
-Project Info:
-{project_context}
-
-Instructions:
-- Generate engaging marketing content, social media posts, or product descriptions based on the user's prompt.
-- Keep the content relevant to the project.
-- Format the output as plain text.
+        system_prompt = build_content_prompt(project_context, prompt)
+        if breaker.is_open():
+            return llm_unavailable_response()
+        if wants_stream(request, data):
+            return sse_response(stream_text('generate_content', system_prompt, project_id=project_id), 'content')
 
-User Prompt: {prompt}
-"""
-
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(system_prompt)
+        try:
+            content = generate_text('generate_content', system_prompt, project_id=project_id)
+        except LLMUnavailable:
+            return llm_unavailable_response()
 
-        return JsonResponse({"content": response.text})
+        return JsonResponse({"content": content})
     except Exception as e:
         return JsonResponse({"error": f"Failed to generate content: {str(e)}"}, status=500)
@@ -51,6 +51,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'artisan.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -133,3 +134,125 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# LLM provider (artisan/llm_backends.py). Set LLM_BACKEND=artisan.llm_backends.LocalBackend
+# to load-test without Gemini; its OPTIONS shape latency, error rate and replies, e.g.
+#   'OPTIONS': {'LATENCY': {'distribution': 'lognormal', 'median': 0.8, 'sigma': 0.5},
+#               'ERROR_RATE': 0.01, 'SEED': 42}
+
+LLM_BACKEND = {
+    'BACKEND': os.environ.get('LLM_BACKEND', 'artisan.llm_backends.GeminiBackend'),
+    'OPTIONS': {},
+}
+
+# LLM response cache (artisan/llm.py)
+# Identical prompts are answered from an in-process LRU, backed by the
+# artisan_cachedresponse table. TTLs are in seconds; 0 disables an endpoint.
+
+LLM_CACHE = {
+    'MAX_ENTRIES': int(os.environ.get('LLM_CACHE_MAX_ENTRIES', 512)),
+    'TTL': {
+        'analysis': 60 * 60,
+        'chat': 5 * 60,
+        'generate_content': 15 * 60,
+    },
+}
+
+# Chat context retrieval (artisan/retrieval.py): answers and analyses are
+# split into CHUNK_SIZE-character chunks and the TOP_K best BM25 matches for
+# the user's message go into the prompt.
+RETRIEVAL = {
+    'CHUNK_SIZE': 500,
+    'CHUNK_OVERLAP': 50,
+    'TOP_K': int(os.environ.get('RETRIEVAL_TOP_K', 6)),
+}
+
+# Chat sessions (artisan/chat.py): prompts carry a rolling summary plus the
+# turns not yet in it, at most HISTORY_TURNS of them; once SUMMARIZE_TURNS
+# turns sit beyond the last RECENT_TURNS, they are folded into the summary.
+CHAT_SESSIONS = {
+    'RECENT_TURNS': 4,
+    'SUMMARIZE_TURNS': 4,
+    'HISTORY_TURNS': 8,
+}
+
+# NDJSON export/import (artisan/transfer.py): rows read per database round
+# trip when exporting, and projects per bulk_create when importing.
+PROJECT_TRANSFER = {
+    'EXPORT_CHUNK_SIZE': 500,
+    'IMPORT_BATCH_SIZE': 500,
+}
+
+# Seconds a rendered project context (artisan/context.py) may live in the
+# cache. Entries are keyed by the project's updated_at, so edits never serve
+# a stale one; this only bounds how long superseded entries take up space.
+PROJECT_CONTEXT_TIMEOUT = 300
+
+# Upper bound on concurrent Gemini calls made by the async views in one process.
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 64))
+
+# Concurrent identical LLM requests share one call (artisan/llm.py). Set
+# CROSS_PROCESS with a shared CACHES backend to coalesce across workers too.
+LLM_SINGLE_FLIGHT = {
+    'CROSS_PROCESS': os.environ.get('LLM_SINGLE_FLIGHT_CROSS_PROCESS', '').lower() in ('1', 'true', 'yes'),
+    'LOCK_TIMEOUT': 60,
+}
+
+# Deadlines (seconds) and circuit breaker for LLM calls (artisan/resilience.py).
+# While the breaker is open, analysis serves its fallback and chat/content
+# endpoints answer immediately with a degraded response.
+LLM_RESILIENCE = {
+    'DEADLINES': {
+        'analysis': 10,
+        'chat': 20,
+        'generate_content': 30,
+        'default': 30,
+    },
+    'BREAKER_FAILURES': 5,
+    'BREAKER_SLOW_SECONDS': 15,
+    'BREAKER_RESET_SECONDS': 30,
+}
+
+# Threads that run analysis requests submitted with "async": true (artisan/jobs.py).
+ANALYSIS_JOB_WORKERS = int(os.environ.get('ANALYSIS_JOB_WORKERS', 4))
+# Identical requests get the same done job for RESULT_TTL seconds; a pending or
+# running job idle for STALE_SECONDS (lost in a restart) is failed and requeued.
+ANALYSIS_JOB_RESULT_TTL = int(os.environ.get('ANALYSIS_JOB_RESULT_TTL', 60 * 60))
+ANALYSIS_JOB_STALE_SECONDS = int(os.environ.get('ANALYSIS_JOB_STALE_SECONDS', 10 * 60))
+
+# Threads per request that fan out the questions of a batch analysis
+# (/api/analysis/batch/), so the whole questionnaire takes about one LLM round trip.
+ANALYSIS_BATCH_WORKERS = int(os.environ.get('ANALYSIS_BATCH_WORKERS', 4))
+
+# Metrics store (artisan/metrics.py): one series may cover at most this many
+# days, since its packed daily array has a slot for every day in the range.
+METRICS_MAX_SPAN_DAYS = 10 * 366
+
+# Statistics feed (artisan/statistics.py): snapshots are rebuilt at most this
+# often and shared by all subscribers. Under ASGI dashboards get a push stream,
+# closed after STATISTICS_STREAM_SECONDS so the browser's EventSource
+# reconnects, or a long-poll held for up to STATISTICS_LONG_POLL_SECONDS.
+# Under WSGI polls are answered at once and the dashboard waits
+# STATISTICS_REFRESH_SECONDS before the next one.
+STATISTICS_REFRESH_SECONDS = 2
+STATISTICS_STREAM_SECONDS = 55
+STATISTICS_LONG_POLL_SECONDS = 25
+
+# Chart data engine (artisan/charts.py): series longer than the requested
+# ?width= are downsampled to that many points (DEFAULT_WIDTH when absent,
+# capped at MAX_WIDTH); rendered charts are cached for TIMEOUT seconds.
+CHART_ENGINE = {
+    'DEFAULT_WIDTH': 800,
+    'MAX_WIDTH': 4000,
+    'TIMEOUT': 300,
+}
+
+# Request instrumentation (artisan/middleware.py), scraped from /metrics.
+# Slow requests are logged; set PROFILE_SAMPLE_RATE and PROFILE_DIR to also
+# keep cProfile dumps of sampled slow requests.
+INSTRUMENTATION = {
+    'SLOW_REQUEST_MS': int(os.environ.get('SLOW_REQUEST_MS', 1000)),
+    'PROFILE_SAMPLE_RATE': float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+    'PROFILE_DIR': os.environ.get('PROFILE_DIR') or None,
+}
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vishwakarma.settings')
 
 application = get_wsgi_application()
+
+# Optional: pay the Gemini client import/configuration cost at worker boot
+# instead of on the first AI request.
+if os.environ.get('LLM_WARMUP', '').lower() in ['1', 'true', 'yes']:
+    from artisan.llm import warm_up
+    warm_up()